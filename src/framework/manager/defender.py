@@ -5,6 +5,7 @@ from urllib.parse import urlparse, parse_qs, urljoin
 
 import framework.service.language as language
 import framework.service.scheme as scheme
+import framework.service.shard as shard
 import framework.service.flow as flow
 import framework.manager.loader as loader
 
@@ -15,7 +16,9 @@ class Manager:
 
         :param constants: Configurazioni iniziali, deve includere 'providers'.
         """
-        self.interpreter = language.Interpreter(scheme.schemes)
+        # Con $DSL_SHARDS >= 2 le sessioni girano negli shard (vedi framework.service.shard)
+        self.interpreter = (shard.shared_interpreter(custom_types=scheme.schemes)
+                            or language.Interpreter(scheme.schemes, runtime=language.shared_runtime()))
         self.loader = loader
         self.config = constants
         #self.authentications = constants.get('authentications', [])
@@ -64,9 +67,9 @@ class Manager:
         self.interpreter.session_create(sid=session.get('id'),env=env)
         return language.SessionHandle(self.interpreter, session=session)
 
-    def session_get(self, sid) -> language.SessionHandle | None:
-        # ricostruisce l'handle senza duplicare stato
-        if sid not in self.interpreter._runner.sessions:
+    async def session_get(self, sid) -> language.SessionHandle | None:
+        # ricostruisce l'handle senza duplicare stato (has_session è una coroutine con gli shard)
+        if not await flow._call(self.interpreter._runner.has_session, sid):
             return None
         return language.SessionHandle(self.interpreter, sid)
 
@@ -6,22 +6,26 @@ import traceback
 import framework.service.language as language
 import framework.service.flow as flow
 import framework.service.scheme as scheme
+import framework.service.shard as shard
 import framework.manager.messenger as messenger
 
 class Manager:
     def __init__(self, messenger: messenger.Manager,**constants):
         self.defender = constants.get('defender')
         self.messenger = constants.get('messenger')
-        self.interpreter = language.Interpreter(scheme.schemes)
+        # Con $DSL_SHARDS >= 2 le sessioni girano negli shard (vedi framework.service.shard)
+        self.interpreter = (shard.shared_interpreter(custom_types=scheme.schemes)
+                            or language.Interpreter(scheme.schemes, runtime=language.shared_runtime()))
 
     # ── INTERPRETER ────────────────────────────────────────────────────────────────
 
-    async def stop(self, session):
+    async def shutdown(self, session):
         await self.interpreter.stop()
     
-    async def start(self, session):
-        
-        '''await self.interpreter.start()
+    async def startup(self, session=None):
+        # Runtime condiviso: acquisito qui e rilasciato in shutdown, come il Defender
+        await self.interpreter.start()
+        '''
         codice_dsl = """
         moltiplicatore: 2;
 
@@ -80,7 +84,7 @@ class Manager:
         return await self.interpreter.add_file(name, source)
 
     async def create_session(self, session, env={}):
-        return await self.interpreter.session_create(session, env|self.language.DSL_FUNCTIONS)
+        return await self.interpreter.session_create(session, env)
 
     async def run_session(self, session, file, env={}):
         return await self.interpreter.run_session(session, file, env|self.language.DSL_FUNCTIONS)
@@ -70,7 +70,7 @@ class tester:
         label  = prefix or 'tutti'
         diagnostic.log("INFO", f"Avvio esecuzione suite di test… filtro: {label}", emoji="🧪")
 
-        interp = language.Interpreter()
+        interp = language.Interpreter(runtime=language.shared_runtime())
         await interp.start()
         await interp.create_session("tester", env=language.DSL_FUNCTIONS|{'resource':self.loader.resource})
 
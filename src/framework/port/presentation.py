@@ -285,6 +285,8 @@ class Port(ABC):
         self.DOM = {}
         self.data = {}
         self.routes = {}
+        # Deadline in secondi di ogni controller eseguito per una richiesta (None: nessuna)
+        self.deadline = None
         # DOM
         self.document = {}
         fs_loader = FileSystemLoader("src/application/view/layout/")
@@ -454,7 +456,7 @@ class Port(ABC):
         data = {}
 
         for controller in controllers:
-            data[controller] = await session.run(controller,{'sid':session})
+            data[controller] = await session.run(controller,{'sid':session},timeout=self.deadline)
 
         managers = self.loader.get_managers()
 
@@ -0,0 +1,620 @@
+"""Benchmark DagRunner
+
+Misura la latenza end-to-end di ``run_file`` su DAG costruiti a mano,
+senza passare dal DSL, così da isolare il costo del motore.
+
+Uso::
+
+    python src/framework/service/flow.bench.py
+"""
+
+import os, sys
+
+# La cartella dello script contiene logging.py: va sostituita con src/
+# prima di importare asyncio, altrimenti oscura il modulo della stdlib.
+sys.path[0] = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+
+import asyncio, statistics, time, tracemalloc
+
+import framework.service.flow as flow
+
+RUNS = 20
+
+# ─────────────────────────────────────────────
+# DAG
+# ─────────────────────────────────────────────
+
+def _counted(calls):
+    def fn(ctx):
+        calls[0] += 1
+        return calls[0]
+    return fn
+
+def deep_dag(depth: int, calls):
+    """Catena di diamanti: root -> (l_i, r_i) -> j_i -> (l_i+1, r_i+1) -> ..."""
+    nodes = [flow.node("root", _counted(calls))]
+    prev = "root"
+    for i in range(depth):
+        nodes.append(flow.node(f"l{i}", _counted(calls), deps=[prev]))
+        nodes.append(flow.node(f"r{i}", _counted(calls), deps=[prev]))
+        nodes.append(flow.node(f"j{i}", _counted(calls), deps=[f"l{i}", f"r{i}"]))
+        prev = f"j{i}"
+    return nodes
+
+def wide_dag(width: int, calls):
+    """Fan-out / fan-in: root -> w_0..w_n -> sink."""
+    nodes = [flow.node("root", _counted(calls))]
+    nodes += [flow.node(f"w{i}", _counted(calls), deps=["root"]) for i in range(width)]
+    nodes.append(flow.node("sink", _counted(calls), deps=[f"w{i}" for i in range(width)]))
+    return nodes
+
+# ─────────────────────────────────────────────
+# RUN
+# ─────────────────────────────────────────────
+
+class CountingRunner(flow.DagRunner):
+    """DagRunner che conta i nodi estratti dalla coda (esecuzioni + requeue a vuoto)."""
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.dequeued = 0
+
+    async def _run_node(self, sid, fname, i, *args):
+        self.dequeued += 1
+        return await super()._run_node(sid, fname, i, *args)
+
+async def bench(label: str, build, size: int):
+    calls  = [0]
+    runner = CountingRunner()
+    await runner.add_file(label, build(size, calls))
+    runner.create_session("bench")
+    await runner.start()
+
+    samples = []
+    for _ in range(RUNS):
+        t0 = time.perf_counter()
+        await asyncio.wait_for(runner.run_file("bench", label), 60)
+        samples.append(time.perf_counter() - t0)
+
+    # Lascia girare il motore a vuoto: eventuali requeue residui emergono qui.
+    executed, dequeued = calls[0], runner.dequeued
+    await asyncio.sleep(1.0)
+    idle = runner.dequeued - dequeued
+
+    await runner.close_session("bench")
+    await runner.stop()
+
+    n = len(runner.nodes[label])
+    print(f"{label:<12} nodes={n:<5} "
+          f"p50={statistics.median(samples) * 1e3:8.2f}ms "
+          f"max={max(samples) * 1e3:8.2f}ms "
+          f"exec/run={executed / RUNS:7.1f} "
+          f"dequeue/run={dequeued / RUNS:7.1f} idle_dequeue={idle}")
+
+# ─────────────────────────────────────────────
+# LOAD — sessione rumorosa vs sessione interattiva
+# ─────────────────────────────────────────────
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def _slow(ctx):
+    await asyncio.sleep(0.002)
+    return 1
+
+async def load(label: str, noisy_width: int = 300, samples: int = 100, flood: bool = True, **runner_kw):
+    """
+    Una sessione "noisy" riesegue in loop un fan-out di nodi lenti,
+    una sessione "quiet" misura la latenza di un piccolo file a 3 nodi.
+    """
+    runner = flow.DagRunner(**runner_kw)
+    await runner.add_file("noisy", [
+        flow.node("root", _slow),
+        *[flow.node(f"w{i}", _slow, deps=["root"]) for i in range(noisy_width)],
+    ])
+    await runner.add_file("quiet", [
+        flow.node("a", lambda ctx: 1),
+        flow.node("b", lambda ctx: ctx["a"] + 1, deps=["a"]),
+        flow.node("c", lambda ctx: ctx["b"] + 1, deps=["b"]),
+    ])
+    runner.create_session("noisy")
+    runner.create_session("quiet")
+    await runner.start()
+
+    async def _flood():
+        while flood:
+            await runner.run_file("noisy", "noisy")
+
+    flooder = asyncio.create_task(_flood())
+    await asyncio.sleep(0.05)
+
+    latencies = []
+    for _ in range(samples):
+        t0 = time.perf_counter()
+        await asyncio.wait_for(runner.run_file("quiet", "quiet"), 60)
+        latencies.append(time.perf_counter() - t0)
+        await asyncio.sleep(0.005)
+
+    flooder.cancel()
+    await runner.stop()
+    print(f"{label:<12} quiet p50={_percentile(latencies, 0.5) * 1e3:8.2f}ms "
+          f"p99={_percentile(latencies, 0.99) * 1e3:8.2f}ms workers={len(runner.tasks)}")
+
+# ─────────────────────────────────────────────
+# MEMO — molte sessioni, stesso calcolo puro
+# ─────────────────────────────────────────────
+
+def _heavy(ctx):
+    return sum(i * i for i in range(ctx["root"] * 20_000))
+
+async def memo(label: str, sessions: int = 1000, **node_kw):
+    runner = flow.DagRunner()
+    await runner.add_file("memo", [
+        flow.node("root", lambda ctx: 1),
+        flow.node("heavy", _heavy, deps=["root"], **node_kw),
+    ])
+    await runner.start()
+    sids = [f"s{i}" for i in range(sessions)]
+    for sid in sids:
+        runner.create_session(sid)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(runner.run_file(sid, "memo") for sid in sids))
+    elapsed = time.perf_counter() - t0
+
+    await runner.stop()
+    print(f"{label:<12} sessions={sessions} total={elapsed * 1e3:8.2f}ms {runner.memo.stats()}")
+
+# ─────────────────────────────────────────────
+# RESULT — costo del Result e del singolo nodo
+# ─────────────────────────────────────────────
+
+def _allocs(fn, n):
+    """Blocchi allocati (e ancora vivi) e ns per chiamata di fn."""
+    tracemalloc.start()
+    snap0 = tracemalloc.take_snapshot()
+    keep = [fn() for _ in range(n)]
+    snap1 = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(st.count_diff for st in snap1.compare_to(snap0, "filename"))
+    t0 = time.perf_counter_ns()
+    for _ in range(n):
+        fn()
+    ns = (time.perf_counter_ns() - t0) / n
+    del keep
+    return blocks / n, ns
+
+async def result_cost(n: int = 20_000):
+    blocks, ns = _allocs(lambda: flow.success(1, time.perf_counter()), n)
+    print(f"{'success()':<12} blocks/result={blocks:6.2f} ns/result={ns:8.1f}")
+
+    calls  = [0]
+    runner = flow.DagRunner()
+    await runner.add_file("chain", deep_dag(100, calls))
+    runner.create_session("bench")
+    await runner.start()
+    await runner.run_file("bench", "chain")   # warm-up
+
+    executed = RUNS * len(runner.nodes["chain"])
+
+    t0 = time.perf_counter_ns()
+    for _ in range(RUNS):
+        await runner.run_file("bench", "chain")
+    elapsed = time.perf_counter_ns() - t0
+
+    # Result allocati per nodo: conta le chiamate al costruttore di flow
+    made, original = [0], flow._res
+    def counting(*a, **kw):
+        made[0] += 1
+        return original(*a, **kw)
+    flow._res = counting
+    tracemalloc.start()
+    for _ in range(RUNS):
+        await runner.run_file("bench", "chain")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    flow._res = original
+
+    await runner.stop()
+    print(f"{'node':<12} ns/node={elapsed / executed:10.1f} "
+          f"results/node={made[0] / executed:5.2f} peak_bytes/node={peak / executed:8.1f}")
+
+# ─────────────────────────────────────────────
+# THROUGHPUT — nodi/secondo a regime
+# ─────────────────────────────────────────────
+
+async def throughput(label: str, sessions: int = 100, width: int = 50, **node_kw):
+    calls  = [0]
+    runner = flow.DagRunner()
+    nodes  = [flow.node("root", _counted(calls), **node_kw)]
+    nodes += [flow.node(f"w{i}", _counted(calls), deps=["root"], **node_kw) for i in range(width)]
+    await runner.add_file("tp", nodes)
+    await runner.start()
+    sids = [f"s{i}" for i in range(sessions)]
+    for sid in sids:
+        runner.create_session(sid)
+    await asyncio.gather(*(runner.run_file(sid, "tp") for sid in sids))   # warm-up
+
+    calls[0] = 0
+    t0 = time.perf_counter()
+    for _ in range(5):
+        await asyncio.gather(*(runner.run_file(sid, "tp") for sid in sids))
+    elapsed = time.perf_counter() - t0
+
+    await runner.stop()
+    print(f"{label:<12} nodes/s={calls[0] / elapsed:10.0f} ({calls[0]} nodi in {elapsed:.2f}s)")
+
+# ─────────────────────────────────────────────
+# SESSIONS — molte sessioni web mai chiuse
+# ─────────────────────────────────────────────
+
+async def sessions(label: str, count: int = 5000, **runner_kw):
+    runner = flow.DagRunner(**runner_kw)
+    await runner.add_file("s", [
+        flow.node("a", lambda ctx: list(range(100)), path="a"),
+        flow.node("b", lambda ctx: len(ctx["a"]), deps=["a"]),
+    ])
+    await runner.start()
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    for i in range(count):
+        runner.create_session(f"s{i}", {"user": i})
+        await runner.run_file(f"s{i}", "s")
+    elapsed = time.perf_counter() - t0
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    t0 = time.perf_counter()
+    await runner.run_file("s0", "s")   # sessione più vecchia: eventualmente ricaricata
+    back = time.perf_counter() - t0
+
+    await runner.clear_all_sessions()
+    await runner.stop()
+    stats = runner.session_stats()
+    print(f"{label:<12} sessions={count} total={elapsed * 1e3:8.2f}ms heap={current / 2**20:6.1f}MB "
+          f"rehydrate={back * 1e3:5.2f}ms evictions={stats['evictions']}")
+
+# ─────────────────────────────────────────────
+# CHECKPOINT — riavvio a caldo con molte sessioni
+# ─────────────────────────────────────────────
+
+async def checkpoint(label: str, count: int = 50_000):
+    import tempfile
+    path   = os.path.join(tempfile.mkdtemp(), "sessions.snap")
+    runner = flow.DagRunner()
+    for i in range(count):
+        runner.create_session(f"s{i}", {"user": i, "cart": list(range(20)), "fn": print})
+
+    t0 = time.perf_counter()
+    saved = runner.checkpoint(path)
+    write = time.perf_counter() - t0
+
+    booted = flow.DagRunner()
+    t0 = time.perf_counter()
+    booted.restore(path, env={"fn": print})
+    boot = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    booted.context("s123")
+    first = time.perf_counter() - t0
+
+    print(f"{label:<12} sessions={saved} size={os.path.getsize(path) / 2**20:5.1f}MB "
+          f"write={write * 1e3:8.2f}ms boot={boot * 1e3:7.2f}ms first_access={first * 1e3:5.2f}ms "
+          f"resident={len(booted.sessions)}")
+
+# ─────────────────────────────────────────────
+# SCHEDULE — molte sessioni con un nodo periodico
+# ─────────────────────────────────────────────
+
+async def schedule(label: str, sessions: int = 2000, interval: float = 0.05, seconds: float = 1.0):
+    ticks  = [0]
+    runner = flow.DagRunner()
+    await runner.add_file("sch", [flow.node("tick", _counted(ticks), schedule=interval, jitter=interval / 5)])
+    await runner.start()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sids = [f"s{i}" for i in range(sessions)]
+    for sid in sids:
+        runner.create_session(sid)
+    await asyncio.gather(*(runner.run_file(sid, "sch") for sid in sids))
+    per_node = (tracemalloc.get_traced_memory()[0] - before) / sessions
+    tracemalloc.stop()
+
+    ticks[0] = 0
+    await asyncio.sleep(seconds)
+    rate  = ticks[0] / (sessions * seconds / interval)
+    tasks = len(asyncio.all_tasks())
+
+    await runner.clear_all_sessions()
+    await runner.stop()
+    print(f"{label:<12} sessions={sessions} ticks/expected={rate:5.2f} tasks={tasks} "
+          f"bytes/session={per_node:8.1f}")
+
+# ─────────────────────────────────────────────
+# INCREMENTAL — un path cambiato in un file grande
+# ─────────────────────────────────────────────
+
+async def incremental(label: str, width: int = 200, **runner_kw):
+    """width catene a 2 nodi, ognuna legge il proprio path `in.i`; cambia solo in.0."""
+    calls  = [0]
+    runner = flow.DagRunner(**runner_kw)
+    nodes  = []
+    for i in range(width):
+        nodes.append(flow.node(f"a{i}", _counted(calls), watch=[f"in.{i}"]))
+        nodes.append(flow.node(f"b{i}", _counted(calls), deps=[f"a{i}"]))
+    await runner.add_file("inc", nodes)
+    runner.create_session("s", {"in": {str(i): 0 for i in range(width)}})
+    await runner.start()
+    await runner.run_file("s", "inc")
+
+    samples = []
+    for v in range(1, RUNS + 1):
+        calls[0] = 0
+        t0 = time.perf_counter()
+        runner.update_state("s", "in.0", v)
+        await runner.run_file("s", "inc")
+        samples.append(time.perf_counter() - t0)
+
+    await runner.stop()
+    print(f"{label:<12} nodes={len(nodes)} exec/change={calls[0]:5d} p50={statistics.median(samples) * 1e3:8.2f}ms")
+
+# ─────────────────────────────────────────────
+# LAYERS — builtin e default condivisi dal ctx
+# ─────────────────────────────────────────────
+
+async def layers(label: str, count: int = 5000, files: int = 10, defaults: int = 50):
+    """Creazione di sessioni con molti builtin e default, poi add_file con tutte vive."""
+    runner = flow.DagRunner(builtins={f"fn{i}": len for i in range(100)})
+    for f in range(files):
+        await runner.add_file(f"f{f}", [flow.node(f"f{f}.v{i}", lambda ctx: None, default=i, entry=False)
+                                        for i in range(defaults)])
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    for i in range(count):
+        runner.create_session(f"u{i}", {"sid": f"u{i}"})
+    create = time.perf_counter() - t0
+    heap, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    t0 = time.perf_counter()
+    await runner.add_file("late", [flow.node("late.v", lambda ctx: None, default=1, entry=False)])
+    late = time.perf_counter() - t0
+    print(f"{label:<12} sessions={count} create={create / count * 1e6:6.1f}us/session "
+          f"heap={heap / count:7.0f}B/session add_file={late * 1e3:6.2f}ms "
+          f"visible={runner.context('u0')['late']['v']}")
+
+# ─────────────────────────────────────────────
+# BACKPRESSURE — burst di eventi websocket
+# ─────────────────────────────────────────────
+
+async def backpressure(label: str, sessions: int = 5000, samples: int = 50, **runner_kw):
+    """Un burst di emit da molti client; si misura una sessione interattiva e la coda."""
+    runner = flow.DagRunner(**runner_kw)
+    await runner.add_file("ev", [flow.node("click", lambda ctx: 1, entry=False),
+                                 flow.node("render", lambda ctx: ctx["click"], deps=["click"])])
+    await runner.add_file("quiet", [flow.node("a", lambda ctx: 1)])
+    sids = [f"ws{i}" for i in range(sessions)]
+    for sid in sids + ["quiet"]:
+        runner.create_session(sid)
+    await runner.start()
+
+    shed = 0
+    for sid in sids:
+        shed += not runner.emit(sid, "ev", "click")
+
+    latencies = []
+    for _ in range(samples):
+        t0 = time.perf_counter()
+        await runner.run_file("quiet", "quiet", overload="delay")   # richiesta interattiva: attende
+        latencies.append(time.perf_counter() - t0)
+    stats = runner.queue_stats()
+    while not runner.queue.empty():
+        await asyncio.sleep(0.01)
+    await runner.stop()
+    print(f"{label:<12} quiet p50={_percentile(latencies, 0.5) * 1e3:8.2f}ms "
+          f"p99={_percentile(latencies, 0.99) * 1e3:8.2f}ms peak={stats['peak']} "
+          f"delayed={stats['delayed']} rejected={stats['rejected']} wait_max={stats['wait_max_ms']:.1f}ms")
+
+# ─────────────────────────────────────────────
+# DEADLINE — provider bloccato durante le richieste HTTP
+# ─────────────────────────────────────────────
+
+async def _stuck(ctx):
+    await asyncio.sleep(3600)
+
+async def deadline(label: str, requests: int = 20, cap: float = 5.0, request_timeout=None, **node_kw):
+    """requests run_file su un provider che non risponde, poi una richiesta sana."""
+    runner = flow.DagRunner(workers=3)
+    await runner.add_file("api", [flow.node("provider", _stuck, **node_kw),
+                                  flow.node("render", lambda ctx: ctx.get("provider"), deps=["provider"])])
+    await runner.add_file("quiet", [flow.node("a", lambda ctx: 1)])
+    for i in range(requests):
+        runner.create_session(f"http{i}")
+    runner.create_session("quiet")
+    await runner.start()
+
+    t0    = time.perf_counter()
+    calls = [asyncio.ensure_future(runner.run_file(f"http{i}", "api", timeout=request_timeout)) for i in range(requests)]
+    done, pending = await asyncio.wait(calls, timeout=cap)
+    failed = sum(1 for c in done if isinstance(c.exception(), asyncio.TimeoutError)
+                 or not c.result()["provider"]["success"])
+    settled = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    try:
+        await asyncio.wait_for(runner.run_file("quiet", "quiet"), cap)
+        quiet = f"{(time.perf_counter() - t0) * 1e3:8.2f}ms"
+    except asyncio.TimeoutError:
+        quiet = f"   >{cap:.0f}s "
+    for c in pending:
+        c.cancel()
+    await runner.stop()
+    print(f"{label:<12} settled={len(done):3d}/{requests} failed-fast={failed:3d} in {settled:5.2f}s "
+          f"hung={len(pending):3d} quiet={quiet} timeouts={sum(runner.timeout_stats().values())}")
+
+# ─────────────────────────────────────────────
+# FAN-OUT — stesso file su tutte le sessioni connesse
+# ─────────────────────────────────────────────
+
+async def fanout(label: str, sessions: int = 2000, batch: bool = False):
+    """Dashboard: un dato comune `memo` e un nodo per sessione, ricalcolati per tutti."""
+    calls  = [0]
+    runner = flow.DagRunner()
+    await runner.add_file("dash", [flow.node("prices", _counted(calls), memo=True),
+                                   flow.node("view", lambda ctx: ctx["prices"] + ctx["n"], deps=["prices"])])
+    sids = [f"u{i}" for i in range(sessions)]
+    for i, sid in enumerate(sids):
+        runner.create_session(sid, {"n": i})
+    await runner.start()
+
+    t0 = time.perf_counter()
+    if batch:
+        first = None
+        async for sid, _ in runner.run_many(sids, "dash", {"tick": 1}):
+            first = first or time.perf_counter() - t0
+    else:
+        for sid in sids:
+            await runner.run_file(sid, "dash", {"tick": 1})
+        first = None
+    elapsed = time.perf_counter() - t0
+    await runner.stop()
+    first = f"{first * 1e3:8.2f}ms" if first else "       -  "
+    print(f"{label:<12} sessions={sessions} total={elapsed * 1e3:8.2f}ms first={first} "
+          f"per-session={elapsed / sessions * 1e6:7.1f}us prices-exec={calls[0]}")
+
+# ─────────────────────────────────────────────
+# CONCURRENCY — backend lento protetto da max_concurrency
+# ─────────────────────────────────────────────
+
+async def concurrency(label: str, sessions: int = 500, limit=None):
+    """Tutte le sessioni chiamano lo stesso backend da 5ms: picco di chiamate in volo e attesa in coda."""
+    live = [0, 0]
+    async def backend(ctx):
+        live[0] += 1
+        live[1] = max(live[1], live[0])
+        try:
+            await asyncio.sleep(0.005)
+        finally:
+            live[0] -= 1
+    runner = flow.DagRunner(workers=sessions)
+    await runner.add_file("cc", [flow.node("gather", backend, max_concurrency=limit)])
+    sids = [f"s{i}" for i in range(sessions)]
+    for sid in sids:
+        runner.create_session(sid)
+    await runner.start()
+    t0 = time.perf_counter()
+    await asyncio.gather(*(runner.run_file(sid, "cc") for sid in sids))
+    elapsed = time.perf_counter() - t0
+    stats = runner.concurrency_stats().get("cc::gather", {})
+    await runner.stop()
+    print(f"{label:<12} in-flight={live[1]:4d} total={elapsed * 1e3:8.2f}ms "
+          f"wait avg={stats.get('wait_avg_ms', 0):7.2f}ms max={stats.get('wait_max_ms', 0):7.2f}ms")
+
+# ─────────────────────────────────────────────
+# PRIORITY — click sotto carico di heartbeat
+# ─────────────────────────────────────────────
+
+def _busy(ctx):
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < 0.0005:   # 0.5ms di CPU
+        pass
+
+async def priority(label: str, sessions: int = 200, clicks: int = 50, click_priority=None):
+    """Heartbeat `schedule` che saturano il worker; latenza di emit su un nodo click."""
+    runner = flow.DagRunner(workers=1)
+    await runner.add_file("pr", [flow.node("hb", _busy, schedule=0.02),
+                                 flow.node("click", lambda ctx: True, entry=False, priority=click_priority),
+                                 flow.node("init", lambda ctx: True)])
+    sids = [f"s{i}" for i in range(sessions)]
+    for sid in sids:
+        runner.create_session(sid)
+    await runner.start()
+    await asyncio.gather(*(runner.run_file(sid, "pr") for sid in sids))
+    await asyncio.sleep(0.2)
+
+    samples = []
+    for n in range(clicks):
+        t0 = time.perf_counter()
+        runner.emit(sids[n % sessions], "pr", "click")
+        await runner.wait_node(sids[n % sessions], "pr", "click")
+        samples.append((time.perf_counter() - t0) * 1e3)
+        await asyncio.sleep(0.005)
+    bands = runner.queue_stats()["bands"]
+    await runner.stop()
+    print(f"{label:<12} click p50={_percentile(samples, 0.5):8.2f}ms p99={_percentile(samples, 0.99):8.2f}ms "
+          f"background depth={bands['background']['depth']}")
+
+# ─────────────────────────────────────────────
+# PROFILE — costo del profiler e cammino critico
+# ─────────────────────────────────────────────
+
+async def _io(ctx):
+    await asyncio.sleep(0.005)
+
+async def profile(label: str, sessions: int = 100, width: int = 50, size: int = 0):
+    """Throughput con DagRunner(profile=size) e, se attivo, il nodo lento sul cammino critico."""
+    calls  = [0]
+    runner = flow.DagRunner(profile=size or None)
+    nodes  = [flow.node("root", _counted(calls)), flow.node("io", _io, deps=["root"])]
+    nodes += [flow.node(f"w{i}", _counted(calls), deps=["root"]) for i in range(width)]
+    nodes += [flow.node("join", _counted(calls), deps=["io", "w0"])]
+    await runner.add_file("pf", nodes)
+    await runner.start()
+    sids = [f"s{i}" for i in range(sessions)]
+    for sid in sids:
+        runner.create_session(sid)
+    await asyncio.gather(*(runner.run_file(sid, "pf") for sid in sids))   # warm-up
+
+    calls[0] = 0
+    t0 = time.perf_counter()
+    for _ in range(5):
+        await asyncio.gather(*(runner.run_file(sid, "pf") for sid in sids))
+    elapsed = time.perf_counter() - t0
+
+    path = ""
+    if size:
+        cp   = runner.stats("pf")["critical_path"]
+        path = " path=" + ">".join(s["node"] for s in cp["slowest"]["path"])
+    await runner.stop()
+    print(f"{label:<12} nodes/s={calls[0] / elapsed:10.0f}{path}")
+
+async def main():
+    await bench("deep-25", deep_dag, 25)
+    await bench("deep-100", deep_dag, 100)
+    await bench("wide-50", wide_dag, 50)
+    await bench("wide-500", wide_dag, 500)
+    await load("quiet-only", flood=False)
+    await load("load")
+    await load("load-scale", max_workers=12)
+    await memo("memo-off")
+    await memo("memo-on", memo=True, ttl=60)
+    await result_cost()
+    await throughput("throughput")
+    await throughput("tp-hooks", when=lambda ctx: True, on_end=lambda d, r: None)
+    await sessions("sessions")
+    await sessions("sessions-cap", max_sessions=100)
+    await checkpoint("checkpoint")
+    await schedule("schedule")
+    await layers("layers")
+    await incremental("full")
+    await incremental("incremental", incremental=True)
+    await backpressure("unbounded")
+    await backpressure("bp-delay", queue_high=200)
+    await backpressure("bp-shed", queue_high=200, overload="shed")
+    await deadline("node-30s")
+    await deadline("node-0.5s", timeout=0.5)
+    await deadline("request-0.2s", request_timeout=0.2)
+    await fanout("sequential")
+    await fanout("run_many", batch=True)
+    await concurrency("unlimited")
+    await concurrency("limit-20", limit=20)
+    await priority("click-fifo", click_priority="background")
+    await priority("click-lanes")
+    await profile("profile-off")
+    await profile("profile-on", size=100_000)
+
+if __name__ == "__main__":
+    asyncio.run(main())
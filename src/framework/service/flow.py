@@ -8,11 +8,24 @@ Modello:
   - Le chiavi nei results sono "fname::node_name" per evitare collisioni
 """
 
-import asyncio, inspect, time
+import asyncio, contextvars, copy, inspect, time
 from typing import Any, Callable, Dict, List, Optional
 import networkx as nx
 import functools
-import uuid
+import hashlib
+import heapq
+import itertools
+import math
+import os
+import pickle
+import random
+import struct
+import sys
+import tempfile
+import zlib
+from collections import ChainMap, OrderedDict, deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import traceback
 
 import framework.service.scheme as scheme
@@ -21,22 +34,46 @@ import framework.service.scheme as scheme
 # RESULT
 # ─────────────────────────────────────────────
 
+# Un solo orologio (perf_counter) per Result: updated_at (epoch) si ricava
+# dall'offset misurato all'import invece di leggere anche time.time().
+_WALL_OFFSET = time.time() - time.perf_counter()
+
+class Result(dict):
+    """
+    Esito di un'azione: un dict con le chiavi KEYS, così json.dumps,
+    JSONResponse e i controlli isinstance(r, dict) lo trattano come prima.
+
+    Costruito con una sola lettura di perf_counter: updated_at (epoch) si
+    ricava da stamp con l'offset misurato all'import. version è 0 finché il
+    DagRunner non salva il risultato assegnandogli il proprio contatore
+    monotono.
+    """
+
+    KEYS = ("action", "success", "outputs", "errors", "time", "updated_at", "version", "duration")
+
+    def __init__(self, success, outputs=None, errors=None, time=0.0, stamp=0.0,
+                 action=None, version=0, duration=0):
+        super().__init__(action=action, success=success, outputs=outputs,
+                         errors=errors if errors is not None else [], time=time,
+                         updated_at=stamp + _WALL_OFFSET, version=version, duration=duration)
+
+    def to_dict(self) -> dict:
+        return dict(self)
+
 def _res(ok, value=None, errors=None, t0=None):
-    return {
-        "action":     None,
-        "success":    ok,
-        "outputs":    value if ok else None,
-        "errors":     errors if isinstance(errors, list) else ([str(errors)] if errors else []),
-        "time":       (time.perf_counter() - t0) if t0 else 0.0,
-        "updated_at": time.time(),
-        "version":    str(uuid.uuid4())[:8],
-        "duration":   0,
-    }
+    now = time.perf_counter()
+    return Result(
+        ok,
+        value if ok else None,
+        errors if isinstance(errors, list) else ([str(errors)] if errors else []),
+        (now - t0) if t0 else 0.0,
+        now,
+    )
 
 def success(v, t0=None): return _res(True,  v,    None, t0)
 def error(e,   t0=None): return _res(False, None, e,    t0)
 def output(v):           return v.get("outputs") if isinstance(v, dict) and v.get("success") is not None else v
-def is_result(v):        return isinstance(v, dict) and v.get("success") is not None
+def is_result(v):        return isinstance(v, Result) or (isinstance(v, dict) and v.get("success") is not None)
 def flux(v): return success(output(v)) if v.get("success") is not None else error(v.get("errors"))
 def check(v): return v.get("success") is not None
 
@@ -68,13 +105,33 @@ def _get_from_path(ctx: dict, path: str, default: Any = None) -> Any:
     current = ctx
     
     for p in parts:
-        if isinstance(current, dict) and p in current:
+        if isinstance(current, Mapping) and p in current:
             current = current[p]
         else:
             return default
             
     return current
 
+def _added_paths(target: dict, source: dict, prefix: str = "") -> List[str]:
+    """Path di source che _deep_merge_defaults aggiungerebbe a target."""
+    added = []
+    for k, v in source.items():
+        path = f"{prefix}{k}"
+        if k not in target:
+            added.append(path)
+        elif isinstance(target[k], dict) and isinstance(v, dict):
+            added += _added_paths(target[k], v, path + ".")
+    return added
+
+def _same(old: Any, new: Any) -> bool:
+    """Vero se new non cambia il valore; lo stesso oggetto mutabile (forse mutato in place) conta come cambiato."""
+    if old is new:
+        return old is None or isinstance(old, (str, bytes, int, float, complex, bool, tuple, frozenset))
+    try:
+        return bool(old == new)
+    except Exception:
+        return False
+
 def _deep_merge_defaults(target: dict, source: dict):
     """Merge source into target SOLO per le chiavi non ancora presenti.
     Per dict annidati, ricorre senza sovrascrivere i valori esistenti.
@@ -86,6 +143,39 @@ def _deep_merge_defaults(target: dict, source: dict):
             _deep_merge_defaults(target[k], v)
         # else: target ha già il valore → non sovrascrivere
 
+def _copy_dicts(d: dict) -> dict:
+    """Copia la struttura dei dict annidati (non i valori foglia): un ctx_update
+    condiviso da più sessioni non deve finire per riferimento nei loro ctx."""
+    return {k: _copy_dicts(v) if isinstance(v, dict) else v for k, v in d.items()}
+
+async def _wait_all(events):
+    """Attende in sequenza: un solo coroutine invece di un task per evento (gather)."""
+    for event in events:
+        await event.wait()
+
+class _Ctx(ChainMap):
+    """
+    ctx di sessione a livelli: maps[0] contiene solo le voci della sessione
+    (env di create_session e scritture); seguono i default dei file e i builtin,
+    condivisi da tutte le sessioni e mai scritti attraverso il ctx.
+    Un valore mutabile (dict, list, set) letto dai default viene copiato nelle
+    voci della sessione alla prima lettura: le scritture annidate (_set,
+    deep merge, mutazioni dei nodi) restano così private della sessione.
+    """
+
+    def __getitem__(self, key):
+        top = self.maps[0]
+        if key in top:
+            return top[key]
+        maps = self.maps
+        for m in maps[1:]:
+            if key in m:
+                v = m[key]
+                if m is not maps[-1] and isinstance(v, (dict, list, set)):
+                    v = top[key] = copy.deepcopy(v)
+                return v
+        return self.__missing__(key)
+
 def _key(fname: str, node_name: str) -> str:
     return f"{fname}::{node_name}"
 
@@ -103,6 +193,7 @@ def node(name: str, fn: Callable, **kw):
         "meta":        kw.get("meta", False),
         "trigger":     kw.get("trigger"),
         "schedule":    kw.get("schedule"),
+        "jitter":      kw.get("jitter", 0),
         "duration":    kw.get("duration"),
         "timeout":     kw.get("timeout", 30),
         "retries":     kw.get("retries", 0),
@@ -115,8 +206,47 @@ def node(name: str, fn: Callable, **kw):
         "on_error":    kw.get("on_error"),
         "on_end":      kw.get("on_end"),
         "entry": kw.get("entry", True),
+        "executor":    kw.get("executor", "loop"),
+        "memo":        kw.get("memo", False),
+        "ttl":         kw.get("ttl"),
+        "reads":       kw.get("reads", []),
+        "watch":       kw.get("watch", kw.get("reads", [])),
+        "max_concurrency": kw.get("max_concurrency"),
+        "priority":    kw.get("priority"),
     }
 
+class Limited:
+    """
+    Callable con un limite di concorrenza, vedi limited(). Chiamata
+    direttamente si comporta come fn; il limite lo applica il DagRunner
+    (fn di un nodo) o l'Interpreter (funzione registrata in DSL_FUNCTIONS).
+    """
+
+    __slots__ = ("fn", "limit", "name", "__name__")
+
+    def __init__(self, fn: Callable, limit: int, name: Optional[str] = None):
+        if limit < 1:
+            raise ValueError(f"limited: il limite deve essere >= 1, non {limit!r}")
+        self.fn       = fn
+        self.limit    = int(limit)
+        self.name     = name or f"{getattr(fn, '__module__', '')}.{getattr(fn, '__qualname__', fn)!s}"
+        self.__name__ = getattr(fn, "__name__", self.name)
+
+    def __call__(self, *a, **kw):
+        return self.fn(*a, **kw)
+
+    def __repr__(self):
+        return f"limited({self.name}, {self.limit})"
+
+def limited(fn: Callable, limit: int, name: Optional[str] = None) -> Limited:
+    """
+    Limita le chiamate concorrenti a fn tra tutte le sessioni di un runner,
+    es. un adapter lento in DSL_FUNCTIONS: {'gather': limited(storekeeper.gather, 20)}.
+    `name` è la chiave del limite (default modulo.nome di fn): callable
+    registrate con lo stesso nome condividono i posti.
+    """
+    return Limited(fn, limit, name)
+
 # ── DSL ───────────────────────────────────────────────────────────────────────
 
 def step(fn, *a, **kw): return (fn, a, kw)
@@ -229,6 +359,73 @@ async def act(s):
     except Exception as e:
         return error(e, t0)
 
+# ── EXECUTORS ─────────────────────────────────────────────────────────────────
+#
+# Modalità di esecuzione di un nodo (chiave `executor` di node()):
+#   loop    — inline sull'event loop (default)
+#   thread  — ThreadPoolExecutor condiviso, per codice sincrono che rilascia il GIL
+#   process — ProcessPoolExecutor condiviso, per codice CPU-bound; funzione e
+#             argomenti devono essere serializzabili con pickle
+# I pool sono di processo, condivisi da tutti i DagRunner e creati alla prima
+# richiesta; configure_executors() ne fissa la dimensione.
+
+EXECUTORS = ("loop", "thread", "process")
+
+_pool_size: Dict[str, Optional[int]] = {"thread": None, "process": None}
+_pools: Dict[str, Any] = {}
+
+def configure_executors(thread: Optional[int] = None, process: Optional[int] = None):
+    """Imposta la dimensione dei pool condivisi; un pool già creato viene ricreato."""
+    for mode, size in (("thread", thread), ("process", process)):
+        if size is None:
+            continue
+        _pool_size[mode] = size
+        pool = _pools.pop(mode, None)
+        if pool:
+            pool.shutdown(wait=False)
+
+def _pool(mode: str):
+    pool = _pools.get(mode)
+    if pool is None:
+        cls  = ThreadPoolExecutor if mode == "thread" else ProcessPoolExecutor
+        pool = _pools[mode] = cls(max_workers=_pool_size[mode])
+    return pool
+
+async def offload(mode: str, fn, *a, **kw):
+    """
+    Esegue la callable sincrona fn secondo `mode` e ne restituisce il valore.
+    Le callable async (I/O) restano sempre sull'event loop.
+    Solleva le eccezioni di fn come _call, quindi l'esecutore del nodo le
+    trasforma nei normali Result di errore.
+    """
+    if mode == "loop" or not callable(fn) or inspect.iscoroutinefunction(fn):
+        return await _call(fn, *a, **kw)
+    if mode not in EXECUTORS:
+        raise ValueError(f"executor sconosciuto: {mode!r}")
+    if mode == "process":
+        try:
+            pickle.dumps((fn, a, kw))
+        except Exception as e:
+            raise TypeError(f"executor 'process': {getattr(fn, '__name__', fn)!s} "
+                            f"o i suoi argomenti non sono serializzabili ({e})") from None
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool(mode), functools.partial(fn, *a, **kw))
+
+async def bounded(aw, seconds: Optional[float]):
+    """
+    Attende aw per al più `seconds` (None = senza limite); alla scadenza lo
+    cancella e solleva asyncio.TimeoutError. Una callable sincrona eseguita
+    sul loop non è interrompibile: il limite scatta al primo await successivo.
+    Nei pool thread/process si smette di attendere ma il lavoro già avviato
+    prosegue fino alla fine.
+    """
+    if seconds is None:
+        return await aw
+    if hasattr(asyncio, "timeout"):          # 3.11+: nessun task aggiuntivo
+        async with asyncio.timeout(seconds):
+            return await aw
+    return await asyncio.wait_for(aw, seconds)
+
 # ── EXTENSIONS ────────────────────────────────────────────────────────────────
 
 async def branch(cond, ctx, branches):
@@ -263,68 +460,1116 @@ async def switch(data, cases):
     default = cases.get(True)
     if default: return (await _call(default, data))[0] if callable(default) else default
 
+# ─────────────────────────────────────────────
+# READINESS
+# ─────────────────────────────────────────────
+
+class _Readiness:
+    """
+    Tracker di prontezza dei nodi di una sessione.
+
+    Sostituisce il polling (sleep + requeue) sui dep: un nodo viene
+    accodato una sola volta, quando il suo ultimo parent salva un risultato.
+
+      - pending[k]:  parent non ancora completati nella run corrente
+      - versions[k]: versione monotona dell'ultimo risultato salvato
+      - consumed[k]: versioni dei parent lette all'ultima esecuzione
+      - queued:      nodi già in coda, per non accodarli due volte
+    """
+
+    __slots__ = ("pending", "versions", "consumed", "queued")
+
+    def __init__(self):
+        self.pending  = {}
+        self.versions = {}
+        self.consumed = {}
+        self.queued   = set()
+
+    def arm(self, k: str, dep_keys):
+        self.pending[k] = set(dep_keys)
+
+    def resolve(self, k: str, dk: str) -> bool:
+        """Segna il parent dk come completato; vero se k non attende altro."""
+        waiting = self.pending.get(k)
+        if waiting:
+            waiting.discard(dk)
+        return not waiting
+
+    def fresh(self, k: str, dep_keys) -> bool:
+        """Vero se almeno un parent ha una versione non ancora letta da k."""
+        seen = self.consumed.get(k)
+        if seen is None:
+            return True
+        return any(self.versions.get(dk, 0) > seen.get(dk, 0) for dk in dep_keys)
+
+    def snapshot(self, dep_keys) -> Dict[str, int]:
+        return {dk: self.versions.get(dk, 0) for dk in dep_keys}
+
+# ─────────────────────────────────────────────
+# MEMO
+# ─────────────────────────────────────────────
+
+def _fingerprint(h, v, seen=None):
+    """Alimenta l'hasher h con una codifica canonica di v (chiavi dei dict ordinate)."""
+    if v is None or isinstance(v, (bool, int, float, complex, str, bytes)):
+        h.update(f"{type(v).__name__}:{v!r};".encode())
+        return
+    seen = seen or set()
+    if id(v) in seen:
+        h.update(b"<cycle>;")
+        return
+    if isinstance(v, dict):
+        seen.add(id(v))
+        h.update(b"{")
+        for k in sorted(v, key=repr):
+            _fingerprint(h, k, seen)
+            _fingerprint(h, v[k], seen)
+        h.update(b"}")
+    elif isinstance(v, (list, tuple, set, frozenset)):
+        seen.add(id(v))
+        h.update(type(v).__name__.encode() + b"[")
+        for x in (sorted(v, key=repr) if isinstance(v, (set, frozenset)) else v):
+            _fingerprint(h, x, seen)
+        h.update(b"]")
+    else:
+        # Oggetti opachi (funzioni, adapter, ...): identità nel processo.
+        h.update(f"{type(v).__qualname__}@{id(v)};".encode())
+
+def _approx_size(v, seen=None) -> int:
+    seen = seen or set()
+    if id(v) in seen:
+        return 0
+    seen.add(id(v))
+    size = sys.getsizeof(v, 64)
+    if isinstance(v, dict):
+        size += sum(_approx_size(k, seen) + _approx_size(x, seen) for k, x in v.items())
+    elif isinstance(v, (list, tuple, set, frozenset)):
+        size += sum(_approx_size(x, seen) for x in v)
+    return size
+
+_MISS = object()
+
+class _Memo:
+    """
+    Cache dei risultati dei nodi `memo`, condivisa da tutte le sessioni del runner.
+
+    La chiave è l'identità del nodo ("fname::node_name") più un hash stabile
+    degli output dei deps e dei valori di ctx letti dal nodo (`reads`): due
+    sessioni con gli stessi input condividono una sola esecuzione, anche se
+    concorrenti (la seconda attende la prima). Eviction LRU su numero di voci
+    e byte stimati, più TTL per voce.
+
+    Gli output finiscono nel ctx delle sessioni, che li possono mutare: la
+    cache ne tiene una copia privata e ogni hit ne riceve una propria.
+    Gli output che deepcopy non sa copiare non vengono memorizzati.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes   = max_bytes
+        self.entries     = OrderedDict()   # key -> (outputs, expires_at, size)
+        self.inflight    = {}              # key -> Future dell'esecuzione in corso
+        self.bytes       = 0
+        self.hits = self.misses = self.evictions = self.expired = 0
+
+    @staticmethod
+    def key(node_key: str, *inputs) -> tuple:
+        h = hashlib.blake2b(digest_size=16)
+        _fingerprint(h, inputs)
+        return node_key, h.hexdigest()
+
+    def _get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return _MISS
+        outputs, expires_at, size = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._drop(key)
+            self.expired += 1
+            return _MISS
+        self.entries.move_to_end(key)
+        return outputs
+
+    async def lookup(self, key):
+        """Copia degli output in cache per key, attendendo un'eventuale esecuzione in corso; _MISS altrimenti."""
+        outputs = self._get(key)
+        if outputs is _MISS and key in self.inflight:
+            await asyncio.shield(self.inflight[key])
+            outputs = self._get(key)
+        if outputs is _MISS:
+            self.misses += 1
+            return outputs
+        self.hits += 1
+        return copy.deepcopy(outputs)
+
+    def begin(self, key):
+        self.inflight.setdefault(key, asyncio.get_running_loop().create_future())
+
+    def end(self, key, result: Optional[dict], ttl: Optional[float] = None):
+        """Chiude l'esecuzione di key; memorizza solo i risultati con successo."""
+        if result is not None and result.get("success"):
+            self.put(key, result["outputs"], ttl)
+        fut = self.inflight.pop(key, None)
+        if fut is not None and not fut.done():
+            fut.set_result(None)
+
+    def put(self, key, outputs, ttl: Optional[float] = None):
+        try:
+            outputs = copy.deepcopy(outputs)   # la sessione che l'ha calcolato tiene l'originale
+        except Exception:
+            return
+        size = _approx_size(outputs)
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._drop(key)
+        expires_at = time.monotonic() + ttl if ttl else None
+        self.entries[key] = (outputs, expires_at, size)
+        self.bytes += size
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            self._drop(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _drop(self, key):
+        _, _, size = self.entries.pop(key)
+        self.bytes -= size
+
+    def invalidate(self, fname: str):
+        """Scarta le voci dei nodi di fname (file ricaricato o rimosso)."""
+        prefix = _key(fname, "")
+        for key in [k for k in self.entries if k[0].startswith(prefix)]:
+            self._drop(key)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries":   len(self.entries),
+            "bytes":     self.bytes,
+            "hits":      self.hits,
+            "misses":    self.misses,
+            "evictions": self.evictions,
+            "expired":   self.expired,
+        }
+
+# ─────────────────────────────────────────────
+# DIRTY — path di ctx letti dai nodi
+#
+# Ogni nodo dichiara in `watch` i path di ctx che legge (ricavati dal DSL);
+# durante l'esecuzione l'interprete registra anche le letture effettive con
+# record_read(). watch None esclude il nodo (es. handler con deps: false). Quando un path cambia (update_state, emit, ctx_update) il
+# runner ricalcola solo i nodi che lo leggono e il loro cono a valle.
+# ─────────────────────────────────────────────
+
+_reads: contextvars.ContextVar[Optional[set]] = contextvars.ContextVar("flow_reads", default=None)
+
+def record_read(path: str):
+    """Registra una lettura di ctx del nodo in esecuzione (no-op fuori da un nodo tracciato)."""
+    seen = _reads.get()
+    if seen is not None:
+        seen.add(path)
+
+def _overlaps(a: str, b: str) -> bool:
+    """Vero se un cambiamento in a è visibile leggendo b (stesso path, antenato o discendente)."""
+    return a == b or a.startswith(b + ".") or b.startswith(a + ".")
+
+# ─────────────────────────────────────────────
+# PLAN
+# ─────────────────────────────────────────────
+
+class _Plan:
+    """
+    Piano di esecuzione compilato di un file, immutabile.
+
+    Ogni nodo ha un id intero (posizione in `names`); archi, radici,
+    trigger e ordine topologico sono tuple indicizzate per id, così il
+    percorso caldo del runner usa solo indicizzazione di liste.
+    networkx serve soltanto per il controllo dei cicli in add_file.
+
+      - defs[i]:     definizione del nodo (flow.node)
+      - keys[i]:     chiave "fname::node_name" nei results di sessione
+      - succ[i]:     id dei successori
+      - pred[i]:     id dei predecessori nel file
+      - dep_keys[i]: chiavi di tutti i deps dichiarati (anche esterni al file)
+      - triggers[i]: id dei nodi con trigger == names[i]
+      - auto[i]:     vero se il nodo parte in una run: root con entry/trigger/
+                     schedule, oppure non-root (arriva via dispatch dai parent)
+      - prio[i]:     corsia dichiarata dal nodo (indice in PRIORITIES), None =
+                     decisa da chi lo accoda
+      - roots:       id dei nodi senza predecessori
+      - order:       id in ordine topologico
+      - watch:       path di ctx -> id dei nodi che lo leggono; è l'unica parte
+                     che cresce dopo la compilazione (letture osservate a runtime)
+    """
+
+    __slots__ = ("fname", "names", "index", "defs", "keys", "succ", "pred",
+                 "dep_keys", "triggers", "auto", "prio", "roots", "order", "watch", "_readers")
+
+    def __init__(self, fname, names, defs, succ, pred, order):
+        self.fname    = fname
+        self.names    = tuple(names)
+        self.index    = {n: i for i, n in enumerate(self.names)}
+        self.defs     = tuple(defs)
+        self.keys     = tuple(_key(fname, n) for n in self.names)
+        self.succ     = tuple(tuple(s) for s in succ)
+        self.pred     = tuple(tuple(p) for p in pred)
+        self.dep_keys = tuple(tuple(_key(fname, dep) for dep in nd.get("deps", [])) for nd in self.defs)
+        self.order    = tuple(order)
+        self.roots    = tuple(i for i in self.order if not self.pred[i])
+
+        listeners = {}
+        for i, nd in enumerate(self.defs):
+            trg = nd.get("trigger")
+            if trg:
+                listeners.setdefault(trg, []).append(i)
+        self.triggers = tuple(tuple(listeners.get(n, ())) for n in self.names)
+
+        self.auto = tuple(
+            bool(self.pred[i]) or bool(nd.get("entry", True)) or bool(nd.get("trigger")) or bool(nd.get("schedule"))
+            for i, nd in enumerate(self.defs)
+        )
+
+        self.prio = tuple(_PRIORITY.get(nd.get("priority")) for nd in self.defs)
+
+        self.watch    = {}
+        self._readers = {}
+        for i, nd in enumerate(self.defs):
+            self.learn(i, nd.get("watch") or ())
+
+    def priority(self, i: int, origin: int) -> int:
+        """Corsia del nodo i: quella dichiarata, altrimenti quella di chi lo accoda."""
+        p = self.prio[i]
+        return origin if p is None else p
+
+    def learn(self, i: int, paths):
+        """Aggiunge i path letti dal nodo i all'indice dei lettori."""
+        for p in paths:
+            readers = self.watch.setdefault(p, set())
+            if i not in readers:
+                readers.add(i)
+                self._readers.clear()
+
+    def readers_of(self, path: str) -> frozenset:
+        """Id dei nodi che leggono path, un suo antenato o un suo discendente."""
+        hit = self._readers.get(path)
+        if hit is None:
+            hit = self._readers[path] = frozenset(
+                i for p, ids in self.watch.items() if _overlaps(path, p) for i in ids)
+        return hit
+
+    def cone(self, seeds) -> set:
+        """seeds più tutti i loro discendenti."""
+        out, stack = set(seeds), list(seeds)
+        while stack:
+            for j in self.succ[stack.pop()]:
+                if j not in out:
+                    out.add(j)
+                    stack.append(j)
+        return out
+
+    @classmethod
+    def compile(cls, fname: str, nodes: List[Dict]) -> "_Plan":
+        nm    = {n["name"]: n for n in nodes}
+        names = list(nm)
+        index = {n: i for i, n in enumerate(names)}
+        succ  = [[] for _ in names]
+        pred  = [[] for _ in names]
+
+        G = nx.DiGraph()
+        G.add_nodes_from(range(len(names)))
+        for i, n in enumerate(names):
+            for dep in nm[n].get("deps", []):
+                j = index.get(dep)
+                if j is not None and i not in succ[j]:
+                    succ[j].append(i)
+                    pred[i].append(j)
+                    G.add_edge(j, i)
+
+        if not nx.is_directed_acyclic_graph(G):
+            raise ValueError(f"Il file '{fname}' contiene cicli")
+
+        for n in names:
+            if nm[n].get("executor", "loop") not in EXECUTORS:
+                raise ValueError(f"Nodo '{n}' in '{fname}': executor sconosciuto {nm[n]['executor']!r}")
+            if nm[n].get("priority") not in _PRIORITY:
+                raise ValueError(f"Nodo '{n}' in '{fname}': priority sconosciuta {nm[n]['priority']!r} "
+                                 f"(attese: {', '.join(PRIORITIES)})")
+
+        return cls(fname, names, [nm[n] for n in names], succ, pred, nx.topological_sort(G))
+
+    def extend(self, node_def: dict) -> "_Plan":
+        """Nuovo piano con un nodo foglia in più (usato da attach_node)."""
+        i     = len(self.names)
+        succ  = [list(s) for s in self.succ] + [[]]
+        pred  = [list(p) for p in self.pred] + [[]]
+        for dep in node_def.get("deps", []):
+            j = self.index.get(dep)
+            if j is not None and i not in succ[j]:
+                succ[j].append(i)
+                pred[i].append(j)
+        return _Plan(self.fname, self.names + (node_def["name"],), self.defs + (node_def,),
+                     succ, pred, self.order + (i,))
+
+# ─────────────────────────────────────────────
+# SCHEDULER
+# ─────────────────────────────────────────────
+
+# Classi di priorità dei nodi, dalla più urgente. Senza `priority` esplicita
+# un nodo prende quella di chi lo accoda:
+#   interactive — emit / update_state (eventi dell'utente) e il loro cono
+#   normal      — run_file
+#   background  — tick dei nodi `schedule`
+# e i nodi accodati da dispatch, trigger e hook ereditano quella del parent.
+PRIORITIES = ("interactive", "normal", "background")
+INTERACTIVE, NORMAL, BACKGROUND = range(len(PRIORITIES))
+_PRIORITY = {name: b for b, name in enumerate(PRIORITIES)} | {None: None}
+
+class _Scheduler:
+    """
+    Coda di esecuzione del DagRunner: una banda per priorità (PRIORITIES)
+    e, dentro ogni banda, una corsia per sessione.
+
+    Si serve sempre la banda più prioritaria con lavoro, salvo che una
+    inferiore sia stata scavalcata `starve` volte di fila: allora tocca a
+    lei (anti-starvation). Sotto un carico di background continuo un click
+    attende al più il nodo in corso; il background avanza comunque di
+    almeno un nodo ogni `starve`.
+
+    Nella banda le sessioni con nodi in attesa sono servite a turno (round-robin):
+    weights[sid] indica quanti nodi consecutivi servire a una sessione
+    prima di passare alla successiva (default 1). Un burst di una sessione
+    (heartbeat, foreach, fan-out) ritarda le altre al più di un turno.
+    Un item è (sid, fname, node_id, banda).
+
+    Espone il sottoinsieme di asyncio.Queue usato dal runner:
+    put_nowait / get / qsize / empty.
+
+    Admission control: oltre `high` nodi in coda la coda è satura finché
+    non scende a `low`. put_nowait accetta sempre (il lavoro già avviato,
+    cioè dispatch, hook e timer, deve poter finire); il lavoro nuovo passa
+    da admit(), che lo fa attendere o lo rifiuta con asyncio.QueueFull.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, int]] = None, on_put: Optional[Callable] = None,
+                 high: Optional[int] = None, low: Optional[int] = None, starve: int = 8):
+        bands = range(len(PRIORITIES))
+        self.weights = weights if weights is not None else {}
+        self.lanes   = [{} for _ in bands]        # per banda: sid -> deque di item
+        self.active  = [deque() for _ in bands]   # per banda: sid con lavoro in attesa, in ordine di turno
+        self.sizes   = [0 for _ in bands]         # item in coda per banda
+        self.served  = [0 for _ in bands]         # item serviti per banda (metrica)
+        self.starve  = max(1, starve)
+        self._skipped = [0 for _ in bands]        # volte di fila che la banda è stata scavalcata
+        self._turn   = [0 for _ in bands]         # nodi serviti alla sessione in testa nel turno corrente
+        self._size   = 0
+        self._items  = asyncio.Semaphore(0)
+        self._on_put = on_put
+
+        self.high      = high
+        self.low       = low if low is not None else (high // 2 if high else None)
+        self.saturated = False
+        self._waiters  = deque() # future di admit() in attesa, in ordine di arrivo
+        self.peak      = 0
+        self.admitted  = 0
+        self.delayed   = 0
+        self.rejected  = 0
+        self.wait_total = 0.0
+        self.wait_max   = 0.0
+        self.stamps     = None    # item -> istante di accodamento (solo con il profiler)
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def put_nowait(self, item):
+        sid, b = item[0], item[3]
+        lanes  = self.lanes[b]
+        lane   = lanes.get(sid)
+        if lane is None:
+            lane = lanes[sid] = deque()
+            self.active[b].append(sid)
+        lane.append(item)
+        if self.stamps is not None and item not in self.stamps:
+            self.stamps[item] = time.perf_counter()
+        self.sizes[b] += 1
+        self._size    += 1
+        if self._size > self.peak:
+            self.peak = self._size
+        if self.high and self._size >= self.high:
+            self.saturated = True
+        self._items.release()
+        if self._on_put:
+            self._on_put(self._size)
+
+    async def get(self):
+        await self._items.acquire()
+        b      = self._band()
+        active = self.active[b]
+        sid    = active[0]
+        lane   = self.lanes[b][sid]
+        item   = lane.popleft()
+        self.sizes[b]  -= 1
+        self.served[b] += 1
+        self._size     -= 1
+        self._turn[b]  += 1
+        if self.high and self._size <= self.low:
+            self.saturated = False
+            if self._waiters:
+                self._wake()
+        if not lane:
+            del self.lanes[b][sid]
+            active.popleft()
+            self._turn[b] = 0
+        elif self._turn[b] >= self.weights.get(sid, 1):
+            active.rotate(-1)
+            self._turn[b] = 0
+        return item
+
+    def _band(self) -> int:
+        """Banda da servire: la più prioritaria con lavoro, o una inferiore rimasta indietro troppo."""
+        sizes, skipped = self.sizes, self._skipped
+        top = starved = None
+        for b, n in enumerate(sizes):
+            if n:
+                if top is None:
+                    top = b
+                elif starved is None and skipped[b] >= self.starve:
+                    starved = b
+        b = top if starved is None else starved
+        skipped[b] = 0
+        for lower in range(b + 1, len(sizes)):
+            if sizes[lower]:
+                skipped[lower] += 1
+        return b
+
+    @property
+    def busy(self) -> bool:
+        """Vero se il nuovo lavoro deve attendere (coda satura o altri già in attesa)."""
+        return self.saturated or bool(self._waiters)
+
+    def has_room(self, b: int) -> bool:
+        """Vero se la banda b è sotto il watermark basso: a coda satura di lavoro meno urgente può ancora entrare."""
+        return self.high is not None and self.sizes[b] < self.low
+
+    def _wake(self):
+        """Sveglia al più (high - low) attese, in ordine di arrivo: non tutte insieme."""
+        for _ in range(min(len(self._waiters), max(1, self.high - self.low))):
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+        # Se i risvegliati non accodano nulla nessun get() arriverebbe a svegliare gli altri
+        if self._waiters:
+            asyncio.get_running_loop().call_soon(self._recheck)
+
+    def _recheck(self):
+        if self._waiters and not self.saturated and self._size <= self.low:
+            self._wake()
+
+    async def admit(self, shed: bool = False):
+        """Ammette nuovo lavoro: subito se la coda non è satura, altrimenti attende o rifiuta."""
+        if not self.busy:
+            self.admitted += 1
+            return
+        if shed:
+            self.rejected += 1
+            raise asyncio.QueueFull(f"FLOW -> coda satura ({self._size} nodi, soglia {self.high})")
+        self.delayed += 1
+        t0 = time.perf_counter()
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        await fut
+        waited = time.perf_counter() - t0
+        self.wait_total += waited
+        self.wait_max    = max(self.wait_max, waited)
+        self.admitted   += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth":       self._size,
+            "peak":        self.peak,
+            "high":        self.high,
+            "low":         self.low,
+            "saturated":   self.saturated,
+            "waiting":     len(self._waiters),
+            "admitted":    self.admitted,
+            "delayed":     self.delayed,
+            "rejected":    self.rejected,
+            "wait_avg_ms": self.wait_total / self.delayed * 1e3 if self.delayed else 0.0,
+            "wait_max_ms": self.wait_max * 1e3,
+            "bands":       {name: {"depth": self.sizes[b], "served": self.served[b]}
+                            for b, name in enumerate(PRIORITIES)},
+        }
+
+# ─────────────────────────────────────────────
+# TIMERS — nodi `schedule` di tutte le sessioni
+# ─────────────────────────────────────────────
+
+class _Timers:
+    """
+    Un solo heap di scadenze per tutti i nodi schedulati del runner, servito
+    da un unico TimerHandle dell'event loop: nessun Task per nodo.
+
+    Voce: (scadenza, seq, sid, fname, name, interval, jitter). Le scadenze
+    sono arrotondate a `resolution`, così i tick vicini scadono insieme e
+    arrivano a `fire` in un solo batch; `fire` restituisce le voci da
+    ripianificare. Una voce vale finché session["schedulers"][k] == seq:
+    chiudere o espellere la sessione la invalida senza toccare l'heap.
+    """
+
+    def __init__(self, fire: Callable, resolution: float = 0.01):
+        self.heap       = []
+        self.fire       = fire
+        self.resolution = resolution
+        self._seq       = itertools.count(1)
+        self._handle    = None
+        self._at        = None
+
+    def __len__(self):
+        return len(self.heap)
+
+    def _push(self, now: float, entry: tuple):
+        _, seq, sid, fname, name, interval, jitter = entry
+        at = now + interval + (random.uniform(0, jitter) if jitter else 0)
+        if self.resolution:
+            at = math.ceil(at / self.resolution) * self.resolution
+        heapq.heappush(self.heap, (at, seq, sid, fname, name, interval, jitter))
+
+    def add(self, sid: str, fname: str, name: str, interval: float, jitter: float = 0) -> int:
+        loop = asyncio.get_running_loop()
+        seq  = next(self._seq)
+        self._push(loop.time(), (None, seq, sid, fname, name, interval, jitter))
+        self.arm(loop)
+        return seq
+
+    def arm(self, loop=None):
+        if not self.heap:
+            return
+        at = self.heap[0][0]
+        if self._handle is not None:
+            if self._at <= at:
+                return
+            self._handle.cancel()
+        loop = loop or asyncio.get_running_loop()
+        self._at, self._handle = at, loop.call_at(at, self._run)
+
+    def _run(self):
+        loop  = asyncio.get_running_loop()
+        now   = loop.time()
+        limit = max(now, self._at)   # call_at può scattare con un leggero anticipo
+        self._handle = None
+        batch = []
+        while self.heap and self.heap[0][0] <= limit:
+            batch.append(heapq.heappop(self.heap))
+        try:
+            for entry in self.fire(batch):
+                self._push(now, entry)
+        finally:
+            self.arm(loop)
+
+    def cancel(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+class _Expired(asyncio.TimeoutError):
+    """Scadenza del timeout del nodo o della deadline della run, distinta dai TimeoutError sollevati dalla fn."""
+
+class _Watchdog:
+    """
+    Timeout delle fn dei nodi senza un timer del loop per chiamata
+    (asyncio.timeout / wait_for): un solo handle armato sulla scadenza più
+    vicina. Le chiamate in corso sono al più una per worker, quindi quando
+    scatta basta scorrerle tutte e cancellare il task di quelle scadute.
+    """
+
+    __slots__ = ("running", "_handle", "_at")
+
+    def __init__(self):
+        self.running = {}     # task -> [scadenza (loop.time), scaduta]
+        self._handle = None
+        self._at     = None
+
+    async def bound(self, aw, seconds: Optional[float]):
+        """Come bounded(aw, seconds); alla scadenza solleva _Expired (un asyncio.TimeoutError)."""
+        if seconds is None:
+            return await aw
+        loop  = asyncio.get_running_loop()
+        task  = asyncio.current_task()
+        entry = self.running[task] = [loop.time() + seconds, False]
+        if self._at is None or entry[0] < self._at:
+            self._arm(loop, entry[0])
+        delivered = False
+        try:
+            return await aw
+        except asyncio.CancelledError:
+            if not entry[1]:
+                raise
+            delivered = True
+            if hasattr(task, "uncancel"):
+                task.uncancel()
+            raise _Expired from None
+        finally:
+            del self.running[task]
+            if entry[1] and not delivered:
+                # Scaduta mentre il risultato era già pronto: la cancellazione
+                # pendente arriverebbe al prossimo await del worker
+                try:
+                    await asyncio.sleep(0)
+                except asyncio.CancelledError:
+                    if hasattr(task, "uncancel"):
+                        task.uncancel()
+
+    def _arm(self, loop, at: float):
+        if self._handle is not None:
+            self._handle.cancel()
+        self._at, self._handle = at, loop.call_at(at, self._run, loop)
+
+    def _run(self, loop):
+        self._handle = self._at = None
+        now, nxt = loop.time(), None
+        for task, entry in self.running.items():
+            if entry[0] <= now:
+                if not entry[1]:
+                    entry[1] = True
+                    task.cancel()
+            elif nxt is None or entry[0] < nxt:
+                nxt = entry[0]
+        if nxt is not None:
+            self._arm(loop, nxt)
+
+    def cancel(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = self._at = None
+
+# ─────────────────────────────────────────────
+# LIMITI DI CONCORRENZA — max_concurrency / limited()
+# ─────────────────────────────────────────────
+
+class _Limiter:
+    """
+    Semaforo equo del DagRunner: al più `limit` chiamate insieme, tra tutte
+    le sessioni. Chi trova i posti occupati attende in coda FIFO e il posto
+    liberato passa direttamente al primo in coda, quindi un nuovo arrivato
+    non scavalca chi aspetta già (a differenza di asyncio.Semaphore).
+    Conta chiamate, attese e tempo in coda.
+    """
+
+    __slots__ = ("limit", "active", "waiters", "calls", "queued", "peak", "wait_total", "wait_max")
+
+    def __init__(self, limit: int):
+        self.limit      = limit
+        self.active     = 0
+        self.waiters    = deque()   # future in attesa di un posto, in ordine di arrivo
+        self.calls      = 0
+        self.queued     = 0         # chiamate che hanno dovuto attendere
+        self.peak       = 0         # massimo di chiamate in coda
+        self.wait_total = 0.0
+        self.wait_max   = 0.0
+
+    async def run(self, aw):
+        """Attende un posto ed esegue aw; se cancellato in coda, aw non parte."""
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            self.waiters.append(fut)
+            if len(self.waiters) > self.peak:
+                self.peak = len(self.waiters)
+            t0 = time.perf_counter()
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self._release()        # posto ricevuto ma non usato: passa al successivo
+                aw.close()
+                raise
+            dt = time.perf_counter() - t0
+            self.queued     += 1
+            self.wait_total += dt
+            if dt > self.wait_max:
+                self.wait_max = dt
+        self.calls += 1
+        try:
+            return await aw
+        finally:
+            self._release()
+
+    def _release(self):
+        # Dopo un resize al ribasso i posti in eccesso si chiudono invece di
+        # passare in coda: si consegna solo finché active resta entro limit
+        if self.active <= self.limit:
+            while self.waiters:
+                fut = self.waiters.popleft()
+                if not fut.done():         # le attese cancellate restano in coda come future annullate
+                    fut.set_result(None)
+                    return
+        self.active -= 1
+
+    def resize(self, limit: int):
+        self.limit = limit
+        while self.active < self.limit and self.waiters:
+            fut = self.waiters.popleft()
+            if not fut.done():
+                self.active += 1
+                fut.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit":       self.limit,
+            "active":      self.active,
+            "waiting":     sum(1 for f in self.waiters if not f.done()),
+            "calls":       self.calls,
+            "queued":      self.queued,
+            "peak_queue":  self.peak,
+            "wait_avg_ms": self.wait_total / self.queued * 1e3 if self.queued else 0.0,
+            "wait_max_ms": self.wait_max * 1e3,
+        }
+
+# ─────────────────────────────────────────────
+# SPILL — sessioni inattive su disco
+# ─────────────────────────────────────────────
+
+class _DiskSpill:
+    """
+    Adapter di persistenza locale per le sessioni espulse dal DagRunner:
+    un file pickle per sessione. Qualsiasi oggetto con la stessa interfaccia
+    (save / load / drop, opzionale raw) può essere passato al runner come `spill`.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or tempfile.mkdtemp(prefix="flow-sessions-")
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, sid: str) -> str:
+        return os.path.join(self.path, hashlib.blake2b(sid.encode(), digest_size=16).hexdigest())
+
+    def save(self, sid: str, state: Dict):
+        with open(self._file(sid), "wb") as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+
+    def load(self, sid: str) -> Optional[Dict]:
+        try:
+            with open(self._file(sid), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        finally:
+            self.drop(sid)
+
+    def raw(self, sid: str) -> Optional[bytes]:
+        """Stato serializzato di sid, senza rimuoverlo."""
+        try:
+            with open(self._file(sid), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def drop(self, sid: str):
+        try:
+            os.remove(self._file(sid))
+        except FileNotFoundError:
+            pass
+
+# ─────────────────────────────────────────────
+# SNAPSHOT — checkpoint di tutte le sessioni in un solo file
+#
+#   MAGIC | record zlib(pickle(stato)) ... | indice pickle {sid: (off, len)} | off indice (8 byte)
+#
+# All'avvio si legge solo l'indice: ogni sessione viene decompressa
+# la prima volta che l'utente torna (stessa interfaccia dello spill).
+# ─────────────────────────────────────────────
+
+_SNAP_MAGIC = b"FLOWSNAP1\n"
+_SNAP_TAIL  = struct.Struct("<Q")
+
+class _Snapshot:
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(_SNAP_MAGIC)) != _SNAP_MAGIC:
+                raise ValueError(f"'{path}' non è uno snapshot di sessioni")
+            f.seek(-_SNAP_TAIL.size, os.SEEK_END)
+            end = f.tell()
+            (off,) = _SNAP_TAIL.unpack(f.read(_SNAP_TAIL.size))
+            f.seek(off)
+            self.index = pickle.loads(f.read(end - off))
+
+    @staticmethod
+    def write(path: str, records) -> "_Snapshot":
+        """Scrive (sid, stato serializzato) in modo atomico: tmp + rename."""
+        tmp, index = f"{path}.tmp", {}
+        with open(tmp, "wb") as f:
+            f.write(_SNAP_MAGIC)
+            for sid, raw in records:
+                blob = zlib.compress(raw, 1)
+                index[sid] = (f.tell(), len(blob))
+                f.write(blob)
+            off = f.tell()
+            f.write(pickle.dumps(index, pickle.HIGHEST_PROTOCOL))
+            f.write(_SNAP_TAIL.pack(off))
+        os.replace(tmp, path)
+        return _Snapshot(path)
+
+    def raw(self, sid: str) -> Optional[bytes]:
+        entry = self.index.get(sid)
+        if entry is None:
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(entry[0])
+            return zlib.decompress(f.read(entry[1]))
+
+    def load(self, sid: str) -> Optional[Dict]:
+        raw = self.raw(sid)
+        return pickle.loads(raw) if raw is not None else None
+
+    def drop(self, sid: str):
+        pass   # il file resta valido fino al prossimo checkpoint
+
+def _split_picklable(d: Dict):
+    """Separa le voci serializzabili di d da quelle che non lo sono (callable, manager, ...)."""
+    data, refs = {}, {}
+    for k, v in d.items():
+        try:
+            data[k] = pickle.dumps(v, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            refs[k] = v
+    return data, refs
+
+# ─────────────────────────────────────────────
+# PROFILER — tempi dei nodi per run
+# ─────────────────────────────────────────────
+
+_HIST_MS = (0.01, 0.1, 1, 10, 100, 1000, math.inf)   # limiti superiori dei bucket
+
+def _summary(values: List[float]) -> Dict[str, Any]:
+    """p50/p95/p99/max e istogramma per decadi di una serie di durate in ms."""
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    at     = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    hist   = dict.fromkeys(_HIST_MS, 0)
+    for v in values:
+        hist[next(b for b in _HIST_MS if v < b)] += 1
+    return {"count": len(values), "p50": at(0.5), "p95": at(0.95), "p99": at(0.99),
+            "max": values[-1], "hist": {b: n for b, n in hist.items() if n}}
+
+class _Profiler:
+    """
+    Ring buffer dei tempi dei nodi eseguiti (DagRunner(profile=N)).
+
+    Un record è una tupla (fname, node, sid, run, enqueued, started, ended,
+    fn, hooks, attempts, ok), istanti in secondi di perf_counter:
+      - run:      versione della run_file della sessione (session["files"])
+      - enqueued: messa in coda del nodo, None se non è passato dalla coda
+      - fn/hooks: secondi spesi nella fn (tentativi compresi) e negli hook
+    Dalla messa in coda all'avvio è attesa in coda; dall'inizio della run
+    alla messa in coda è attesa dei parent (gating).
+    """
+
+    __slots__ = ("records", "starts")
+
+    def __init__(self, size: int):
+        self.records = deque(maxlen=size)
+        self.starts  = OrderedDict()      # (sid, fname, run) -> inizio della run
+
+    def begin(self, sid: str, fname: str, run: int):
+        self.starts[(sid, fname, run)] = time.perf_counter()
+        if len(self.starts) > self.records.maxlen:
+            self.starts.popitem(last=False)
+
+    def _runs(self, fname: str) -> "OrderedDict":
+        """(sid, run) -> {node -> ultimo record}, in ordine di inizio run."""
+        runs = OrderedDict()
+        for rec in self.records:
+            if rec[0] == fname:
+                runs.setdefault((rec[2], rec[3]), {})[rec[1]] = rec
+        return runs
+
+    def nodes(self, fname: Optional[str]) -> Dict[str, Dict]:
+        phases = {}
+        for f, name, sid, run, enq, t0, t1, tf, th, attempts, ok in self.records:
+            if fname is not None and f != fname:
+                continue
+            p = phases.get((f, name))
+            if p is None:
+                p = phases[(f, name)] = {"count": 0, "errors": 0, "retries": 0,
+                                         "gate": [], "queue": [], "hooks": [], "fn": [], "total": []}
+            p["count"]   += 1
+            p["errors"]  += not ok
+            p["retries"] += max(0, attempts - 1)
+            start = self.starts.get((sid, f, run))
+            if enq is not None:
+                p["queue"].append((t0 - enq) * 1e3)
+                if start is not None and enq >= start:
+                    p["gate"].append((enq - start) * 1e3)
+            p["hooks"].append(th * 1e3)
+            p["fn"].append(tf * 1e3)
+            p["total"].append((t1 - t0) * 1e3)
+        return {
+            (name if fname is not None else _key(f, name)):
+                {k: _summary(v) if isinstance(v, list) else v for k, v in p.items()}
+            for (f, name), p in phases.items()
+        }
+
+    def critical_path(self, plan: "_Plan", runs: int) -> Dict[str, Any]:
+        """
+        Cammino critico delle ultime `runs` run di plan: dal nodo che finisce per
+        ultimo si risale sempre al parent terminato più tardi. Il contributo di un
+        nodo è il tempo tra la fine del suo predecessore sul cammino (o l'inizio
+        della run) e la propria fine: la somma è la durata della run.
+        """
+        recent = list(self._runs(plan.fname).items())[-runs:]
+        share, slowest = {}, None
+        for (sid, run), recs in recent:
+            start = self.starts.get((sid, plan.fname, run))
+            if start is None:
+                start = min(r[4] if r[4] is not None else r[5] for r in recs.values())
+            path, cur, seen = [], max(recs.values(), key=lambda r: r[6]), set()
+            while cur is not None and cur[1] not in seen:
+                seen.add(cur[1])
+                path.append(cur)
+                i       = plan.index.get(cur[1])
+                parents = [recs[plan.names[p]] for p in plan.pred[i] if plan.names[p] in recs] if i is not None else []
+                cur     = max(parents, key=lambda r: r[6]) if parents else None
+            path.reverse()
+            steps, prev = [], start
+            for r in path:
+                steps.append({"node": r[1], "ms": (r[6] - prev) * 1e3,
+                              "queue_ms": (r[5] - r[4]) * 1e3 if r[4] is not None else 0.0,
+                              "hooks_ms": r[8] * 1e3, "fn_ms": r[7] * 1e3})
+                prev = r[6]
+            total = (prev - start) * 1e3
+            for s in steps:
+                agg = share.setdefault(s["node"], [0, 0.0])
+                agg[0] += 1
+                agg[1] += s["ms"]
+            if slowest is None or total > slowest["ms"]:
+                slowest = {"sid": sid, "ms": total, "path": steps}
+        return {
+            "runs":    len(recent),
+            "slowest": slowest,
+            # quante run hanno il nodo sul cammino critico e il suo contributo medio
+            "nodes":   {n: {"runs": c, "ms": ms / c} for n, (c, ms) in
+                        sorted(share.items(), key=lambda kv: -kv[1][1])},
+        }
+
+    def folded(self, fname: Optional[str]) -> List[str]:
+        """Stack "fname;node;fase microsecondi" (flamegraph.pl, speedscope, inferno)."""
+        acc = {}
+        for f, name, sid, run, enq, t0, t1, tf, th, attempts, ok in self.records:
+            if fname is not None and f != fname:
+                continue
+            for phase, dt in (("queue", t0 - enq if enq is not None else 0.0), ("hooks", th),
+                              ("fn", tf), ("engine", (t1 - t0) - tf - th)):
+                if dt > 0:
+                    stack = f"{f};{name};{phase}"
+                    acc[stack] = acc.get(stack, 0.0) + dt
+        return [f"{stack} {round(dt * 1e6)}" for stack, dt in acc.items() if dt >= 1e-6]
+
 # ─────────────────────────────────────────────
 # ENGINE
 # ─────────────────────────────────────────────
 
 class DagRunner:
+    """
+    Esegue i DAG dei file registrati per molte sessioni con un solo gruppo
+    di worker. Il dettaglio di ogni parte sta nella sua classe: coda e
+    priorità in _Scheduler, ctx a livelli in _Ctx, nodi `schedule` in
+    _Timers, timeout in _Watchdog, max_concurrency in _Limiter, spill in
+    _DiskSpill, profilo in _Profiler.
+
+    workers / max_workers / scale_depth: worker fissi e autoscaling
+    weights:      {sid: peso} del round-robin tra le sessioni
+    memo_entries / memo_bytes: limiti della cache dei nodi `memo`
+    session_ttl / max_sessions / spill: espulsione delle sessioni inattive
+    checkpoint_path / checkpoint_every: snapshot delle sessioni per restore()
+    timer_resolution: granularità (secondi) delle scadenze dei nodi `schedule`
+    queue_high / queue_low / overload: admission control ("delay" o "shed")
+    incremental:  run_file e update_state ricalcolano solo il cono dei path cambiati
+    builtins:     voci comuni a tutte le sessioni, livello più basso del ctx
+    profile:      nodi registrati dal profiler (default disattivato)
+    starve_after: turni di fila di una banda prima di servire una inferiore
+    """
 
-    def __init__(self, workers: int = 3):
-        self.workers = workers
-
-        self.graphs   = {}   # fname -> DiGraph
+    def __init__(self, workers: int = 3, max_workers: Optional[int] = None,
+                 scale_depth: int = 8, weights: Optional[Dict[str, int]] = None,
+                 memo_entries: int = 1024, memo_bytes: int = 64 * 2**20,
+                 session_ttl: Optional[float] = None, max_sessions: Optional[int] = None,
+                 spill=None, checkpoint_path: Optional[str] = None,
+                 checkpoint_every: Optional[float] = None,
+                 timer_resolution: float = 0.01, incremental: bool = False,
+                 queue_high: Optional[int] = None, queue_low: Optional[int] = None,
+                 overload: str = "delay", builtins: Optional[Mapping] = None,
+                 profile: Optional[int] = None, starve_after: int = 8):
+        self.workers     = workers
+        self.max_workers = max(workers, max_workers or workers)
+        self.scale_depth = scale_depth
+        self.incremental = incremental
+
+        self.plans    = {}   # fname -> _Plan compilato
+        self.execs    = {}   # fname -> (esecutore compilato per node id, ...)
         self.nodes    = {}   # fname -> {node_name -> node_def}
-        self.triggers = {}   # fname -> {node_name -> [listeners]}
-
-        self._file_defaults = {}
 
-        self.sessions  = {}
-        self.queue     = asyncio.Queue()
+        self.builtins  = builtins if builtins is not None else {}
+        self.defaults  = {}   # default dei nodi di tutti i file, annidati per path
+        self._defaults_log = []   # (path, valore) in ordine di add_file
+
+        self.sessions  = OrderedDict()   # sid -> sessione residente, in ordine LRU
+        self.spilled   = {}              # sid -> (sorgente, voci di ctx non serializzabili)
+        self.session_ttl  = session_ttl
+        self.max_sessions = max_sessions
+        self.spill     = spill if spill is not None else (
+            _DiskSpill() if session_ttl or max_sessions else None)
+        self.evictions    = 0
+        self.rehydrations = 0
+        self._reaper   = None
+        self.checkpoint_path  = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self._checkpointer    = None
+        self.queue     = _Scheduler(weights, on_put=self._autoscale, high=queue_high, low=queue_low,
+                                    starve=starve_after)
+        self.overload  = overload
+        self.memo      = _Memo(memo_entries, memo_bytes)
+        self.timers    = _Timers(self._fire_timers, timer_resolution)
+        self.watchdog  = _Watchdog()
+        self.profiler  = _Profiler(profile) if profile else None
+        if self.profiler is not None:
+            self.queue.stamps = {}
         self.tasks     = []
         self.running   = False
 
         self.cancelled_sessions: set = set()
+        self._clock = itertools.count(1)   # versioni monotone dei risultati
+        self.timeouts: Dict[str, int] = {}   # "fname::node_name" -> scadenze
+        self.limiters: Dict[str, _Limiter] = {}   # max_concurrency / limited() -> semaforo
 
     # ─────────────────────────────────────────
     # FILE
     # ─────────────────────────────────────────
 
     async def add_file(self, name: str, nodes: List[Dict]):
-        G  = nx.DiGraph()
-        nm = {n["name"]: n for n in nodes}
-        self.triggers[name] = {}
+        plan = _Plan.compile(name, nodes)
 
+        self.memo.invalidate(name)
+        self.plans[name] = plan
+        self.execs[name] = tuple(self._compile_node(plan, i) for i in range(len(plan.names)))
+        self.nodes[name] = dict(zip(plan.names, plan.defs))
+        # Solo il livello condiviso: le sessioni vive li vedono alla prossima lettura
         for n in nodes:
-            G.add_node(n["name"])
-            for d in n.get("deps", []):
-                if d in nm:
-                    G.add_edge(d, n["name"])
-            trg = n.get("trigger")
-            if trg:
-                self.triggers[name].setdefault(trg, []).append(n["name"])
-
-        if not nx.is_directed_acyclic_graph(G):
-            raise ValueError(f"Il file '{name}' contiene cicli")
-
-        self.graphs[name] = G
-        self.nodes[name]  = nm
-        self._file_defaults[name] = {
-            n["name"]: n["default"]
-            for n in nodes
-            if n.get("default") is not None
-        }
-
-        for session in self.sessions.values():
-            for k, v in self._file_defaults[name].items():
-                _set_default(session["ctx"], k, v)
+            if n.get("default") is not None:
+                _set_default(self.defaults, n["name"], n["default"])
+                self._defaults_log.append((n["name"], n["default"]))
 
     async def delete_file(self, name: str):
-        for store in (self.graphs, self.nodes, self.triggers):
+        for store in (self.plans, self.execs, self.nodes):
             store.pop(name, None)
+        self.memo.invalidate(name)
 
     def attach_node(self, fname: str, node_def: dict):
         """Aggiunge dinamicamente un nodo reattivo a un DAG."""
-        if fname not in self.graphs:
+        if fname not in self.plans:
             return
             
         name = node_def["name"]
@@ -332,11 +1577,13 @@ class DagRunner:
             return
             
         self.nodes[fname][name] = node_def
-        self.graphs[fname].add_node(name)
-        
-        for dep in node_def.get("deps", []):
-            if dep in self.nodes[fname]:
-                self.graphs[fname].add_edge(dep, name)
+        plan = self.plans[fname] = self.plans[fname].extend(node_def)
+        # i parent del nuovo nodo hanno nuovi successori: vanno ricompilati
+        parents = set(plan.pred[-1])
+        self.execs[fname] = tuple(
+            self._compile_node(plan, i) if i in parents else ex
+            for i, ex in enumerate(self.execs[fname])
+        ) + (self._compile_node(plan, len(plan.names) - 1),)
 
     # ─────────────────────────────────────────
     # SESSION — identità utente persistente
@@ -351,32 +1598,51 @@ class DagRunner:
         Inizializza o aggiorna una sessione persistente.
         Se esiste già, unisce il nuovo contesto a quello esistente.
         """
-        session = self.sessions.setdefault(sid, {
-            "ctx":           {},
+        session = self._resident(sid) or self.sessions.setdefault(sid, self._new_session())
+
+        # default dei file e builtins sono livelli condivisi del ctx (priorità minima)
+        if ctx:
+            session["ctx"].maps[0].update(ctx)
+
+        self._touch(sid, session)
+        self._enforce_cap()
+
+    def _new_session(self) -> Dict:
+        return {
+            "ctx":           _Ctx({}, self.defaults, self.builtins),
             "results":       {},       # "fname::node_name" -> Result
             "done":          {},       # "fname::node_name" -> Event
             "schedulers":    {},       # "fname::node_name" -> Task heartbeat
             "running_files": set(),    # fname attualmente in esecuzione
-        })
-
-        # 1. inietta i default di tutti i file registrati — priorità minima
-        for defaults in self._file_defaults.values():
-            for k, v in defaults.items():
-                _set_default(session["ctx"], k, v)
+            "ready":         _Readiness(),
+            "touched":       time.monotonic(),
+            "paths":         {},       # path di ctx -> versione dell'ultimo cambiamento
+            "files":         {},       # fname -> versione all'avvio dell'ultima run
+            "deadlines":     {},       # fname -> scadenza (time.monotonic) che limita i nodi
+            "runs":          {},       # fname -> scadenze delle run in corso (None: senza)
+            "defaults":      len(self._defaults_log),   # default dei file già visti dalle voci della sessione
+        }
 
-        if ctx:
-            session["ctx"].update(ctx)
+    def has_session(self, sid: str) -> bool:
+        """Vero se la sessione esiste, residente o espulsa su spill."""
+        return sid in self.sessions or sid in self.spilled
 
     def context(self, sid: str) -> Dict:
         """Restituisce il contesto della sessione sid."""
-        return self.sessions.get(sid, {}).get("ctx", {})
+        session = self._resident(sid)
+        return session["ctx"] if session else {}
 
-    async def run_file(self, sid: str, fname: str, ctx_update: Optional[Dict] = None):
+    async def run_file(self, sid: str, fname: str, ctx_update: Optional[Dict] = None,
+                       overload: Optional[str] = None, timeout: Optional[float] = None):
         """
         Esegue un file specifico sulla sessione esistente.
 
         ctx_update: aggiorna il ctx prima dell'esecuzione
                     (tipicamente il body della request HTTP)
+        overload:   "delay" / "shed" se la coda è satura (default self.overload)
+        timeout:    deadline della richiesta in secondi, attesa in coda compresa;
+                    limita anche ogni nodo innescato da questa run. Allo scadere
+                    solleva asyncio.TimeoutError
 
         Aspetta solo i nodi one-shot.
         I nodi schedulati continuano in background fino a close_session.
@@ -384,76 +1650,239 @@ class DagRunner:
 
         Ritorna: dict {node_name -> Result} dei nodi del file eseguito.
         """
-        if sid not in self.sessions:
+        if not self.has_session(sid):
             raise ValueError(f"FLOW -> Sessione '{sid}' non trovata.")
-        if fname not in self.graphs:
+        if fname not in self.plans:
             raise ValueError(f"File '{fname}' non registrato.")
 
-        session = self.sessions[sid]
+        plan     = self.plans[fname]
+        deadline = time.monotonic() + timeout if timeout is not None else None
 
-        # Aggiorna ctx con i dati della richiesta corrente usando deep merge
-        # le chiavi esistenti (impostate da update_state/messenger.post) hanno priorità
-        if ctx_update:
-            _deep_merge_defaults(session["ctx"], ctx_update)
-
-        session["running_files"].add(fname)
+        try:
+            await bounded(self.queue.admit((overload or self.overload) == "shed"), timeout)
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(f"FLOW -> run_file '{fname}' oltre la deadline ({timeout}s) in coda") from None
+
+        # Risolta solo dopo l'ammissione: durante l'attesa in coda la sessione
+        # è inattiva e può essere espulsa (o chiusa)
+        session = self._resident(sid)
+        if session is None:
+            raise ValueError(f"FLOW -> Sessione '{sid}' non trovata.")
+        self._touch(sid, session)
+        last = self._begin(sid, session, plan, ctx_update, deadline)
 
-        # Inizializza/resetta gli eventi done per i nodi di questo file
-        for n in self.nodes[fname]:
-            session["done"][_key(fname, n)] = asyncio.Event()
+        if not self.running:
+            await self.start()
 
+        try:
+            await self._settle(session, plan, self._trigger(sid, session, plan, last), deadline)
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(f"FLOW -> run_file '{fname}' oltre la deadline ({timeout}s)") from None
+        self._touch(sid, session)
+        return self._file_results(session, plan)
+
+    async def run_many(self, sids, fname: str, ctx_update: Optional[Dict] = None,
+                       updates: Optional[Dict[str, Dict]] = None, overload: Optional[str] = None,
+                       timeout: Optional[float] = None):
+        """
+        Esegue fname su molte sessioni in un solo passaggio (broadcast: dashboard
+        di tutti i client connessi, cambio di policy, ...).
+
+        ctx_update: aggiornamento comune a tutte le sessioni (copiato per sessione)
+        updates:    {sid -> aggiornamento} specifico, applicato dopo ctx_update
+        overload / timeout: come run_file, ma un'unica ammissione in coda e
+                    un'unica deadline per l'intero batch
+
+        Piano e validazioni sono risolti una volta sola, le radici di tutte le
+        sessioni vengono accodate insieme e le attese non creano né un task per
+        nodo né uno per sessione. I nodi `memo` con gli stessi input vengono
+        eseguiti una volta sola per tutto il batch (cache condivisa).
+
+        Generatore asincrono: produce (sid, {node_name -> Result}) nell'ordine di
+        sids; per le sessioni non trovate o oltre la deadline il secondo
+        elemento è l'eccezione invece del dict.
+        """
+        if fname not in self.plans:
+            raise ValueError(f"File '{fname}' non registrato.")
+        plan     = self.plans[fname]
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            await bounded(self.queue.admit((overload or self.overload) == "shed"), timeout)
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(f"FLOW -> run_many '{fname}' oltre la deadline ({timeout}s) in coda") from None
         if not self.running:
             await self.start()
 
-        # Enqueue i root node
-        '''for n in self.graphs[fname].nodes:
-            if self.graphs[fname].in_degree(n) == 0 and self.nodes[fname][n].get("entry", True):
-                self.queue.put_nowait((sid, fname, n))'''
-        
-        # Enqueue root nodes (bootstrap del DAG)
-        for n in self.graphs[fname].nodes:
-            nd = self.nodes[fname][n]
-            if self.graphs[fname].in_degree(n) == 0:
-                if not self._auto_starts(fname, n):
+        # Un solo giro sincrono accoda le radici di tutte le sessioni; poi
+        # un'unica coroutine le chiude nell'ordine di sids. I worker nel
+        # frattempo svuotano la coda senza cambi di contesto per sessione:
+        # quando si arriva a una sessione i suoi eventi sono di solito già
+        # impostati e la sua attesa non sospende.
+        updates = updates or {}
+        batch   = []   # (sid, session o eccezione, eventi)
+        for sid in sids:
+            session = self._resident(sid)
+            if session is None:
+                batch.append((sid, ValueError(f"FLOW -> Sessione '{sid}' non trovata."), None))
+                continue
+            self._touch(sid, session)
+            update = _copy_dicts(ctx_update) if ctx_update else {}
+            if sid in updates:
+                update = update | updates[sid]
+            last = self._begin(sid, session, plan, update, deadline)
+            batch.append((sid, session, self._trigger(sid, session, plan, last)))
+
+        settled = 0
+        try:
+            for sid, session, events in batch:
+                settled += 1
+                if events is None:
+                    yield sid, session
+                    continue
+                try:
+                    await self._settle(session, plan, events, deadline)
+                except asyncio.TimeoutError:
+                    yield sid, asyncio.TimeoutError(
+                        f"FLOW -> run_many '{fname}' su '{sid}' oltre la deadline ({timeout}s)")
+                    continue
+                except Exception as e:
+                    yield sid, e
                     continue
-                if nd.get("entry", True):
-                    self.queue.put_nowait((sid, fname, n))
+                self._touch(sid, session)
+                yield sid, self._file_results(session, plan)
+        finally:
+            # Iterazione interrotta: le sessioni non ancora chiuse non restano "in esecuzione"
+            for sid, session, events in batch[settled:]:
+                if events is not None:
+                    session["running_files"].discard(fname)
+                    self._drop_deadline(session, fname, deadline)
+
+    @staticmethod
+    def _file_results(session: Dict, plan: "_Plan") -> Dict:
+        """Risultati del file con chiave semplice (node_name)."""
+        results = session["results"]
+        return {n: results[k] for n, k in zip(plan.names, plan.keys) if k in results}
+
+    def _begin(self, sid: str, session: Dict, plan: "_Plan", ctx_update: Optional[Dict],
+               deadline: Optional[float]) -> Optional[int]:
+        """Apre una run di plan sulla sessione; ritorna la versione della run precedente."""
+        fname = plan.fname
+        # Aggiorna ctx con i dati della richiesta corrente usando deep merge
+        # le chiavi esistenti (impostate da update_state/messenger.post) hanno priorità
+        if ctx_update:
+            added = _added_paths(session["ctx"], ctx_update)
+            _deep_merge_defaults(session["ctx"], ctx_update)
+            if added:
+                self._mark(session, added)
 
+        session["running_files"].add(fname)
+        last = session["files"].get(fname)
+        session["files"][fname] = run = next(self._clock)
+        if self.profiler is not None:
+            self.profiler.begin(sid, fname, run)
+        session["runs"].setdefault(fname, []).append(deadline)
+        self._scope_deadline(session, fname)
+        return last
+
+    def _trigger(self, sid: str, session: Dict, plan: "_Plan", last: Optional[int]) -> List[asyncio.Event]:
+        """Innesca i nodi di una run; ritorna gli eventi done da attendere."""
+        fname, keys = plan.fname, plan.keys
+        done = session["done"]
+        if self.incremental and last is not None:
+            # Solo i nodi mai eseguiti e i lettori dei path cambiati dopo il loro
+            # ultimo risultato (non già ricalcolati da update_state/emit), con il loro cono
+            results = session["results"]
+            seeds   = {
+                i
+                for p, v in session["paths"].items() if v > last
+                for i in plan.readers_of(p)
+                if plan.auto[i] and (keys[i] not in results or results[keys[i]]["version"] < v)
+            }
+            seeds  |= {i for i in plan.roots
+                       if keys[i] not in results and plan.auto[i] and plan.defs[i].get("entry", True)}
+            for k in keys:
+                if k not in done:
+                    done[k] = asyncio.Event()
+                    done[k].set()
+            self._arm_cone(sid, session, plan, seeds, NORMAL)
+            # anche i nodi ancora in corso da update_state/emit precedenti
+            return [done[k] for i, k in enumerate(keys)
+                    if not done[k].is_set() and not plan.defs[i].get("schedule")]
+
+        # Inizializza/resetta gli eventi done e i parent pendenti dei nodi di questo file
+        ready = session["ready"]
+        for i, k in enumerate(keys):
+            done[k] = asyncio.Event()
+            ready.arm(k, [keys[p] for p in plan.pred[i]])
 
-        # Aspetta solo i nodi one-shot (senza schedule)
-        one_shot = [
-            session["done"][_key(fname, n)].wait()
-            for n in self.nodes[fname]
-            if not self.nodes[fname][n].get("schedule") and self._auto_starts(fname, n)
-        ]
-        
-        if one_shot:
-            await asyncio.gather(*one_shot)
+        # Enqueue root nodes (bootstrap del DAG)
+        for i in plan.roots:
+            if plan.auto[i] and plan.defs[i].get("entry", True):
+                self.queue.put_nowait((sid, fname, i, plan.priority(i, NORMAL)))
+
+        # Aspetta solo i nodi one-shot (senza schedule);
+        # DAG puramente reattivo: aspetta almeno un giro completo
+        one_shot = [done[keys[i]] for i, nd in enumerate(plan.defs)
+                    if not nd.get("schedule") and plan.auto[i]]
+        return one_shot or [done[k] for k in keys]
+
+    async def _settle(self, session: Dict, plan: "_Plan", events: List[asyncio.Event],
+                      deadline: Optional[float]):
+        """Attende gli eventi di una run entro deadline, poi la chiude sulla sessione."""
+        fname = plan.fname
+        try:
+            await bounded(_wait_all(events), deadline - time.monotonic() if deadline is not None else None)
+        except asyncio.TimeoutError:
+            # La deadline resta finché i nodi ancora in coda di questa run non
+            # sono passati dall'esecutore: falliscono subito invece di occupare i worker
+            asyncio.ensure_future(self._expire(session, plan, deadline))
+            raise
+        except BaseException:
+            self._drop_deadline(session, fname, deadline)
+            raise
+        finally:
+            session["running_files"].discard(fname)
+        self._drop_deadline(session, fname, deadline)
+
+    @classmethod
+    def _drop_deadline(cls, session: Dict, fname: str, deadline: Optional[float]):
+        runs = session["runs"].get(fname)
+        if runs and deadline in runs:
+            runs.remove(deadline)
+            cls._scope_deadline(session, fname)
+
+    @staticmethod
+    def _scope_deadline(session: Dict, fname: str):
+        """
+        I nodi di fname sono condivisi dalle run concorrenti della sessione:
+        li limita la più lontana delle loro scadenze, nessuna se anche una
+        sola run è senza timeout.
+        """
+        runs = session["runs"].get(fname)
+        if runs and None not in runs:
+            session["deadlines"][fname] = max(runs)
         else:
-            # DAG puramente reattivo: aspetta almeno un giro completo
-            await asyncio.gather(*[
-                session["done"][_key(fname, n)].wait()
-                for n in self.nodes[fname]
-            ])
-
-        session["running_files"].discard(fname)
+            session["deadlines"].pop(fname, None)
+            if not runs:
+                session["runs"].pop(fname, None)
 
-        # Ritorna i risultati di questo file con chiave semplice (node_name)
-        return {
-            n: session["results"][_key(fname, n)]
-            for n in self.nodes[fname]
-            if _key(fname, n) in session["results"]
-        }
+    async def _expire(self, session: Dict, plan: "_Plan", deadline: float):
+        """Dopo una deadline scaduta: attende che i nodi della run si esauriscano, poi la rimuove."""
+        done = session["done"]
+        await _wait_all([done[k] for i, k in enumerate(plan.keys)
+                         if k in done and not done[k].is_set() and not plan.defs[i].get("schedule")])
+        self._drop_deadline(session, plan.fname, deadline)
 
     async def close_session(self, sid: str):
+        if sid in self.spilled:
+            self.spilled.pop(sid)[0].drop(sid)
         if sid not in self.sessions:
             return
 
         session = self.sessions[sid]
         self.cancelled_sessions.add(sid)
 
-        for task in session["schedulers"].values():
-            task.cancel()
+        session["schedulers"].clear()   # invalida le voci nei timer
 
         for event in session["done"].values():
             if not event.is_set():
@@ -467,269 +1896,581 @@ class DagRunner:
         asyncio.create_task(_cleanup())
 
     async def clear_all_sessions(self):
-        for sid in list(self.sessions.keys()):
+        for sid in list(self.sessions.keys()) + list(self.spilled.keys()):
             await self.close_session(sid)
 
+    # ─────────────────────────────────────────
+    # EVICTION — sessioni inattive fuori dalla memoria
+    #
+    # Una sessione è inattiva se non ha file in esecuzione, nodi in coda
+    # o heartbeat schedulati. Le voci serializzabili di ctx e i results
+    # finiscono nello spill; quelle che non lo sono (funzioni del DSL,
+    # manager, messenger) restano in self.spilled come semplici riferimenti.
+    # ─────────────────────────────────────────
+
+    def _touch(self, sid: str, session: Dict):
+        session["touched"] = time.monotonic()
+        self.sessions.move_to_end(sid)
+
+    @staticmethod
+    def _idle(session: Dict) -> bool:
+        return not (session["running_files"] or session["schedulers"] or session["ready"].queued)
+
+    def evict(self, sid: str) -> bool:
+        """Serializza la sessione sid nello spill e la toglie dalla memoria."""
+        session = self.sessions.get(sid)
+        if session is None or self.spill is None or not self._idle(session):
+            return False
+
+        state, refs = self._dump(session)
+        self.spill.save(sid, state)
+
+        for event in session["done"].values():
+            if not event.is_set():
+                event.set()
+        del self.sessions[sid]
+        self.spilled[sid] = (self.spill, refs)
+        self.evictions += 1
+        return True
+
+    @staticmethod
+    def _dump(session: Dict):
+        """Stato serializzabile della sessione e voci di ctx che restano riferimenti."""
+        ctx, refs = _split_picklable(session["ctx"].maps[0])   # default e builtins sono del runner
+        results, _ = _split_picklable(session["results"])   # i non serializzabili si ricalcolano
+        return {"ctx": ctx, "results": results,
+                "last_seen": session.get("last_seen", {}),
+                "schedules": list(session["schedulers"])}, refs
+
+    def _resident(self, sid: str) -> Optional[Dict]:
+        """Sessione sid in memoria, ricaricandola dallo spill se era stata espulsa."""
+        session = self.sessions.get(sid)
+        if session is not None:
+            if session["defaults"] < len(self._defaults_log):
+                self._catch_up(session)
+            return session
+        if sid not in self.spilled:
+            return None
+
+        source, refs = self.spilled.pop(sid)
+        state = source.load(sid) or {}
+        session = self.sessions[sid] = self._new_session()
+        session["ctx"].maps[0].update({k: pickle.loads(v) for k, v in state.get("ctx", {}).items()} | refs)
+        session["defaults"] = 0
+        self._catch_up(session)
+        session["results"] = results = {k: pickle.loads(v) for k, v in state.get("results", {}).items()}
+        session["last_seen"] = state.get("last_seen", {})
+        # Le versioni dei results ripristinano la prontezza dei nodi già eseguiti
+        session["ready"].versions.update((k, r["version"]) for k, r in results.items())
+        for k in results:
+            session["done"][k] = done = asyncio.Event()
+            done.set()
+        # Versioni da un processo precedente: il contatore riparte oltre
+        top = max(session["ready"].versions.values(), default=0)
+        if top >= next(self._clock):
+            self._clock = itertools.count(top + 1)
+        # Riavvia gli heartbeat dei nodi schedulati ancora presenti nel file
+        for k in state.get("schedules", ()):
+            fname, _, name = k.partition("::")
+            plan = self.plans.get(fname)
+            j = plan.index.get(name) if plan else None
+            if j is not None and plan.defs[j].get("schedule"):
+                session["schedulers"][k] = self.timers.add(
+                    sid, fname, name, plan.defs[j]["schedule"], plan.defs[j].get("jitter", 0))
+        self.rehydrations += 1
+        self._enforce_cap()
+        return session
+
+    def _catch_up(self, session: Dict):
+        """
+        Default dei file aggiunti dopo che la sessione ha copiato il dict che li
+        contiene: la copia li nasconderebbe, vanno aggiunti lì (senza sovrascrivere).
+        """
+        top = session["ctx"].maps[0]
+        for path, value in self._defaults_log[session["defaults"]:]:
+            head, dot, _ = path.partition(".")
+            if dot and isinstance(top.get(head), dict):
+                _set_default(top, path, copy.deepcopy(value))
+        session["defaults"] = len(self._defaults_log)
+
+    def _enforce_cap(self):
+        if not self.max_sessions or len(self.sessions) <= self.max_sessions:
+            return
+        # Dalla meno recente; l'ultima (appena toccata) non viene mai espulsa
+        for sid in list(self.sessions)[:-1]:
+            if len(self.sessions) <= self.max_sessions:
+                break
+            self.evict(sid)
+
+    def evict_idle(self, ttl: Optional[float] = None) -> int:
+        """Espelle le sessioni inattive da più di ttl secondi (default session_ttl)."""
+        ttl = self.session_ttl if ttl is None else ttl
+        if ttl is None:
+            return 0
+        cutoff = time.monotonic() - ttl
+        stale  = []
+        for sid, session in self.sessions.items():
+            if session["touched"] > cutoff:
+                break   # ordine LRU: le successive sono più recenti
+            stale.append(sid)
+        return sum(self.evict(sid) for sid in stale)
+
+    async def _reap(self):
+        interval = max(0.05, min(self.session_ttl / 2, 30))
+        while self.running:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+    # ─────────────────────────────────────────
+    # CHECKPOINT — riavvii a caldo
+    # ─────────────────────────────────────────
+
+    def checkpoint(self, path: Optional[str] = None) -> int:
+        """
+        Scrive lo snapshot di tutte le sessioni (residenti ed espulse) in path
+        (default checkpoint_path). Ritorna il numero di sessioni salvate.
+        Le voci di ctx non serializzabili non entrano nello snapshot:
+        restore() le reinietta dall'env.
+        """
+        path = path or self.checkpoint_path
+        if path is None:
+            raise ValueError("checkpoint: nessun path configurato")
+
+        def records():
+            for sid, session in list(self.sessions.items()):
+                yield sid, pickle.dumps(self._dump(session)[0], pickle.HIGHEST_PROTOCOL)
+            for sid, (source, _) in list(self.spilled.items()):
+                raw = source.raw(sid) if hasattr(source, "raw") else None
+                if raw is None:
+                    state = source.load(sid)
+                    if state is None:
+                        continue
+                    source.save(sid, state)
+                    raw = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+                yield sid, raw
+
+        old  = {sid for sid, (src, _) in self.spilled.items()
+                if isinstance(src, _Snapshot) and src.path == path}
+        snap = _Snapshot.write(path, records())
+        # Le sessioni non ancora ricaricate puntano al nuovo file (offset cambiati)
+        for sid in old:
+            if sid in self.spilled:
+                self.spilled[sid] = (snap, self.spilled[sid][1])
+        return len(snap.index)
+
+    def restore(self, path: Optional[str] = None, env: Optional[Dict] = None) -> int:
+        """
+        Registra le sessioni di uno snapshot senza caricarle: ognuna torna
+        residente alla prima run_file / emit / context. env fornisce le voci
+        non serializzabili (funzioni, manager) da rimettere nel ctx.
+        Le sessioni già presenti non vengono toccate. Ritorna quante ne registra.
+        """
+        path = path or self.checkpoint_path
+        if path is None or not os.path.exists(path):
+            return 0
+        snap = _Snapshot(path)
+        new  = [sid for sid in snap.index if not self.has_session(sid)]
+        for sid in new:
+            self.spilled[sid] = (snap, dict(env or {}))
+        return len(new)
+
+    async def _checkpoint_loop(self):
+        while self.running:
+            await asyncio.sleep(self.checkpoint_every)
+            try:
+                self.checkpoint()
+            except Exception as e:
+                print(f"❌ Checkpoint: {e}")
+
+    def queue_stats(self) -> Dict[str, Any]:
+        """Gauge della coda: profondità, watermark, ammissioni ritardate/rifiutate e attese."""
+        return self.queue.stats() | {"workers": len(self.tasks)}
+
+    def limiter(self, key: str, limit: int) -> _Limiter:
+        """
+        Limite di concorrenza condiviso `key` ("fname::node" per max_concurrency,
+        il nome di una limited()). Creato al primo uso; un nuovo limite lo ridimensiona.
+        """
+        lim = self.limiters.get(key)
+        if lim is None:
+            lim = self.limiters[key] = _Limiter(int(limit))
+        elif lim.limit != limit:
+            lim.resize(int(limit))
+        return lim
+
+    def concurrency_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per limite: posti, chiamate in corso e in coda, tempi di attesa in coda (ms)."""
+        return {key: lim.stats() for key, lim in self.limiters.items()}
+
+    def timeout_stats(self) -> Dict[str, int]:
+        """Scadenze per nodo ("fname::node_name"), dal timeout del nodo o dalla deadline della run."""
+        return dict(self.timeouts)
+
+    def stats(self, fname: Optional[str] = None, runs: int = 20) -> Dict[str, Any]:
+        """
+        Statistiche del profiler (DagRunner(profile=N)).
+        nodes: per nodo conteggi, errori, retry e istogrammi in ms di gate/queue/hooks/fn/total.
+        critical_path: solo con fname, sulle ultime `runs` run complete del file.
+        """
+        if self.profiler is None:
+            raise RuntimeError("FLOW -> profiler disattivato: usare DagRunner(profile=N)")
+        out: Dict[str, Any] = {"nodes": self.profiler.nodes(fname)}
+        if fname is not None and fname in self.plans:
+            out["critical_path"] = self.profiler.critical_path(self.plans[fname], runs)
+        return out
+
+    def export_flame(self, path: str, fname: Optional[str] = None) -> int:
+        """Scrive le righe "file;nodo;fase µs" (formato folded di flamegraph.pl / speedscope). Ritorna le righe."""
+        if self.profiler is None:
+            raise RuntimeError("FLOW -> profiler disattivato: usare DagRunner(profile=N)")
+        lines = self.profiler.folded(fname)
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write("\n".join(lines) + ("\n" if lines else ""))
+        return len(lines)
+
+    def session_bytes(self, sid: str) -> int:
+        """Byte stimati di ctx e results della sessione residente sid."""
+        session = self.sessions.get(sid)
+        if session is None:
+            return 0
+        return _approx_size(session["ctx"].maps[0]) + _approx_size(session["results"])
+
+    def session_stats(self) -> Dict[str, Any]:
+        """Gauge delle sessioni: residenti, espulse, byte stimati."""
+        sizes = [self.session_bytes(sid) for sid in self.sessions]
+        return {
+            "resident":     len(self.sessions),
+            "spilled":      len(self.spilled),
+            "evictions":    self.evictions,
+            "rehydrations": self.rehydrations,
+            "bytes":        sum(sizes),
+            "bytes_per_session": sum(sizes) / len(sizes) if sizes else 0,
+        }
+
     # ─────────────────────────────────────────
     # WORKERS
     # ─────────────────────────────────────────
 
     async def start(self):
+        # Idempotente: run_file avvia da sé il runner, e uno start() successivo
+        # (manager, Runtime condiviso) non deve creare un secondo gruppo di worker
+        if self.running:
+            return
         self.running = True
         self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.session_ttl and self.spill is not None:
+            self._reaper = asyncio.create_task(self._reap())
+        if self.checkpoint_path and self.checkpoint_every:
+            self._checkpointer = asyncio.create_task(self._checkpoint_loop())
+        self.timers.arm()
 
     async def stop(self):
         self.running = False
         for t in self.tasks:
             t.cancel()
+        self.tasks = []
+        self.timers.cancel()
+        self.watchdog.cancel()
+        for t in (self._reaper, self._checkpointer):
+            if t:
+                t.cancel()
+        self._reaper = self._checkpointer = None
+        if self.checkpoint_path:
+            self.checkpoint()
+
+    def set_weight(self, sid: str, weight: int):
+        """Quanti nodi consecutivi servire alla sessione sid a ogni turno."""
+        self.queue.weights[sid] = max(1, int(weight))
+
+    def _autoscale(self, depth: int):
+        n = len(self.tasks)
+        if self.running and n < self.max_workers and depth > n * self.scale_depth:
+            self.tasks.append(asyncio.create_task(self._worker()))
 
     async def _worker(self):
+        # Attesa bloccante sulla coda: un runner inattivo non si risveglia
+        # finché non arriva lavoro (stop() annulla i worker in attesa).
         while self.running:
-            try:
-                sid, fname, name = await asyncio.wait_for(self.queue.get(), 0.2)
-            except asyncio.TimeoutError:
-                continue
-
-            if sid in self.cancelled_sessions:
-                self.queue.task_done()
-                continue
-
-            await self._run_node(sid, fname, name)
-            self.queue.task_done()
+            item = await self.queue.get()
+            sid, fname, i, prio = item
+            enq = self.queue.stamps.pop(item, None) if self.queue.stamps is not None else None
+            if sid not in self.cancelled_sessions:
+                await self._run_node(sid, fname, i, enq, prio)
+
+            if not self.queue.empty():
+                # get() con item pronti non sospende: si cede il loop a ogni nodo,
+                # così I/O, emit e timer non aspettano lo svuotamento della coda
+                await asyncio.sleep(0)
+            # Worker extra dell'autoscaling: si ritira appena la coda è vuota
+            if len(self.tasks) > self.workers and self.queue.empty():
+                self.tasks.remove(asyncio.current_task())
+                return
 
     # ─────────────────────────────────────────
     # CORE
     # ─────────────────────────────────────────
 
-    async def _run_node(self, sid: str, fname: str, name: str):
-        session = self.sessions[sid]
-        nd  = self.nodes[fname][name]
-        k   = _key(fname, name)
-
-        d = {
-            "sid":     sid,
-            "fname":   fname,
-            "node":    nd,
-            "ctx":     session["ctx"],
-            "results": session["results"],
-            "result":  None,
-            "t0":      time.perf_counter(),
-        }
-
-        steps = [self._check_deps]
-        if nd.get("duration"):   steps.append(self._handle_duration)
-        if nd.get("when"):       steps.append(self._check_when)
-        if nd.get("on_start"):   steps.append(functools.partial(self._run_hook, hook_name="on_start"))
-        steps.append(self._execute_step)
-        if nd.get("on_success"): steps.append(functools.partial(self._run_hook, hook_name="on_success"))
-        if nd.get("on_error"):   steps.append(functools.partial(self._run_hook, hook_name="on_error"))
-        if nd.get("on_end"):     steps.append(functools.partial(self._run_hook, hook_name="on_end"))
-        steps.append(self._save_step)
-        steps.append(self._dispatch)
-
-        await pipeline(d, *steps)
+    async def _run_node(self, sid: str, fname: str, i: int, enq: Optional[float] = None, prio: int = NORMAL):
+        session = self.sessions.get(sid)
+        if session is None:
+            return
+        k = self.plans[fname].keys[i]
+        session["ready"].queued.discard(k)
 
-        if k in session["done"]:
+        # Un nodo ancora in attesa dei parent non è "done": verrà riaccodato
+        # dal dispatch quando l'ultimo parent salva il proprio risultato.
+        if await self.execs[fname][i](sid, session, enq, prio) and k in session["done"]:
             session["done"][k].set()
 
     # ─────────────────────────────────────────
-    # OPS
+    # NODE EXECUTOR
+    #
+    # Ogni nodo viene compilato una volta (add_file / attach_node) in una
+    # coroutine che esegue l'intero ciclo di vita:
+    #   deps -> duration -> when -> on_start -> fn -> on_success/on_error/on_end
+    #   -> save -> dispatch
+    # I rami sono decisi dai flag del nodo al momento della compilazione;
+    # a runtime non si costruiscono liste di step né Result intermedi.
+    # Ritorna False se il nodo attende ancora i parent, True altrimenti.
     # ─────────────────────────────────────────
 
-    @action()
-    async def _check_deps(self, d):
-        sid       = d["sid"]
-        fname     = d["fname"]
-        deps      = d["node"].get("deps", [])
-        node_name = d["node"]["name"]
-        k         = _key(fname, node_name)
-        policy    = d["node"].get("policy", "all")
-        res       = d["results"]
-        session   = self.sessions[sid]
-        use_cache = d["node"].get("cache", False)
-
-        if not deps:
-            return success(d)
-
-        dep_keys = [_key(fname, dep) for dep in deps]
-
-        not_ready = [
-            dk for dk in dep_keys
-            if dk in session["done"] and not session["done"][dk].is_set()
-        ]
-
-        if not_ready and not use_cache:
-            async def _retry_later():
-                await asyncio.sleep(0.5)
-                self.queue.put_nowait((sid, fname, node_name))
-            asyncio.create_task(_retry_later())
-            return error(f"Waiting for deps: {not_ready}")
-
-        if not use_cache:
-            my_last = res.get(k, {}).get("updated_at", 0)
-            fresh = any(res[dk]["updated_at"] > my_last for dk in dep_keys if dk in res)
-            if k in res and not fresh:
-                async def _wait_fresh():
-                    await asyncio.sleep(0.5)
-                    self.queue.put_nowait((sid, fname, node_name))
-                asyncio.create_task(_wait_fresh())
-                return error("No fresh data from parents yet.")
-
-        completed = [dk for dk in dep_keys if dk in res]
-        succeeded = [dk for dk in completed if res[dk]["success"]]
-
-        if policy == "all":
-            if len(succeeded) == len(deps): return success(d)
-            failed = [dk for dk in completed if not res[dk]["success"]]
-            return error(f"policy=all failed: {failed}")
-
-        if policy == "any":
-            if len(succeeded) >= 1: return success(d)
-            return error("policy=any failed")
-
-        if isinstance(policy, int):
-            if len(succeeded) >= policy: return success(d)
-            return error(f"policy={policy} >= ({len(succeeded)} succeeded)")
-
-        return error(f"unknown policy: {policy!r}")
-
-    @action()
-    async def _check_when(self, d):
-        fn = d["node"].get("when")
-        if not fn: return success(d)
-        if bool(fn(d["ctx"] | d["results"])): return success(d)
-        return error("when condition not met")
-
-    @action()
-    async def _execute_step(self, d):
-        nd, ctx, res = d["node"], d["ctx"], d["results"]
-        fname   = d["fname"]
-        retries = nd.get("retries", 0)
-        delay   = nd.get("retry_delay", 0)
-
-        # Inietta gli output dei dep nel ctx condiviso (by reference)
-        # In questo modo le mutazioni del nodo su ctx persistono nella sessione
-        if nd.get("meta"):
-            for dep in nd.get("deps", []):
-                if _key(fname, dep) in res:
-                    ctx[dep] = res[_key(fname, dep)]
-        else:
-            for dep in nd.get("deps", []):
-                if _key(fname, dep) in res:
-                    ctx[dep] = res[_key(fname, dep)]["outputs"]
-        inputs = ctx
-
-        last_result = None
-        for i in range(retries + 1):
+    def _compile_node(self, plan: _Plan, i: int):
+        nd        = plan.defs[i]
+        fname     = plan.fname
+        name      = nd["name"]
+        k         = plan.keys[i]
+        fn        = nd["fn"]
+        path      = nd.get("path")
+        deps      = tuple(nd.get("deps", []))
+        dep_keys  = plan.dep_keys[i]
+        dep_pairs = tuple(zip(deps, dep_keys))
+        policy    = nd.get("policy", "all")
+        use_cache = nd.get("cache", False)
+        meta      = nd.get("meta")
+        max_dur   = nd.get("duration")
+        when      = nd.get("when")
+        retries   = nd.get("retries", 0)
+        delay     = nd.get("retry_delay", 0)
+        mode      = nd.get("executor", "loop")
+        memo      = self.memo if nd.get("memo") else None
+        ttl       = nd.get("ttl")
+        gates     = tuple(g for g in (
+            self.limiter(k, nd["max_concurrency"]) if nd.get("max_concurrency") else None,
+            self.limiter(fn.name, fn.limit) if isinstance(fn, Limited) else None,
+        ) if g is not None)
+        reads     = tuple(nd.get("reads", ()))
+        interval  = nd.get("schedule")
+        jitter    = nd.get("jitter", 0)
+        limit     = nd.get("timeout") or None
+        hooks_pre  = tuple(h for h in ("on_start",) if nd.get(h))
+        hooks_post = tuple(h for h in ("on_success", "on_error", "on_end") if nd.get(h))
+        succ      = tuple((j, plan.keys[j], bool(plan.defs[j].get("cache")), plan.prio[j]) for j in plan.succ[i])
+        triggers  = tuple((j, plan.prio[j]) for j in plan.triggers[i])
+        queue     = self.queue
+        watchdog  = self.watchdog
+        track     = self.incremental and nd.get("watch") is not None
+        prof      = self.profiler
+
+        def deps_ok(res) -> bool:
+            completed = [dk for dk in dep_keys if dk in res]
+            succeeded = sum(1 for dk in completed if res[dk]["success"])
+            if policy == "all":
+                return succeeded == len(deps)
+            if policy == "any":
+                return succeeded >= 1
+            if isinstance(policy, int):
+                return succeeded >= policy
+            return False
+
+        async def run(sid, session, enq=None, prio=NORMAL) -> bool:
+            ctx, res = session["ctx"], session["results"]
+            ready    = session["ready"]
+            t0       = time.perf_counter()
+            d        = None
+            th       = 0.0   # secondi negli hook
+            attempts = 0
+            tf       = 0.0
+            seen     = None
             try:
-                r = await _call(nd["fn"], inputs)
-                last_result = r if is_result(r) else success(r, d["t0"])
-                if last_result["success"]: break
+                # ── deps ──
+                if deps:
+                    if not use_cache:
+                        if ready.pending.get(k):
+                            return False
+                        if k in res and not ready.fresh(k, dep_keys):
+                            return False
+                    seen = ready.snapshot(dep_keys)
+                    if not deps_ok(res):
+                        return True
+
+                # ── duration / when ──
+                if max_dur and res.get(k, {}).get("duration", 0.0) >= max_dur:
+                    return True
+                if when and not when(ctx | res):
+                    return True
+
+                if hooks_pre or hooks_post:
+                    d = {"sid": sid, "fname": fname, "plan": plan, "i": i, "node": nd,
+                         "ctx": ctx, "results": res, "result": None, "t0": t0, "priority": prio}
+                if hooks_pre:
+                    h0 = time.perf_counter()
+                    for hook in hooks_pre:
+                        await self._hook(d, hook)
+                    th = time.perf_counter() - h0
+
+                # ── fn ──
+                # Inietta gli output dei dep nel ctx condiviso (by reference)
+                # In questo modo le mutazioni del nodo su ctx persistono nella sessione
+                for dep, dk in dep_pairs:
+                    if dk in res:
+                        ctx[dep] = res[dk] if meta else res[dk]["outputs"]
+
+                f0 = time.perf_counter()
+                result = mk = None
+                if memo:
+                    # Stessi input (deps + ctx letto) -> stesso output, tra sessioni
+                    mk = memo.key(k, [res[dk]["outputs"] if dk in res else None for dk in dep_keys],
+                                  [scheme.get(ctx, p) for p in reads])
+                    cached = await memo.lookup(mk)
+                    if cached is not _MISS:
+                        result, mk = success(cached, t0), None
+                    else:
+                        memo.begin(mk)
+                if result is None:
+                    token = _reads.set(set()) if track else None
+                    until = session["deadlines"].get(fname)
+                    try:
+                        for attempts in range(1, retries + 2):
+                            budget = limit
+                            if until is not None:
+                                left   = until - time.monotonic()
+                                budget = left if budget is None else min(budget, left)
+                            try:
+                                if budget is not None and budget <= 0:
+                                    raise _Expired
+                                aw = offload(mode, fn, ctx)
+                                for gate in gates:
+                                    aw = gate.run(aw)
+                                r = await watchdog.bound(aw, budget)
+                                result = r if is_result(r) else success(r, t0)
+                                if result["success"]: break
+                            except _Expired:
+                                # solo le scadenze del watchdog: un TimeoutError della fn è un errore come gli altri
+                                self.timeouts[k] = self.timeouts.get(k, 0) + 1
+                                result = error(TimeoutError(f"Nodo {k}: timeout dopo {max(budget, 0):.3g}s"), t0)
+                                if budget != limit: break   # deadline della richiesta: inutile riprovare
+                            except Exception as e:
+                                result = error(e, t0)
+                            if attempts <= retries:
+                                await asyncio.sleep(delay)
+                    finally:
+                        if mk is not None:
+                            memo.end(mk, result, ttl)
+                        if token is not None:
+                            self._learn(fname, i, nd, _reads.get())
+                            _reads.reset(token)
+                tf = time.perf_counter() - f0
+
+                if d is not None:
+                    d["result"] = result
+                if hooks_post:
+                    h0 = time.perf_counter()
+                    for hook in hooks_post:
+                        await self._hook(d, hook)
+                    th += time.perf_counter() - h0
             except Exception as e:
-                last_result = error(e, d["t0"])
-            if i < retries:
-                await asyncio.sleep(delay)
-
-        d["result"] = last_result
-        return success(d)
-
-    @action()
-    async def _run_hook(self, d, hook_name: str):
-        nd       = d["node"]
-        fname    = d["fname"]
-        hook_val = nd.get(hook_name)
-        sid      = d["sid"]
-
-        if not hook_val: return success(d)
+                # Errore del motore fuori dalla fn (when, iniezione dei deps, memo, ...):
+                # diventa il Result del nodo come un errore della fn
+                result = error(e, t0)
 
+            # ── save ──
+            try:
+                _set(ctx, path, result["outputs"])
+            except Exception as e:
+                result = error(e, t0)
+            res[k] = result
+            result["version"] = v = next(self._clock)   # letto qui: restore può sostituirlo
+            session.setdefault("last_seen", {})[k] = v
+            ready.versions[k] = v
+            if seen is not None:
+                ready.consumed[k] = seen
+            result["duration"] = result.get("duration", 0.0) + result.get("time", 0.0)
+
+            # ── dispatch ──
+            done = session["done"]
+            for j, nxt_k, cached, p in succ:
+                if not cached and nxt_k in done:
+                    done[nxt_k].clear()
+                # Accoda solo quando l'ultimo parent ha salvato, e una volta sola.
+                if (cached or ready.resolve(nxt_k, k)) and nxt_k not in ready.queued:
+                    ready.queued.add(nxt_k)
+                    queue.put_nowait((sid, fname, j, prio if p is None else p))
+            for j, p in triggers:
+                queue.put_nowait((sid, fname, j, prio if p is None else p))
+            if interval and k not in session["schedulers"]:
+                session["schedulers"][k] = self.timers.add(sid, fname, name, interval, jitter)
+            if prof is not None:
+                prof.records.append((fname, name, sid, session["files"].get(fname), enq, t0,
+                                     time.perf_counter(), tf, th, attempts, result["success"]))
+            return True
+
+        return run
+
+    def _learn(self, fname: str, i: int, nd: Dict, paths: set):
+        """Letture osservate a runtime -> indice dei lettori del piano corrente."""
+        plan = self.plans.get(fname)
+        if paths and plan is not None and i < len(plan.defs) and plan.defs[i] is nd:
+            plan.learn(i, paths)
+
+    async def _hook(self, d, hook_name: str):
+        hook_val = d["node"].get(hook_name)
+        sid, fname, plan = d["sid"], d["fname"], d["plan"]
         try:
             if isinstance(hook_val, (str, list)):
                 targets = [hook_val] if isinstance(hook_val, str) else hook_val
                 for target in targets:
-                    tk = _key(fname, target)
+                    j = plan.index.get(target)
+                    if j is None:
+                        continue
+                    tk = plan.keys[j]
                     if tk in self.sessions[sid]["done"]:
                         self.sessions[sid]["done"][tk].clear()
-                    self.queue.put_nowait((sid, fname, target))
+                    self.queue.put_nowait((sid, fname, j, plan.priority(j, d["priority"])))
             elif callable(hook_val):
                 await _call(hook_val, d, d.get("result"))
-            return success(d)
         except Exception as e:
-            print(f"❌ Hook {hook_name} di {nd['name']}: {e}")
-            return success(d)
-
-    @action()
-    async def _handle_duration(self, d):
-        nd      = d["node"]
-        fname   = d["fname"]
-        max_dur = nd.get("duration")
-        if not max_dur: return success(d)
-        k = _key(fname, nd["name"])
-        current = d["results"].get(k, {}).get("duration", 0.0)
-        if current >= max_dur:
-            return error(f"Quota temporale esaurita ({current:.2f}s >= {max_dur}s)")
-        return success(d)
-
-    @action()
-    async def _save_step(self, d):
-        nd, result = d["node"], d["result"]
-        fname   = d["fname"]
-        session = self.sessions[d["sid"]]
-        k       = _key(fname, nd["name"])
-
-        _set(d["ctx"], nd.get("path"), result["outputs"])
-        session["results"][k] = result
-        session.setdefault("last_seen", {})[k] = result["version"]
-        result["duration"] += result["time"]
-
-        return success(d)
-
-    def _auto_starts(self, fname: str, n: str) -> bool:
-        """Vero se il nodo può partire da solo in questa run (entry/trigger/schedule),
-        oppure se dipende da altri nodi (verrà propagato via dispatch)."""
-        nd = self.nodes[fname][n]
-        if self.graphs[fname].in_degree(n) > 0:
-            return True  # non è root: arriverà via dispatch se il parent parte
-        return bool(nd.get("entry", True)) or bool(nd.get("trigger")) or bool(nd.get("schedule"))
-
-    @action()
-    async def _dispatch(self, d):
-        sid       = d["sid"]
-        fname     = d["fname"]
-        node_name = d["node"]["name"]
-        k         = _key(fname, node_name)
-        session   = self.sessions[sid]
-        interval  = d["node"].get("schedule")
-
-        for nxt in self.graphs[fname].successors(node_name):
-            nxt_k = _key(fname, nxt)
-            if not self.nodes[fname][nxt].get("cache") and nxt_k in session["done"]:
-                session["done"][nxt_k].clear()
-            self.queue.put_nowait((sid, fname, nxt))
-
-        for trg in self.triggers[fname].get(node_name, []):
-            self.queue.put_nowait((sid, fname, trg))
-
-        if interval and k not in session["schedulers"]:
-            async def _heartbeat(fname=fname, node_name=node_name, k=k):
-                try:
-                    while sid in self.sessions and sid not in self.cancelled_sessions:
-                        await asyncio.sleep(interval)
-                        if k in session["done"]:
-                            session["done"][k].clear()
-                        self.queue.put_nowait((sid, fname, node_name))
-                        await session["done"][k].wait()
-                except asyncio.CancelledError:
-                    pass
-            session["schedulers"][k] = asyncio.create_task(_heartbeat())
-
-        return success(d)
+            print(f"❌ Hook {hook_name} di {d['node']['name']}: {e}")
+
+    def _fire_timers(self, batch: List[tuple]) -> List[tuple]:
+        """Accoda i nodi schedulati scaduti; ritorna le voci ancora valide."""
+        keep = []
+        for entry in batch:
+            _, seq, sid, fname, name, _, _ = entry
+            k       = _key(fname, name)
+            session = self.sessions.get(sid)
+            if session is None or sid in self.cancelled_sessions or session["schedulers"].get(k) != seq:
+                continue
+            # id risolto a ogni tick: il file può essere stato ricaricato
+            plan = self.plans.get(fname)
+            j    = plan.index.get(name) if plan else None
+            if j is None:
+                del session["schedulers"][k]
+                continue
+            keep.append(entry)
+            done = session["done"].get(k)
+            if done is not None:
+                if not done.is_set():
+                    continue   # tick precedente ancora in corso: si salta
+                done.clear()
+            self.queue.put_nowait((sid, fname, j, plan.priority(j, BACKGROUND)))
+        return keep
 
     # ─────────────────────────────────────────
     # REACTIVE API
     # ─────────────────────────────────────────
 
     def get_file_context(self, sid: str, fname: str) -> Dict:
-        session = self.sessions.get(sid)
+        session = self._resident(sid)
         if not session or fname not in self.nodes:
             return {}
 
@@ -745,28 +2486,120 @@ class DagRunner:
                     file_ctx[path] = valore
         return file_ctx
 
-    def update_state(self, sid: str, fname: str, path: str, value: Any):
-        """Aggiorna una variabile nel contesto della sessione senza triggerare nessun nodo."""
-        if sid not in self.sessions:
+    def update_state(self, sid: str, path: str, value: Any):
+        """
+        Aggiorna una variabile nel contesto della sessione senza triggerare nodi.
+        Con incremental, se il valore cambia ricalcola i nodi che leggono path
+        (e il loro cono a valle) nei file già eseguiti dalla sessione.
+        """
+        session = self._resident(sid)
+        if session is None:
             return
-        session = self.sessions[sid]
+        self._touch(sid, session)
+        if not self.incremental:
+            _set(session["ctx"], path, value)
+            return
+        old = _get_from_path(session["ctx"], path, _MISS)
         _set(session["ctx"], path, value)
+        if not _same(old, value):
+            self._recompute(sid, session, [path])
 
-    def emit(self, sid: str, fname: str, name: str, value: Any = None):
-        """Trigger manuale di un nodo specifico."""
-        if sid not in self.sessions:
+    def emit(self, sid: str, fname: str, name: str, value: Any = None,
+             overload: Optional[str] = None) -> bool:
+        """
+        Trigger manuale di un nodo specifico (più i lettori di name, se value
+        lo cambia e il runner è incremental).
+        Con la coda satura l'evento viene ritardato o, con overload "shed",
+        scartato: ritorna False solo in quest'ultimo caso. Un nodo
+        interactive (il default di emit) passa davanti al resto della coda
+        ed entra anche a coda satura finché la sua banda resta sotto
+        queue_low: un backlog di background non ritarda i click, un flood
+        di click sì.
+        """
+        plan = self.plans.get(fname)
+        i    = plan.index.get(name) if plan else None
+        band = plan.priority(i, INTERACTIVE) if i is not None else NORMAL
+        if self.queue.busy and not (band == INTERACTIVE and self.queue.has_room(band)):
+            if (overload or self.overload) == "shed":
+                self.queue.rejected += 1
+                return False
+            asyncio.ensure_future(self._emit_later(sid, fname, name, value))
+            return True
+        self._emit(sid, fname, name, value)
+        return True
+
+    async def _emit_later(self, sid: str, fname: str, name: str, value: Any):
+        await self.queue.admit()
+        self._emit(sid, fname, name, value)
+
+    def _emit(self, sid: str, fname: str, name: str, value: Any):
+        session = self._resident(sid)
+        if session is None:
             return
-        session = self.sessions[sid]
+        self._touch(sid, session)
+        plan = self.plans.get(fname)
+        i    = plan.index.get(name) if plan else None
+        if i is None:
+            print(f"[emit] Nodo '{name}' non trovato in '{fname}' — ignorato")
+        paths = []
         if value is not None:
+            old = _get_from_path(session["ctx"], name, _MISS)
             _set(session["ctx"], name, value)
-        # Accoda solo se il nodo esiste davvero nel file
-        if fname in self.nodes and name in self.nodes[fname]:
-            if _key(fname, name) in session.get("done", {}):
-                session["done"][_key(fname, name)].clear()
-            self.queue.put_nowait((sid, fname, name))
-        else:
-            print(f"[emit] Nodo '{name}' non trovato in '{fname}' — ignorato")
+            if self.incremental and not _same(old, value):
+                paths.append(name)
+        if paths or i is not None:
+            self._recompute(sid, session, paths, {fname: {i}} if i is not None else None)
+
+    # ─────────────────────────────────────────
+    # INCREMENTALE — cono a valle dei path cambiati
+    # ─────────────────────────────────────────
+
+    def _mark(self, session: Dict, paths):
+        v = next(self._clock)
+        for p in paths:
+            session["paths"][p] = v
+
+    def _recompute(self, sid: str, session: Dict, paths, seeds: Optional[Dict[str, set]] = None,
+                   origin: int = INTERACTIVE):
+        """
+        Segna paths come cambiati e riaccoda i loro lettori nei file già
+        eseguiti dalla sessione, più i nodi forzati in seeds {fname: {id}}.
+        """
+        if paths:
+            self._mark(session, paths)
+        targets = dict.fromkeys(session["files"]) | dict.fromkeys(seeds or ())
+        for fname in targets:
+            plan = self.plans.get(fname)
+            if plan is None:
+                continue
+            start = {i for p in paths for i in plan.readers_of(p) if plan.auto[i]}
+            start |= (seeds or {}).get(fname, set())
+            if start:
+                self._arm_cone(sid, session, plan, start, origin)
+
+    def _arm_cone(self, sid: str, session: Dict, plan: _Plan, seeds, origin: int = NORMAL) -> set:
+        """
+        Prepara ed accoda il cono a valle di seeds: ogni nodo del cono
+        attende solo i parent che sono nel cono, gli altri restano validi.
+        """
+        ready, done, keys = session["ready"], session["done"], plan.keys
+        cone = plan.cone(seeds)
+        for i in cone:
+            k = keys[i]
+            if k in done:
+                done[k].clear()
+            else:
+                done[k] = asyncio.Event()
+            ready.arm(k, [keys[p] for p in plan.pred[i] if p in cone])
+        for i in seeds:
+            ready.consumed.pop(keys[i], None)   # forza l'esecuzione anche con parent invariati
+        for i in cone:
+            k = keys[i]
+            if not ready.pending[k] and k not in ready.queued:
+                ready.queued.add(k)
+                self.queue.put_nowait((sid, plan.fname, i, plan.priority(i, origin)))
+        return cone
 
     async def wait_node(self, sid: str, fname: str, name: str):
         """Attende il completamento di un nodo specifico."""
-        await self.sessions[sid]["done"][_key(fname, name)].wait()
\ No newline at end of file
+        await self._resident(sid)["done"][_key(fname, name)].wait()
\ No newline at end of file
@@ -0,0 +1,812 @@
+"""Test DagRunner
+
+Comportamento del motore su DAG costruiti a mano, senza passare dal DSL.
+
+Uso::
+
+    python src/framework/service/flow.test.py
+"""
+
+import os, sys
+
+# La cartella dello script contiene logging.py: va sostituita con src/
+# prima di importare asyncio, altrimenti oscura il modulo della stdlib.
+sys.path[0] = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+
+import asyncio, json, os, pickle, shutil, tempfile, threading, unittest
+
+import framework.service.flow as flow
+import framework.service.language as language
+
+# ─────────────────────────────────────────────
+# CICLO DI VITA — start/stop e Runtime condiviso
+# ─────────────────────────────────────────────
+
+class TestLifecycle(unittest.IsolatedAsyncioTestCase):
+
+    async def test_start_idempotent(self):
+        runner = flow.DagRunner(workers=3)
+        await runner.add_file("f", [flow.node("a", lambda ctx: 1)])
+        runner.create_session("s")
+        await runner.run_file("s", "f")   # avvia da sé il runner
+        workers = list(runner.tasks)
+        await runner.start()
+        self.assertEqual(runner.tasks, workers)
+
+        await runner.stop()
+        await asyncio.sleep(0)
+        self.assertEqual(runner.tasks, [])
+        self.assertTrue(all(t.done() for t in workers))
+
+    async def test_runtime_acquire_after_autostart(self):
+        runtime = language.Runtime()
+        await runtime.runner.add_file("f", [flow.node("a", lambda ctx: 1)])
+        runtime.runner.create_session("s")
+        await runtime.runner.run_file("s", "f")
+        workers = list(runtime.runner.tasks)
+
+        await runtime.acquire()
+        await runtime.acquire()
+        self.assertEqual(runtime.runner.tasks, workers)
+        await runtime.release()
+        self.assertTrue(runtime.runner.running)
+        await runtime.release()
+        await asyncio.sleep(0)
+        self.assertFalse(runtime.runner.running)
+        self.assertTrue(all(t.done() for t in workers))
+
+# ─────────────────────────────────────────────
+# RESULT — esiti delle azioni e dei nodi
+# ─────────────────────────────────────────────
+
+class TestResult(unittest.IsolatedAsyncioTestCase):
+
+    async def test_plain_dict(self):
+        ok, ko = flow.success({"a": [1]}), flow.error(ValueError("no"))
+        for r in (ok, ko):
+            self.assertIsInstance(r, dict)
+            self.assertEqual(set(r), set(flow.Result.KEYS))
+            self.assertTrue(flow.is_result(r))
+        self.assertEqual(json.loads(json.dumps(ok))["outputs"], {"a": [1]})
+        self.assertEqual(json.loads(json.dumps(ko))["errors"], ["no"])
+        self.assertEqual(flow.output(ok), {"a": [1]})
+        self.assertEqual((ok | {"action": "x"})["action"], "x")
+        self.assertEqual(pickle.loads(pickle.dumps(ok)), ok)
+
+    async def test_node_results(self):
+        runner = flow.DagRunner()
+        await runner.add_file("f", [flow.node("a", lambda ctx: 1), flow.node("b", lambda ctx: 2, deps=["a"])])
+        runner.create_session("s")
+        res = await runner.run_file("s", "f")
+        await runner.stop()
+        dumped = json.loads(json.dumps(res))
+        self.assertEqual({k: v["outputs"] for k, v in dumped.items()}, {"a": 1, "b": 2})
+        self.assertLess(res["a"]["version"], res["b"]["version"])
+
+# ─────────────────────────────────────────────
+# MEMO — cache dei nodi puri condivisa tra sessioni
+# ─────────────────────────────────────────────
+
+class TestMemo(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.calls = 0
+        def load(ctx):
+            self.calls += 1
+            return {"items": [1, 2]}
+        self.runner = flow.DagRunner()
+        await self.runner.add_file("f", [flow.node("data", load, memo=True)])
+        for sid in ("s1", "s2", "s3"):
+            self.runner.create_session(sid)
+
+    async def asyncTearDown(self):
+        await self.runner.stop()
+
+    async def test_shared_execution(self):
+        for sid in ("s1", "s2", "s3"):
+            res = await self.runner.run_file(sid, "f")
+            self.assertEqual(res["data"]["outputs"], {"items": [1, 2]})
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.runner.memo.stats()["hits"], 2)
+
+    async def test_sessions_isolated(self):
+        await self.runner.run_file("s1", "f")
+        self.runner.context("s1")["data"]["items"].append(99)   # mutazione di chi ha calcolato
+        await self.runner.run_file("s2", "f")
+        self.runner.context("s2")["data"]["items"].append(42)   # mutazione di un hit
+        await self.runner.run_file("s3", "f")
+
+        self.assertEqual(self.runner.context("s1")["data"], {"items": [1, 2, 99]})
+        self.assertEqual(self.runner.context("s2")["data"], {"items": [1, 2, 42]})
+        self.assertEqual(self.runner.context("s3")["data"], {"items": [1, 2]})
+        self.assertEqual(self.calls, 1)
+
+# ─────────────────────────────────────────────
+# TIMEOUT — watchdog dei nodi e errori del motore
+# ─────────────────────────────────────────────
+
+class TestTimeouts(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.runner = flow.DagRunner()
+
+    async def asyncTearDown(self):
+        await self.runner.stop()
+
+    async def _run(self, *nodes):
+        await self.runner.add_file("f", list(nodes))
+        self.runner.create_session("s")
+        return await self.runner.run_file("s", "f")
+
+    async def test_node_timeout(self):
+        async def slow(ctx):
+            await asyncio.sleep(5)
+        res = await self._run(flow.node("slow", slow, timeout=0.05),
+                              flow.node("child", lambda ctx: 1, deps=["slow"]))
+        self.assertFalse(res["slow"]["success"])
+        self.assertIn("timeout", res["slow"]["errors"][0])
+        self.assertEqual(self.runner.timeout_stats(), {"f::slow": 1})
+
+    async def test_user_timeout_error(self):
+        async def fails(ctx):
+            raise asyncio.TimeoutError("upstream lento")
+        for limit in (30, None):
+            with self.subTest(timeout=limit):
+                res = await self._run(flow.node("call", fails, timeout=limit))
+                self.assertFalse(res["call"]["success"])
+                self.assertEqual(res["call"]["errors"], ["upstream lento"])
+        self.assertEqual(self.runner.timeout_stats(), {})
+
+    async def test_deadline_scoped_to_runs(self):
+        async def slow(ctx):
+            await asyncio.sleep(0.1)
+            return 1
+        await self.runner.add_file("f", [flow.node("slow", slow)])
+        self.runner.create_session("s")
+        bounded = asyncio.ensure_future(self.runner.run_file("s", "f", timeout=0.03))
+        await asyncio.sleep(0)
+        free = await self.runner.run_file("s", "f")    # senza timeout: nodi non limitati
+        self.assertTrue(free["slow"]["success"])
+        with self.assertRaises(asyncio.TimeoutError):
+            await bounded
+        await asyncio.sleep(0.2)                      # la deadline scaduta resta finché i nodi non si esauriscono
+        session = self.runner.sessions["s"]
+        self.assertEqual((session["deadlines"], session["runs"]), ({}, {}))
+
+    async def test_engine_error_becomes_result(self):
+        def broken(ctx):
+            raise KeyError("when")
+        res = await self._run(flow.node("guarded", lambda ctx: 1, when=broken))
+        self.assertFalse(res["guarded"]["success"])
+        self.assertIn("when", res["guarded"]["errors"][0])
+
+# ─────────────────────────────────────────────
+# INCREMENTALE — update_state e cono a valle dei path cambiati
+# ─────────────────────────────────────────────
+
+class TestIncremental(unittest.IsolatedAsyncioTestCase):
+
+    async def _runner(self, **kw):
+        self.calls = {"double": 0, "other": 0}
+        def double(ctx):
+            self.calls["double"] += 1
+            return ctx["x"] * 2
+        def other(ctx):
+            self.calls["other"] += 1
+            return 0
+        runner = flow.DagRunner(**kw)
+        await runner.add_file("f", [flow.node("double", double, reads=["x"]),
+                                    flow.node("other", other)])
+        runner.create_session("s", {"x": 1})
+        await runner.run_file("s", "f")
+        return runner
+
+    async def test_update_state_default_no_trigger(self):
+        runner = await self._runner()
+        runner.update_state("s", "x", 5)
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.calls, {"double": 1, "other": 1})
+        self.assertEqual(runner.context("s")["x"], 5)
+        await runner.stop()
+
+    async def test_emit_default_only_named_node(self):
+        runner = await self._runner()
+        runner.emit("s", "f", "x", 5)      # non è un nodo: aggiorna solo il ctx
+        runner.emit("s", "f", "other")
+        await runner.wait_node("s", "f", "other")
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.calls, {"double": 1, "other": 2})
+        self.assertEqual(runner.context("s")["x"], 5)
+        await runner.stop()
+
+    async def test_update_state_incremental(self):
+        runner = await self._runner(incremental=True)
+        runner.update_state("s", "x", 5)
+        await runner.wait_node("s", "f", "double")
+        self.assertEqual(self.calls, {"double": 2, "other": 1})
+        self.assertEqual(runner.context("s")["double"], 10)
+
+        runner.update_state("s", "x", 5)   # valore invariato: nessun ricalcolo
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.calls["double"], 2)
+
+        runner.update_state("s", "x", 7)   # run_file attende il ricalcolo, non riesegue le radici
+        res = await runner.run_file("s", "f")
+        self.assertEqual(res["double"]["outputs"], 14)
+        self.assertEqual(self.calls["other"], 1)
+        await runner.stop()
+
+# ─────────────────────────────────────────────
+# EVICTION — sessioni inattive su spill e ritorno trasparente
+# ─────────────────────────────────────────────
+
+class TestEviction(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.runner = flow.DagRunner(max_sessions=2)
+        await self.runner.add_file("f", [flow.node("count", lambda ctx: ctx["count"] + 1, path="count")])
+
+    async def asyncTearDown(self):
+        await self.runner.stop()
+
+    async def test_lru_cap_and_rehydrate(self):
+        for sid in ("a", "b", "c"):
+            self.runner.create_session(sid, {"count": 0, "fn": len})
+            await self.runner.run_file(sid, "f")
+        stats = self.runner.session_stats()
+        self.assertEqual((stats["resident"], stats["spilled"]), (2, 1))
+        self.assertNotIn("a", self.runner.sessions)
+
+        res = await self.runner.run_file("a", "f")   # torna residente con ctx e results
+        self.assertEqual(res["count"]["outputs"], 2)
+        self.assertIs(self.runner.context("a")["fn"], len)
+        self.assertEqual(self.runner.session_stats()["rehydrations"], 1)
+
+    async def test_evict_idle(self):
+        self.runner.create_session("a", {"count": 0})
+        await self.runner.run_file("a", "f")
+        self.assertEqual(self.runner.evict_idle(ttl=0), 1)
+        self.assertTrue(self.runner.has_session("a"))
+        self.assertEqual(self.runner.context("a")["count"], 1)
+
+    async def test_evicted_while_admitted(self):
+        self.runner.create_session("a", {"count": 0})
+        admit = self.runner.queue.admit
+        async def slow_admit(shed=False):
+            self.assertTrue(self.runner.evict("a"))   # espulsa durante l'attesa in coda
+            await admit(shed)
+        self.runner.queue.admit = slow_admit
+
+        res = await asyncio.wait_for(self.runner.run_file("a", "f"), 1)
+        self.assertEqual(res["count"]["outputs"], 1)
+        self.assertIn("a", self.runner.sessions)
+        self.assertEqual(self.runner.context("a")["count"], 1)
+
+# ─────────────────────────────────────────────
+# RUN_MANY — stesso file su molte sessioni
+# ─────────────────────────────────────────────
+
+class TestRunMany(unittest.IsolatedAsyncioTestCase):
+
+    SIDS = [f"u{i}" for i in range(20)]
+
+    async def _runner(self):
+        runner = flow.DagRunner()
+        await runner.add_file("dash", [
+            flow.node("prices", lambda ctx: 100, memo=True),
+            flow.node("view", lambda ctx: ctx["prices"] + ctx["n"] + ctx["tick"], deps=["prices"]),
+            flow.node("seen", lambda ctx: ctx.get("seen", 0) + 1, path="seen"),
+        ])
+        for i, sid in enumerate(self.SIDS):
+            runner.create_session(sid, {"n": i})
+        return runner
+
+    @staticmethod
+    def _outputs(results):
+        return {name: (r["success"], r["outputs"]) for name, r in results.items()}
+
+    async def test_matches_run_file(self):
+        single, batch = await self._runner(), await self._runner()
+        updates = {"u3": {"extra": True}}
+        expected = {}
+        for _ in range(2):
+            for sid in self.SIDS:
+                expected[sid] = self._outputs(await single.run_file(sid, "dash", {"tick": 1} | updates.get(sid, {})))
+            got = [(sid, self._outputs(res)) async for sid, res in
+                   batch.run_many(self.SIDS, "dash", {"tick": 1}, updates=updates)]
+            self.assertEqual([sid for sid, _ in got], self.SIDS)
+            self.assertEqual(dict(got), expected)
+        for sid in self.SIDS:
+            self.assertEqual(dict(batch.context(sid).maps[0]), dict(single.context(sid).maps[0]))
+        await single.stop()
+        await batch.stop()
+
+    async def test_missing_session_and_early_exit(self):
+        runner = await self._runner()
+        seen = []
+        async for sid, res in runner.run_many(["nobody"] + self.SIDS, "dash", {"tick": 1}):
+            seen.append((sid, res))
+            if len(seen) == 3:
+                break
+        self.assertIsInstance(seen[0][1], ValueError)
+        await asyncio.sleep(0.05)
+        self.assertFalse(any(runner.sessions[sid]["running_files"] for sid in self.SIDS))
+        await runner.stop()
+
+# ─────────────────────────────────────────────
+# LIMITER — posti condivisi, coda FIFO e ridimensionamento
+# ─────────────────────────────────────────────
+
+class TestLimiter(unittest.IsolatedAsyncioTestCase):
+
+    async def _fill(self, lim, n):
+        gates = [asyncio.Event() for _ in range(n)]
+        started = []
+        async def call(i):
+            started.append(i)
+            await gates[i].wait()
+        tasks = [asyncio.ensure_future(lim.run(call(i))) for i in range(n)]
+        await asyncio.sleep(0)
+        return gates, started, tasks
+
+    async def test_fifo(self):
+        lim = flow._Limiter(1)
+        gates, started, tasks = await self._fill(lim, 3)
+        self.assertEqual(started, [0])
+        for i in range(3):
+            gates[i].set()
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+        self.assertEqual(started, [0, 1, 2])
+        self.assertEqual(lim.stats()["queued"], 2)
+        self.assertEqual(lim.active, 0)
+
+    async def test_shrink_holds_waiters(self):
+        lim = flow._Limiter(3)
+        gates, started, tasks = await self._fill(lim, 5)
+        self.assertEqual(started, [0, 1, 2])
+        lim.resize(1)
+        gates[0].set(); gates[1].set()
+        await asyncio.sleep(0.01)
+        self.assertEqual((started, lim.active), ([0, 1, 2], 1))   # nessun posto oltre il limite
+        gates[2].set()
+        await asyncio.sleep(0.01)
+        self.assertEqual((started, lim.active), ([0, 1, 2, 3], 1))
+        lim.resize(2)
+        await asyncio.sleep(0)
+        self.assertEqual((started, lim.active), ([0, 1, 2, 3, 4], 2))
+        gates[3].set(); gates[4].set()
+        await asyncio.gather(*tasks)
+        self.assertEqual(lim.active, 0)
+
+    async def test_node_max_concurrency(self):
+        peak = running = 0
+        async def work(ctx):
+            nonlocal peak, running
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+        runner = flow.DagRunner()
+        await runner.add_file("f", [flow.node("w", work, max_concurrency=2)])
+        sids = [f"s{i}" for i in range(5)]
+        for sid in sids:
+            runner.create_session(sid)
+        await asyncio.gather(*(runner.run_file(sid, "f") for sid in sids))
+        await runner.stop()
+        self.assertEqual(peak, 2)
+        self.assertEqual(runner.concurrency_stats()["f::w"]["calls"], 5)
+
+# ─────────────────────────────────────────────
+# DAG — dipendenze, emit e attesa dei nodi
+# ─────────────────────────────────────────────
+
+class TestDag(unittest.IsolatedAsyncioTestCase):
+
+    async def test_diamond(self):
+        order = []
+        def track(name, fn):
+            def run(ctx):
+                order.append(name)
+                return fn(ctx)
+            return run
+        runner = flow.DagRunner()
+        await runner.add_file("f", [
+            flow.node("a", track("a", lambda ctx: ctx["x"] + 1)),
+            flow.node("b", track("b", lambda ctx: ctx["a"] * 2), deps=["a"]),
+            flow.node("c", track("c", lambda ctx: ctx["a"] + 3), deps=["a"]),
+            flow.node("d", track("d", lambda ctx: ctx["b"] + ctx["c"]), deps=["b", "c"]),
+        ])
+        runner.create_session("s", {"x": 10})
+        res = await runner.run_file("s", "f")
+        self.assertEqual({k: v["outputs"] for k, v in res.items()}, {"a": 11, "b": 22, "c": 14, "d": 36})
+        self.assertEqual((order[0], order[-1]), ("a", "d"))
+
+        runner.context("s")["x"] = 20
+        runner.emit("s", "f", "a")
+        await runner.wait_node("s", "f", "d")
+        self.assertEqual(runner.context("s")["d"], 66)
+        await runner.stop()
+
+# ─────────────────────────────────────────────
+# PIANO — compilazione del file e attach_node
+# ─────────────────────────────────────────────
+
+class TestPlan(unittest.IsolatedAsyncioTestCase):
+
+    NODES = [flow.node("d", lambda ctx: 0, deps=["b", "c"]), flow.node("b", lambda ctx: 0, deps=["a"]),
+             flow.node("a", lambda ctx: 0), flow.node("c", lambda ctx: 0, deps=["a", "ext"])]
+
+    async def test_compile(self):
+        plan  = flow._Plan.compile("f", self.NODES)
+        names = lambda ids: sorted(plan.names[i] for i in ids)
+        order = [plan.names[i] for i in plan.order]
+        self.assertEqual(names(plan.roots), ["a"])
+        self.assertEqual(names(plan.succ[plan.index["a"]]), ["b", "c"])
+        self.assertEqual(names(plan.pred[plan.index["d"]]), ["b", "c"])
+        self.assertLess(order.index("a"), order.index("b"))
+        self.assertLess(order.index("c"), order.index("d"))
+        self.assertEqual(plan.dep_keys[plan.index["c"]], ("f::a", "f::ext"))   # dep esterno: solo chiave
+
+    async def test_rejects_cycles(self):
+        with self.assertRaises(ValueError):
+            flow._Plan.compile("f", [flow.node("a", lambda ctx: 0, deps=["b"]),
+                                     flow.node("b", lambda ctx: 0, deps=["a"])])
+
+    async def test_attach_node(self):
+        runner = flow.DagRunner()
+        await runner.add_file("f", self.NODES[1:3])
+        runner.attach_node("f", flow.node("late", lambda ctx: ctx["b"], deps=["b"]))
+        plan = runner.plans["f"]
+        self.assertEqual(plan.pred[plan.index["late"]], (plan.index["b"],))
+        runner.create_session("s")
+        res = await runner.run_file("s", "f")
+        self.assertEqual(res["late"]["outputs"], 0)
+        await runner.stop()
+
+# ─────────────────────────────────────────────
+# SCHEDULER — corsie per sessione e turni pesati
+# ─────────────────────────────────────────────
+
+async def _drain(queue, n):
+    return [await queue.get() for _ in range(n)]
+
+class TestScheduler(unittest.IsolatedAsyncioTestCase):
+
+    async def test_round_robin(self):
+        queue = flow._Scheduler()
+        for i in range(4):
+            queue.put_nowait(("s1", "f", i, flow.NORMAL))
+        for i in range(2):
+            queue.put_nowait(("s2", "f", i, flow.NORMAL))
+        self.assertEqual([it[0] for it in await _drain(queue, 6)], ["s1", "s2", "s1", "s2", "s1", "s1"])
+
+    async def test_weights(self):
+        queue = flow._Scheduler(weights={"s1": 2})
+        for sid in ("s1", "s2"):
+            for i in range(4):
+                queue.put_nowait((sid, "f", i, flow.NORMAL))
+        self.assertEqual([it[0] for it in await _drain(queue, 6)], ["s1", "s1", "s2", "s1", "s1", "s2"])
+
+    async def test_burst_does_not_starve(self):
+        order = []
+        runner = flow.DagRunner(workers=1)
+        await runner.add_file("f", [flow.node("n", lambda ctx: order.append(ctx["sid"]))])
+        for sid in ("busy", "calm"):
+            runner.create_session(sid, {"sid": sid})
+        runner.set_weight("busy", 3)
+        self.assertEqual(runner.queue.weights["busy"], 3)
+        for _ in range(6):
+            runner.queue.put_nowait(("busy", "f", 0, flow.NORMAL))
+        runner.queue.put_nowait(("calm", "f", 0, flow.NORMAL))
+        await runner.start()
+        await asyncio.sleep(0.05)
+        await runner.stop()
+        self.assertEqual(order.index("calm"), 3)   # dopo un solo turno di busy
+
+# ─────────────────────────────────────────────
+# EXECUTOR — fn sincrone fuori dall'event loop
+# ─────────────────────────────────────────────
+
+class TestExecutors(unittest.IsolatedAsyncioTestCase):
+
+    async def test_thread(self):
+        runner = flow.DagRunner()
+        name = lambda ctx: threading.current_thread().name
+        await runner.add_file("f", [flow.node("pool", name, executor="thread"), flow.node("loop", name)])
+        runner.create_session("s")
+        res = await runner.run_file("s", "f")
+        await runner.stop()
+        self.assertEqual(res["loop"]["outputs"], threading.current_thread().name)
+        self.assertNotEqual(res["pool"]["outputs"], threading.current_thread().name)
+
+    async def test_unknown(self):
+        with self.assertRaises(ValueError):
+            await flow.DagRunner().add_file("f", [flow.node("x", lambda ctx: 1, executor="gpu")])
+
+
+    async def test_process_needs_pickle(self):
+        with self.assertRaises(TypeError):
+            await flow.offload("process", lambda: 1)
+        self.assertEqual(await flow.offload("loop", lambda v: v + 1, 1), 2)
+
+# ─────────────────────────────────────────────
+# NODO — ciclo di vita compilato: when, hook, retry e policy
+# ─────────────────────────────────────────────
+
+class TestNodeLifecycle(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.runner = flow.DagRunner()
+
+    async def asyncTearDown(self):
+        await self.runner.stop()
+
+    async def _run(self, *nodes, ctx=None):
+        await self.runner.add_file("f", list(nodes))
+        self.runner.create_session("s", ctx)
+        return await self.runner.run_file("s", "f")
+
+    async def test_hooks_and_retries(self):
+        events, calls = [], []
+        def flaky(ctx):
+            calls.append(1)
+            if len(calls) < 3:
+                raise ValueError("ancora")
+            return "ok"
+        hook = lambda name: (lambda d, result: events.append((name, result and result["success"])))
+        res = await self._run(flow.node("n", flaky, retries=2, on_start=hook("start"),
+                                        on_success=hook("success"), on_error=hook("error"), on_end=hook("end")))
+        self.assertEqual(res["n"]["outputs"], "ok")
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(events, [("start", None), ("success", True), ("error", True), ("end", True)])
+
+    async def test_when_and_policy(self):
+        res = await self._run(
+            flow.node("ok", lambda ctx: 1),
+            flow.node("ko", lambda ctx: 1 / 0),
+            flow.node("all", lambda ctx: "all", deps=["ok", "ko"]),
+            flow.node("any", lambda ctx: "any", deps=["ok", "ko"], policy="any"),
+            flow.node("skip", lambda ctx: "skip", when=lambda ctx: ctx["flag"]),
+            ctx={"flag": False})
+        self.assertFalse(res["ko"]["success"])
+        self.assertEqual(res["any"]["outputs"], "any")
+        self.assertNotIn("all", res)
+        self.assertNotIn("skip", res)
+        self.assertEqual(self.runner.context("s")["ok"], 1)
+
+# ─────────────────────────────────────────────
+# CHECKPOINT — snapshot e restore pigro
+# ─────────────────────────────────────────────
+
+class TestCheckpoint(unittest.IsolatedAsyncioTestCase):
+
+    NODES = [flow.node("a", lambda ctx: ctx["x"] + 1), flow.node("b", lambda ctx: ctx["a"] * 2, deps=["a"])]
+
+    async def asyncSetUp(self):
+        self.dir  = tempfile.mkdtemp(prefix="flow-ckpt-")
+        self.path = os.path.join(self.dir, "snap.bin")
+
+    async def asyncTearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    async def test_restore(self):
+        runner = flow.DagRunner(checkpoint_path=self.path)
+        await runner.add_file("f", self.NODES)
+        for i in range(3):
+            runner.create_session(f"s{i}", {"x": i, "fn": len})
+            await runner.run_file(f"s{i}", "f")
+        await runner.stop()                # snapshot allo stop
+        self.assertTrue(os.path.exists(self.path))
+
+        booted = flow.DagRunner(checkpoint_path=self.path)
+        await booted.add_file("f", self.NODES)
+        self.assertEqual(booted.restore(env={"fn": len}), 3)
+        self.assertEqual(len(booted.sessions), 0)   # nessuna sessione caricata finché non serve
+        self.assertTrue(booted.has_session("s2"))
+        ctx = booted.context("s2")
+        self.assertEqual((ctx["a"], ctx["b"]), (3, 6))
+        self.assertIs(ctx["fn"], len)
+        res = await booted.run_file("s1", "f")
+        self.assertEqual(res["b"]["outputs"], 4)
+        self.assertEqual(booted.restore(), 0)       # già registrate
+        await booted.stop()
+
+    async def test_versions_after_restore(self):
+        runner = flow.DagRunner(checkpoint_path=self.path)
+        await runner.add_file("f", self.NODES)
+        runner.create_session("s", {"x": 1})
+        for _ in range(20):
+            res = await runner.run_file("s", "f")
+        top = res["b"]["version"]
+        await runner.stop()
+
+        booted = flow.DagRunner(checkpoint_path=self.path)
+        await booted.add_file("f", self.NODES)   # executor compilati prima del restore
+        booted.restore()
+        res = await booted.run_file("s", "f")
+        self.assertGreater(res["a"]["version"], top)
+        self.assertGreater(res["b"]["version"], res["a"]["version"])
+        await booted.stop()
+
+    async def test_no_path(self):
+        with self.assertRaises(ValueError):
+            flow.DagRunner().checkpoint()
+        self.assertEqual(flow.DagRunner().restore(self.path), 0)
+
+# ─────────────────────────────────────────────
+# TIMER — nodi `schedule` su un solo heap
+# ─────────────────────────────────────────────
+
+class TestTimers(unittest.IsolatedAsyncioTestCase):
+
+    async def test_batch_by_resolution(self):
+        batches = []
+        def fire(batch):
+            batches.append(sorted(e[4] for e in batch))
+            return []
+        timers = flow._Timers(fire, resolution=0.05)
+        for name, interval in (("a", 0.01), ("b", 0.02), ("c", 0.06)):
+            timers.add("s", "f", name, interval)
+        slots = {}
+        for at, _, _, _, name, _, _ in timers.heap:
+            self.assertAlmostEqual(at / 0.05, round(at / 0.05))   # scadenze allineate a resolution
+            slots.setdefault(at, []).append(name)
+        await asyncio.sleep(0.15)
+        self.assertEqual(batches, [sorted(names) for _, names in sorted(slots.items())])
+        self.assertLess(len(batches), 3)
+        self.assertEqual(len(timers), 0)
+
+    async def test_schedule_node(self):
+        ticks = []
+        runner = flow.DagRunner()
+        await runner.add_file("f", [flow.node("tick", lambda ctx: ticks.append(1) or len(ticks), schedule=0.02)])
+        runner.create_session("s")
+        await runner.run_file("s", "f")
+        await asyncio.sleep(0.15)
+        self.assertGreaterEqual(len(ticks), 3)
+        self.assertEqual(runner.context("s")["tick"], len(ticks))
+
+        await runner.close_session("s")
+        seen = len(ticks)
+        await asyncio.sleep(0.08)
+        self.assertEqual(len(ticks), seen)
+        await runner.stop()
+
+# ─────────────────────────────────────────────
+# ADMISSION — watermark della coda
+# ─────────────────────────────────────────────
+
+class TestAdmission(unittest.IsolatedAsyncioTestCase):
+
+    async def test_admission(self):
+        queue = flow._Scheduler(high=4)
+        for i in range(4):
+            queue.put_nowait(("s", "f", i, flow.NORMAL))
+        self.assertTrue(queue.saturated)
+        with self.assertRaises(asyncio.QueueFull):
+            await queue.admit(shed=True)
+        waiter = asyncio.ensure_future(queue.admit())
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+        await _drain(queue, 2)        # scende a low = high / 2
+        await asyncio.sleep(0)
+        self.assertTrue(waiter.done())
+        stats = queue.stats()
+        self.assertEqual((stats["rejected"], stats["delayed"], stats["saturated"]), (1, 1, False))
+
+    async def test_run_file_shed(self):
+        runner = flow.DagRunner(queue_high=2, overload="shed")
+        await runner.add_file("f", [flow.node("a", lambda ctx: 1),
+                                    flow.node("bg", lambda ctx: 2, priority="background", entry=False)])
+        runner.create_session("s")
+        for i in range(2):
+            runner.queue.put_nowait(("s", "f", 0, flow.NORMAL))
+        with self.assertRaises(asyncio.QueueFull):
+            await runner.run_file("s", "f")
+        self.assertFalse(runner.emit("s", "f", "bg"))
+        self.assertTrue(runner.emit("s", "f", "a"))    # interactive: la sua banda è sotto queue_low
+        self.assertEqual(runner.queue_stats()["rejected"], 2)
+        await runner.start()
+        await asyncio.sleep(0.05)          # i worker svuotano la coda
+        res = await runner.run_file("s", "f")
+        self.assertTrue(res["a"]["success"])
+        await runner.stop()
+
+# ─────────────────────────────────────────────
+# LIVELLI — ctx di sessione su default dei file e builtins
+# ─────────────────────────────────────────────
+
+class TestLayers(unittest.IsolatedAsyncioTestCase):
+
+    async def test_shared_layers(self):
+        runner = flow.DagRunner(builtins={"fn": len})
+        await runner.add_file("a", [flow.node("app.count", lambda ctx: ctx["app"]["count"] + 1, path="app.count", default=0),
+                                    flow.node("todos", lambda ctx: None, default=[], entry=False)])
+        runner.create_session("s1", {"user": "x"})
+        runner.create_session("s2")
+        self.assertEqual(dict(runner.sessions["s1"]["ctx"].maps[0]), {"user": "x"})   # niente copie
+        self.assertIs(runner.context("s1")["fn"], len)
+
+        await runner.run_file("s1", "a")
+        runner.context("s1")["todos"].append(1)
+        self.assertEqual((runner.context("s1")["app"], runner.context("s1")["todos"]), ({"count": 1}, [1]))
+        self.assertEqual((runner.context("s2")["app"], runner.context("s2")["todos"]), ({"count": 0}, []))
+
+        await runner.add_file("b", [flow.node("app.name", lambda ctx: None, default="demo", entry=False)])
+        self.assertEqual(runner.context("s2")["app"], {"count": 0, "name": "demo"})
+        await runner.stop()
+
+# ─────────────────────────────────────────────
+# PROFILER — fasi dei nodi, cammino critico e flame
+# ─────────────────────────────────────────────
+
+class TestProfiler(unittest.IsolatedAsyncioTestCase):
+
+    async def test_disabled(self):
+        runner = flow.DagRunner()
+        with self.assertRaises(RuntimeError):
+            runner.stats()
+
+    async def test_stats(self):
+        async def slow(ctx):
+            await asyncio.sleep(0.02)
+            return 1
+        runner = flow.DagRunner(profile=100)
+        await runner.add_file("f", [flow.node("slow", slow), flow.node("fast", lambda ctx: 2),
+                                    flow.node("end", lambda ctx: ctx["slow"] + ctx["fast"], deps=["slow", "fast"])])
+        for sid in ("s1", "s2"):
+            runner.create_session(sid)
+            await runner.run_file(sid, "f")
+        stats = runner.stats("f")
+        await runner.stop()
+
+        self.assertEqual({n: s["count"] for n, s in stats["nodes"].items()}, {"slow": 2, "fast": 2, "end": 2})
+        path = [step["node"] for step in stats["critical_path"]["slowest"]["path"]]
+        self.assertEqual(path, ["slow", "end"])
+        self.assertGreaterEqual(stats["critical_path"]["slowest"]["ms"], 20)
+
+        out = os.path.join(tempfile.mkdtemp(prefix="flow-flame-"), "f.folded")
+        lines = runner.export_flame(out, "f")
+        with open(out) as fh:
+            self.assertEqual(len(fh.read().splitlines()), lines)
+        shutil.rmtree(os.path.dirname(out))
+
+# ─────────────────────────────────────────────
+# PRIORITÀ — banda dei nodi
+# ─────────────────────────────────────────────
+
+class TestPriorities(unittest.IsolatedAsyncioTestCase):
+
+    async def test_bands_and_starvation(self):
+        queue = flow._Scheduler(starve=2)
+        for i in range(4):
+            queue.put_nowait(("s", "f", i, flow.BACKGROUND))
+        for i in range(4):
+            queue.put_nowait(("s", "f", i, flow.INTERACTIVE))
+        bands = [it[3] for it in await _drain(queue, 8)]
+        self.assertEqual(bands[:6], [flow.INTERACTIVE, flow.INTERACTIVE, flow.BACKGROUND,
+                                     flow.INTERACTIVE, flow.INTERACTIVE, flow.BACKGROUND])
+        self.assertEqual(queue.stats()["bands"]["interactive"]["served"], 4)
+
+    async def test_bands(self):
+        runner = flow.DagRunner()
+        await runner.add_file("f", [flow.node("bg", lambda ctx: 1, priority="background"),
+                                    flow.node("any", lambda ctx: 2)])
+        plan = runner.plans["f"]
+        bg, any_ = plan.index["bg"], plan.index["any"]
+        self.assertEqual(plan.priority(bg, flow.INTERACTIVE), flow.BACKGROUND)
+        self.assertEqual(plan.priority(any_, flow.INTERACTIVE), flow.INTERACTIVE)
+        self.assertEqual(plan.priority(any_, flow.NORMAL), flow.NORMAL)
+        with self.assertRaises(ValueError):
+            await runner.add_file("g", [flow.node("a", lambda ctx: 1, priority="urgent")])
+
+        runner.create_session("s")
+        await runner.run_file("s", "f")
+        bands = runner.queue_stats()["bands"]
+        self.assertEqual((bands["background"]["served"], bands["normal"]["served"]), (1, 1))
+        await runner.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,243 @@
+"""Benchmark Interpreter
+
+Confronta i due backend dell'Interpreter (``interpreted``: visita nodo per
+nodo; ``compiled``: closure generate a load_file) sulla valutazione di un
+file DSL stile controller, sulle chiamate a funzioni DSL e sul costo di
+load_file; poi load_file a freddo e a caldo con la cache degli AST su disco
+e la latenza dei run di file policy con e senza cache delle voci costanti;
+la valutazione di dict grandi con un env grande (scope chain); infine un
+dict di chiamate lente indipendenti, in ordine o concorrenti.
+
+Uso::
+
+    python src/framework/service/language.bench.py
+"""
+
+import os, sys
+
+# La cartella dello script contiene logging.py: va sostituita con src/
+# prima di importare asyncio, altrimenti oscura il modulo della stdlib.
+sys.path[0] = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+
+import asyncio, glob, shutil, statistics, tempfile, time
+
+import framework.service.language as language
+
+RUNS = 50
+
+# ─────────────────────────────────────────────
+# SORGENTE — sezioni di un controller: costanti, espressioni, chiamate, pipe
+# ─────────────────────────────────────────────
+
+def controller(sections: int) -> str:
+    out = ["function:score := (int:x, int:y){ s: x * 2 + y; ok: s > 10 and not (s == 42); }(int:s, boolean:ok);"]
+    for i in range(sections):
+        out.append(f"""
+section_{i}: {{
+    int:base := {i};
+    limits: {{ "cpu": 80; "memory": 90; "disk": base + 5; }};
+    total: limits.cpu + limits.memory * 2 - base % 3;
+    flags: [total > 100, total <= 250, not (base == 3), base in [1, 2, 3]];
+    label: "sezione " + "{i}";
+    names: keys(limits) |> pass;
+    pair: (base, total, label);
+}};""")
+    return "\n".join(out)
+
+async def _interpreter(backend: str, name: str, source: str):
+    interp = language.Interpreter(backend=backend)
+    await interp.start()
+    await interp.load_file(name, source)
+    return interp
+
+# ─────────────────────────────────────────────
+# EVAL — visita dell'AST del file (quello che fa _run_session prima del DAG)
+# ─────────────────────────────────────────────
+
+async def evaluate(backend: str, sections: int = 50):
+    interp = await _interpreter(backend, "ctrl", controller(sections))
+    ast, env = interp._ast_cache["ctrl"], dict(language.DSL_FUNCTIONS)
+
+    samples = []
+    for _ in range(RUNS):
+        t0 = time.perf_counter()
+        result, _ = await interp.visit(ast, env)
+        samples.append(time.perf_counter() - t0)
+    await interp.stop()
+
+    print(f"eval-{sections:<7} {backend:<12} "
+          f"p50={statistics.median(samples) * 1e3:8.2f}ms "
+          f"min={min(samples) * 1e3:8.2f}ms "
+          f"entries={len(result)}")
+    return result
+
+# ─────────────────────────────────────────────
+# CALL — funzione DSL invocata da Python (come fa tester / foreach)
+# ─────────────────────────────────────────────
+
+async def calls(backend: str, count: int = 5000):
+    interp = await _interpreter(backend, "fn", controller(0))
+    score, _ = await interp.visit(interp._ast_cache["fn"], dict(language.DSL_FUNCTIONS))
+    score = score["score"]
+
+    t0 = time.perf_counter()
+    for i in range(count):
+        res = await interp._invoke(score, [i, 1], {})
+    elapsed = time.perf_counter() - t0
+    await interp.stop()
+
+    print(f"call-{count:<7} {backend:<12} "
+          f"per_call={elapsed / count * 1e6:8.1f}us "
+          f"calls/s={count / elapsed:10.0f} last={res['outputs']}")
+
+# ─────────────────────────────────────────────
+# LOAD — costo di load_file (parse + build + compilazione)
+# ─────────────────────────────────────────────
+
+async def load(backend: str, sections: int = 50):
+    source = controller(sections)
+    interp = language.Interpreter(backend=backend)
+    await interp.start()
+
+    samples = []
+    for _ in range(5):
+        t0 = time.perf_counter()
+        await interp.load_file("ctrl", source)
+        samples.append(time.perf_counter() - t0)
+    await interp.stop()
+
+    print(f"load-{sections:<7} {backend:<12} "
+          f"p50={statistics.median(samples) * 1e3:8.2f}ms "
+          f"closures={len(interp._codes)}")
+
+# ─────────────────────────────────────────────
+# PARSE CACHE — load_file dei .dsl del repo: senza cache, a freddo, a caldo
+# ─────────────────────────────────────────────
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+
+async def parse_cache():
+    sources = {}
+    for path in sorted(glob.glob(os.path.join(SRC, "**", "*.dsl"), recursive=True)):
+        with open(path) as f:
+            sources[os.path.relpath(path, SRC)] = f.read()
+
+    t0 = time.perf_counter()
+    language.create_parser()
+    print(f"{'parser':<12} create_parser={(time.perf_counter() - t0) * 1e3:8.2f}ms (una volta per processo)")
+
+    async def load_all(label, cache):
+        interp = language.Interpreter(parse_cache=cache)
+        await interp.start()
+        t0 = time.perf_counter()
+        for name, source in sources.items():
+            await interp.load_file(name, source)
+        elapsed = time.perf_counter() - t0
+        await interp.stop()
+        print(f"{label:<12} files={len(sources):<3} load_file={elapsed * 1e3:8.2f}ms "
+              f"per_file={elapsed / len(sources) * 1e3:6.2f}ms {cache.stats()['hits']} hit "
+              f"{cache.stats()['misses']} miss")
+
+    path = tempfile.mkdtemp(prefix="dsl-ast-")
+    try:
+        await load_all("no-cache", language.ParseCache(None))
+        await load_all("cold", language.ParseCache(path))
+        await load_all("warm", language.ParseCache(path))
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+# ─────────────────────────────────────────────
+# CONSTANTS — run di un file policy (demo.dsl): voci costanti rivalutate o in cache
+# ─────────────────────────────────────────────
+
+async def constants(label: str, path: str, cached: bool = True):
+    with open(os.path.join(SRC, path)) as f:
+        source = f.read()
+    interp = language.Interpreter()
+    await interp.start()
+    await interp.load_file(path, source)
+    if not cached:
+        interp._constants.pop(path)   # ogni run rivisita tutta la radice
+    interp.session_create("bench")
+
+    samples = []
+    for _ in range(RUNS):
+        t0 = time.perf_counter()
+        await interp._run_session("bench", path, {})
+        samples.append(time.perf_counter() - t0)
+    consts = interp._constants.get(path)
+    await interp.stop()
+
+    print(f"{label:<12} p50={statistics.median(samples) * 1e3:8.2f}ms "
+          f"min={min(samples) * 1e3:8.2f}ms "
+          f"const={len(consts.tipos) if consts else 0}/{len(interp._ast_cache[path]['items'])}")
+
+# ─────────────────────────────────────────────
+# SCOPES — dict di n voci che leggono le precedenti, env con DSL_FUNCTIONS e manager
+# ─────────────────────────────────────────────
+
+async def scopes(backend: str, entries: int, managers: int = 500):
+    source = "\n".join(["k0: seed;"] + [f"k{i}: k{i - 1} + 1;" for i in range(1, entries)])
+    interp = await _interpreter(backend, "big", source)
+    ast = interp._ast_cache["big"]
+    env = dict(language.DSL_FUNCTIONS) | {f"manager_{i}": object() for i in range(managers)} | {"seed": 1}
+
+    samples = []
+    for _ in range(5):
+        t0 = time.perf_counter()
+        result, _ = await interp.visit(ast, env)
+        samples.append(time.perf_counter() - t0)
+    await interp.stop()
+
+    p50 = statistics.median(samples)
+    print(f"dict-{entries:<7} {backend:<12} p50={p50 * 1e3:8.2f}ms "
+          f"per_entry={p50 / entries * 1e6:6.2f}us last={result[f'k{entries - 1}']}")
+
+# ─────────────────────────────────────────────
+# GATHER — dict di n chiamate I/O indipendenti (+ una voce che le combina)
+# ─────────────────────────────────────────────
+
+async def gather(backend: str, limit: int, calls: int = 8, ms: int = 20):
+    async def fetch(i):
+        await asyncio.sleep(ms / 1000)
+        return i
+    source = "\n".join([f"r{i}: fetch({i});" for i in range(calls)] +
+                       ["total: " + " + ".join(f"r{i}" for i in range(calls)) + ";"])
+    interp = language.Interpreter(backend=backend, dict_concurrency=limit)
+    await interp.start()
+    await interp.load_file("io", source)
+    ast = interp._ast_cache["io"]
+    env = dict(language.DSL_FUNCTIONS) | {"fetch": fetch}
+
+    samples = []
+    for _ in range(5):
+        t0 = time.perf_counter()
+        result, _ = await interp.visit(ast, env)
+        samples.append(time.perf_counter() - t0)
+    await interp.stop()
+
+    print(f"gather-{calls}x{ms}ms {backend:<12} limit={limit:<3} "
+          f"p50={statistics.median(samples) * 1e3:8.2f}ms total={result['total']}")
+
+async def main():
+    for sections in (10, 50):
+        results = [await evaluate(backend, sections) for backend in language.Interpreter.BACKENDS]
+        assert results[0] == results[1], "i backend danno risultati diversi"
+    for backend in language.Interpreter.BACKENDS:
+        await calls(backend)
+    for backend in language.Interpreter.BACKENDS:
+        await load(backend)
+    await parse_cache()
+    await constants("policy-full", "application/policy/presentation/demo.dsl", cached=False)
+    await constants("policy-const", "application/policy/presentation/demo.dsl")
+    await constants("lang-full", "framework/service/language.test.dsl", cached=False)
+    await constants("lang-const", "framework/service/language.test.dsl")
+    for backend in language.Interpreter.BACKENDS:
+        for entries in (250, 1000, 4000):
+            await scopes(backend, entries)
+    for backend in language.Interpreter.BACKENDS:
+        for limit in (1, 2, 8):
+            await gather(backend, limit)
+
+if __name__ == "__main__":
+    asyncio.run(main())
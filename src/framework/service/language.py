@@ -38,10 +38,17 @@ Invarianti mantenuti
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import contextvars
+import hashlib
 import inspect
+import marshal
 import operator
+import os
 import random
+import sys
+import tempfile
+import time
 import uuid
 from collections import ChainMap
 from dataclasses import dataclass, field
@@ -54,6 +61,13 @@ _visit_stack: contextvars.ContextVar[List[dict]] = contextvars.ContextVar(
     "_visit_stack", default=None
 )
 
+# Modalità di esecuzione (flow.EXECUTORS) del task in corso: le callable Python
+# sincrone invocate dall'action di un task con `executor: "thread"|"process"`
+# vengono eseguite sui pool condivisi di flow invece che sull'event loop.
+_node_executor: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "_node_executor", default="loop"
+)
+
 from lark import Lark, Token, Transformer, v_args
 
 import framework.service.flow as flow
@@ -64,6 +78,7 @@ import framework.service.scheme as scheme
 GRAMMAR = r"""
 start: dictionary | [item (item)*] -> dictionary_node
 dictionary: "{" [item (item)*] "}" -> dictionary_node
+          | "sequential" "{" [item (item)*] "}" -> sequential_node
 ?item: declaration | entry | task
 declaration: (entry|type_sequence) ":=" sequence ";"?
 entry: (atom|sequence) ":" sequence ";"?
@@ -216,6 +231,10 @@ class DSLTransformer(Transformer):
     def dictionary_node(self, meta, items):
         return self._m({"type": "dict", "items": [i for i in items if i is not None]}, meta)
 
+    def sequential_node(self, meta, items):
+        # `sequential { ... }`: voci valutate una dopo l'altra anche se indipendenti
+        return self._m({"type": "dict", "items": [i for i in items if i is not None], "sequential": True}, meta)
+
     def pair(self, meta, a):
         return self._m({"type": "pair", "key": a[0], "value": a[1]}, meta)
 
@@ -282,11 +301,112 @@ def create_parser() -> Lark:
     return Lark(GRAMMAR, parser='lalr', propagate_positions=True)
 
 
+_shared_parser: Optional[Lark] = None
+
+def shared_parser() -> Lark:
+    """Parser LALR di processo: la tabella della grammatica si costruisce una volta sola."""
+    global _shared_parser
+    if _shared_parser is None:
+        _shared_parser = create_parser()
+    return _shared_parser
+
+
 def parse(source: str, parser: Lark) -> dict:
     """Parsa il sorgente DSL e restituisce l'AST. Solleva lark.UnexpectedInput in caso di errore."""
     return DSLTransformer().transform(parser.parse(source))
 
 
+# Da incrementare quando DSLTransformer cambia la forma dell'AST: invalida
+# (insieme al testo di GRAMMAR e alla versione di marshal) la cache su disco.
+AST_VERSION = 2
+
+class ParseCache:
+    """
+    Cache su disco degli AST, chiave = sha256(testo di GRAMMAR, AST_VERSION,
+    versione di Python/marshal, sorgente): un file invariato si ricarica
+    senza Lark né DSLTransformer, e una grammatica modificata non riusa mai
+    gli AST salvati con la precedente.
+
+    Gli AST sono salvati con marshal (dict/list/tuple/str/numeri soltanto:
+    binario compatto, nessun codice eseguito al caricamento), un file
+    ``<chiave>.ast`` per sorgente, scritto in modo atomico. La cache non fa
+    mai fallire un parse: file corrotti o non scrivibili valgono come miss.
+
+    ``path=None`` disattiva la cache (parse ogni volta).
+    """
+
+    def __init__(self, path: Optional[str] = None, parser: Optional[Lark] = None):
+        self.path   = path
+        self.parser = parser or shared_parser()
+        self._salt  = "\0".join((GRAMMAR, str(AST_VERSION), sys.version.split()[0],
+                                  str(marshal.version))).encode()
+        self.hits = self.misses = self.errors = 0
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def _file(self, source: str) -> str:
+        key = hashlib.sha256(self._salt + b"\0" + source.encode()).hexdigest()
+        return os.path.join(self.path, key + ".ast")
+
+    def parse(self, source: str) -> dict:
+        """Come parse(), passando dalla cache. Solleva lark.UnexpectedInput."""
+        if not self.path:
+            return parse(source, self.parser)
+        file = self._file(source)
+        try:
+            with open(file, "rb") as f:
+                ast = marshal.load(f)
+            self.hits += 1
+            return ast
+        except FileNotFoundError:
+            pass
+        except (OSError, EOFError, ValueError, TypeError):
+            self.errors += 1
+        self.misses += 1
+        ast = parse(source, self.parser)
+        tmp = None
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                marshal.dump(ast, f)
+            os.replace(tmp, file)
+        except (OSError, ValueError):
+            self.errors += 1
+            if tmp is not None:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp)
+        return ast
+
+    def clear(self) -> None:
+        """Elimina tutti gli AST salvati."""
+        if self.path:
+            for name in os.listdir(self.path):
+                if name.endswith(".ast"):
+                    with contextlib.suppress(OSError):
+                        os.unlink(os.path.join(self.path, name))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+
+_shared_parse_cache: Optional[ParseCache] = None
+
+def shared_parse_cache() -> ParseCache:
+    """
+    Cache di processo usata di default dagli Interpreter. Su disco solo se
+    richiesto: la cartella è $DSL_AST_CACHE; non impostata o vuota, la
+    cache è disattivata e ogni load_file parsa il sorgente.
+    """
+    global _shared_parse_cache
+    if _shared_parse_cache is None:
+        path = os.environ.get("DSL_AST_CACHE")
+        try:
+            _shared_parse_cache = ParseCache(path or None)
+        except OSError:
+            _shared_parse_cache = ParseCache(None)
+    return _shared_parse_cache
+
+
 # ── Eccezione pubblica ────────────────────────────────────────────────────────
 
 class DSLRuntimeError(Exception):
@@ -326,6 +446,40 @@ class LazyCall:
     def __repr__(self): return f"@{self.name}(...)"
 
 
+class _Scope(ChainMap):
+    """
+    Env di visita: i risultati parziali di dict e pipe sono livelli davanti
+    all'env esterno, invece di copiarlo (``env | result``) a ogni voce.
+    Aggiungere un livello costa O(profondità), una lookup pure: un dict di
+    n voci si valuta in O(n) anche con env grandi (DSL_FUNCTIONS, manager).
+
+    I livelli vengono aggiornati mentre la visita procede: chi conserva
+    l'env oltre la voce corrente (LazyCall) usa ``capture``, che fotografa i
+    livelli come faceva la copia.
+    """
+
+    @classmethod
+    def over(cls, layer: Dict, env) -> "_Scope":
+        """Scope con layer davanti a env; gli scope annidati restano piatti."""
+        if type(env) is cls:
+            return cls(layer, *env.maps)
+        return cls(layer, env)
+
+    def get(self, key, default=None):
+        for m in self.maps:
+            if key in m:
+                return m[key]
+        return default
+
+    @staticmethod
+    def capture(env):
+        """Env come appare ora, immune alle voci aggiunte dopo."""
+        if type(env) is not _Scope:
+            return env
+        *layers, base = env.maps
+        return _Scope(*(dict(m) for m in layers), base.copy() if hasattr(base, "copy") else dict(base))
+
+
 # ── SessionHandle ─────────────────────────────────────────────────────────────
 # Oggetto restituito da Interpreter.open_session(); nasconde il sid e
 # offre un'interfaccia contestuale per run/emit/update_state/close.
@@ -349,18 +503,22 @@ class SessionHandle:
 
     # ── metodi pubblici ───────────────────────────────────────────────────────
 
-    async def run(self, file: str, env: Optional[Dict] = None) -> Dict[str, Any]:
+    async def run(self, file: str, env: Optional[Dict] = None,
+                  timeout: Optional[float] = None) -> Dict[str, Any]:
         """
         Esegue un file caricato sulla sessione e restituisce i risultati.
 
-        :param file: nome del file (deve essere già caricato con `load_file`)
-        :param env:  variabili aggiuntive per questa esecuzione (opzionale)
-        :returns:    dict ``{node_name: result}``
+        :param file:    nome del file (deve essere già caricato con `load_file`)
+        :param env:     variabili aggiuntive per questa esecuzione (opzionale)
+        :param timeout: deadline in secondi dell'intera esecuzione, propagata
+                        a tutti i nodi innescati (opzionale)
+        :returns:       dict ``{node_name: result}``
+        :raises asyncio.TimeoutError: se la deadline scade
         """
-        return await self._interp._run_session(self._sid, file, env or {})
+        return await self._interp._run_session(self._sid, file, env or {}, timeout)
 
     def update(self, path: str, value: Any) -> None:
-        """Aggiorna una variabile nel contesto senza triggerare nodi."""
+        """Aggiorna una variabile nel contesto senza triggerare nodi (con un runner incremental ricalcola chi la legge)."""
         self._interp._runner.update_state(self._sid, path, value)
         #def update(self, file: str, path: str, value: Any) -> None:
         #self._interp._runner.update_state(self._sid, file, path, value)
@@ -378,7 +536,7 @@ class SessionHandle:
         Restituisce il contesto della sessione.
 
         Se viene specificato un file, restituisce solo il contesto relativo
-        a quel file.
+        a quel file. Con un ShardedInterpreter restituisce una coroutine.
         """
         if file is None:
             return self._interp._runner.context(self._sid)
@@ -398,6 +556,48 @@ class SessionHandle:
         await self.close()
 
 
+# ── Runtime ───────────────────────────────────────────────────────────────────
+
+class Runtime:
+    """
+    Motore DAG condiviso da più Interpreter dello stesso processo
+    (Defender, Orchestrator, tester): un'unica coda, un solo gruppo di
+    worker e di timer invece di uno per interprete.
+
+    Ogni Interpreter registra i propri file e le proprie sessioni nello
+    stesso DagRunner: nomi di file e id di sessione sono quindi comuni a
+    tutti gli interpreti del runtime. Il motore parte al primo start() di
+    un interprete e si ferma all'ultimo stop().
+    """
+
+    def __init__(self, **runner_options):
+        self.runner: flow.DagRunner = flow.DagRunner(**{"builtins": DSL_FUNCTIONS} | runner_options)
+        self._users = 0
+
+    async def acquire(self) -> None:
+        # il runner può essere già partito da solo (run_file) prima del primo acquire
+        if not self.runner.running:
+            await self.runner.start()
+        self._users += 1
+
+    async def release(self) -> None:
+        if self._users == 0:
+            return
+        self._users -= 1
+        if self._users == 0:
+            await self.runner.stop()
+
+
+_shared_runtime: Optional[Runtime] = None
+
+def shared_runtime() -> Runtime:
+    """Runtime di processo, creato al primo uso con le opzioni di default del DagRunner."""
+    global _shared_runtime
+    if _shared_runtime is None:
+        _shared_runtime = Runtime()
+    return _shared_runtime
+
+
 # ── Interpreter ───────────────────────────────────────────────────────────────
 
 class Interpreter:
@@ -417,25 +617,73 @@ class Interpreter:
     Per esecuzioni una-tantum::
 
         result = await interp.run_once("app", source_code, env={...})
+
+    Con ``runtime=shared_runtime()`` più interpreti condividono lo stesso
+    motore (vedi Runtime); senza, ogni interprete ha il proprio DagRunner.
+
+    Il parser LALR è quello di processo (shared_parser). La cache su disco
+    degli AST è opzionale: ``parse_cache=ParseCache(path)`` o $DSL_AST_CACHE
+    (default shared_parse_cache(), disattivata senza la variabile).
+
+    ``backend``: "compiled" (default) compila a load_file l'AST di ogni file
+    in closure (_Compiler); "interpreted" lo visita nodo per nodo con i
+    visit_*. Stessa semantica, errori compresi.
+
+    ``dict_concurrency``: con il default 1 le voci di un dict si valutano
+    sempre in ordine di scrittura. Con un valore > 1 (opt-in) le voci
+    indipendenti che contengono chiamate (es. più ``storekeeper.gather(...)``)
+    vengono valutate insieme, al più tante per dict (vedi _DictPlan): le
+    chiamate con effetti collaterali possono allora partire in un ordine
+    diverso. Nel DSL ``sequential { ... }`` mantiene l'ordine di un singolo
+    dict anche in questo caso.
     """
 
-    def __init__(self, custom_types: Optional[Dict] = None):
-        self._runner:       flow.DagRunner    = flow.DagRunner()
-        self._parser:       Lark              = create_parser()
+    BACKENDS = ("compiled", "interpreted")
+
+    def __init__(self, custom_types: Optional[Dict] = None, runtime: Optional[Runtime] = None,
+                 backend: str = "compiled", parse_cache: Optional[ParseCache] = None,
+                 dict_concurrency: int = 1, **runner_options):
+        if runtime is not None and runner_options:
+            raise ValueError("Le opzioni del DagRunner vanno passate al Runtime condiviso, non all'Interpreter.")
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Backend sconosciuto {backend!r}: attesi {', '.join(self.BACKENDS)}")
+        if dict_concurrency < 1:
+            raise ValueError("dict_concurrency deve essere >= 1")
+        # le funzioni del DSL sono il livello builtin condiviso del ctx di ogni sessione
+        self._runtime:      Runtime           = runtime or Runtime(**runner_options)
+        self._runner:       flow.DagRunner    = self._runtime.runner
+        self._started:      bool              = False
+        self._parse_cache:  ParseCache        = parse_cache or shared_parse_cache()
         self._ast_cache:    Dict[str, dict]   = {}
         self._file_tasks:   Dict[str, List]   = {}
         self.custom_types:  Dict[str, Any]    = custom_types or {}
+        self.backend:       str               = backend
+        self._codes:        Dict[int, tuple]  = {}   # id(nodo) -> (nodo, code, is_async), tutti i file
+        self._file_codes:   Dict[str, Dict]   = {}   # file -> le sue voci di _codes
+        self._constants:    Dict[str, _Constants] = {}   # file -> voci costanti della radice
+        self._plans:        Dict[int, _DictPlan]  = {}   # id(nodo dict) -> dipendenze tra le voci, tutti i file
+        self._file_plans:   Dict[str, List[int]]  = {}
+        self.dict_concurrency: int = dict_concurrency
+
+    @property
+    def runner(self) -> flow.DagRunner:
+        """Motore DAG delle sessioni (un ShardRouter in shard.ShardedInterpreter)."""
+        return self._runner
 
     # ── lifecycle ─────────────────────────────────────────────────────────────
 
     async def start(self) -> "Interpreter":
         """Avvia il motore DAG sottostante. Ritorna self per chaining."""
-        await self._runner.start()
+        if not self._started:
+            self._started = True
+            await self._runtime.acquire()
         return self
 
     async def stop(self) -> None:
-        """Ferma il motore e annulla tutti i task schedulati."""
-        await self._runner.stop()
+        """Ferma il motore e annulla tutti i task schedulati (con un Runtime condiviso, all'ultimo interprete)."""
+        if self._started:
+            self._started = False
+            await self._runtime.release()
 
     async def __aenter__(self) -> "Interpreter":
         return await self.start()
@@ -457,8 +705,10 @@ class Interpreter:
         :raises lark.UnexpectedInput: se il sorgente non è sintatticamente valido
         :raises ValueError:           se il DAG del file contiene cicli
         """
-        ast = parse(source, self._parser)
+        ast = self._parse_cache.parse(source)
         self._ast_cache[name] = ast
+        self._compile(name, ast)
+        self._constants[name] = _Constants(ast)
 
         # Build dei flow nodes isolato per questo file
         tasks: List[dict] = []
@@ -479,22 +729,96 @@ class Interpreter:
         :returns:      AST come dict
         :raises lark.UnexpectedInput: se il sorgente non è valido
         """
-        return parse(source, self._parser)
+        return self._parse_cache.parse(source)
 
     async def unload_file(self, name: str) -> None:
         """Rimuove un file dal motore. Le sessioni attive non vengono interrotte."""
         self._ast_cache.pop(name, None)
         self._file_tasks.pop(name, None)
+        self._constants.pop(name, None)
+        self._compile(name, None)
         await self._runner.delete_file(name)
 
+    def _compile(self, name: str, ast: Optional[dict]) -> None:
+        """Sostituisce piani dei dict e closure del file name con quelli di ast (None = rimuove)."""
+        for key in self._file_codes.pop(name, ()):
+            self._codes.pop(key, None)
+        for key in self._file_plans.pop(name, ()):
+            self._plans.pop(key, None)
+        if ast is None:
+            return
+        plans: Dict[int, _DictPlan] = {}
+        self._plan_dicts(ast, plans)
+        self._file_plans[name] = list(plans)
+        self._plans.update(plans)
+        if self.backend != "compiled":
+            return
+        codes: Dict[int, tuple] = {}
+        _Compiler(self, codes).compile(ast)
+        self._file_codes[name] = codes
+        self._codes.update(codes)
+
+    def _plan_dicts(self, node, plans: Dict[int, _DictPlan]) -> None:
+        if isinstance(node, dict):
+            if node.get("type") == "dict":
+                plans[id(node)] = _DictPlan(self, node)
+            for k, v in node.items():
+                if k != "meta":
+                    self._plan_dicts(v, plans)
+        elif isinstance(node, list):
+            for v in node:
+                self._plan_dicts(v, plans)
+
     # ── session management ────────────────────────────────────────────────────
 
     def session_create(self, sid: str, env: dict = {}) -> None:
         """Inizializza la struttura interna. Chiamato solo dal Defender."""
-        self._runner.create_session(sid, DSL_FUNCTIONS | env)
+        self._runner.create_session(sid, env)
 
     def session_exists(self, sid: str) -> bool:
-        return sid in self._runner.sessions 
+        return self._runner.has_session(sid)
+
+    async def run_many(self, sessions, file: str, env: Optional[Dict] = None,
+                       timeout: Optional[float] = None):
+        """
+        Esegue un file caricato su molte sessioni in un solo passaggio
+        (broadcast); vedi ``DagRunner.run_many``.
+
+        :param sessions: sid o ``SessionHandle``
+        :param env:      variabili aggiuntive comuni a tutte le sessioni
+        :param timeout:  deadline in secondi dell'intero batch
+        :returns:        generatore asincrono di ``(sid, risultati)`` nell'ordine
+                         di sessions; per le sessioni non trovate o oltre la
+                         deadline il secondo elemento è l'eccezione
+        """
+        if file not in self._ast_cache:
+            raise DSLRuntimeError(f"File '{file}' non caricato. Usa load_file() prima.")
+
+        t0, env, ast = time.monotonic(), env or {}, self._ast_cache[file]
+        sids, statics = [], {}
+        for s in sessions:
+            sid = s._sid if isinstance(s, SessionHandle) else s
+            sids.append(sid)
+            statics[sid] = await self._visit_file(file, self._runner.context(sid) | env)
+
+        if timeout is not None:
+            timeout = timeout - (time.monotonic() - t0)
+        async for sid, dag_results in self._runner.run_many(sids, file, updates=statics, timeout=timeout):
+            if isinstance(dag_results, Exception):
+                yield sid, dag_results
+            else:
+                yield sid, statics[sid] | {k: flow.output(v) for k, v in dag_results.items()}
+
+    def checkpoint(self, path: Optional[str] = None) -> int:
+        """Salva lo stato di tutte le sessioni in uno snapshot su file."""
+        return self._runner.checkpoint(path)
+
+    def restore(self, path: Optional[str] = None, env: dict = {}) -> int:
+        """
+        Registra le sessioni di uno snapshot: ognuna viene caricata solo
+        quando l'utente torna. env come in session_create.
+        """
+        return self._runner.restore(path, env)
 
     # ── direct function call ──────────────────────────────────────────────────
 
@@ -524,31 +848,141 @@ class Interpreter:
     # Tutto ciò che segue è API privata (prefisso _).
     # Non fare affidamento su questi metodi dall'esterno.
     
-    async def _run_session(self, sid: str, file: str, env: Dict) -> Dict[str, Any]:
+    async def _run_session(self, sid: str, file: str, env: Dict,
+                           timeout: Optional[float] = None) -> Dict[str, Any]:
         if file not in self._ast_cache:
             raise DSLRuntimeError(f"File '{file}' non caricato. Usa load_file() prima.")
 
+        t0  = time.monotonic()
         ctx = self._runner.context(sid) | env
-        ast_result, _ = await self.visit(self._ast_cache[file], ctx, path="")
+        ast_result = await self._visit_file(file, ctx)
         
-        # Esegui il motore per i nodi reattivi/task
-        dag_results = await self._runner.run_file(sid, file, ast_result)
+        # Esegui il motore per i nodi reattivi/task; la deadline comprende la visita dell'AST
+        if timeout is not None:
+            timeout = timeout - (time.monotonic() - t0)
+        dag_results = await self._runner.run_file(sid, file, ast_result, timeout=timeout)
         
         # Unisci i risultati statici dell'AST (es. 'a': 1) con quelli del DAG
         # Estraiamo i valori reali dai Result del DAG se presenti
-        unwrapped_dag = {k: v["outputs"] if isinstance(v, dict) and "outputs" in v else v 
-                         for k, v in dag_results.items()}
+        unwrapped_dag = {k: flow.output(v) for k, v in dag_results.items()}
         
         return ast_result | unwrapped_dag
 
+    async def _visit_file(self, file: str, env: Dict) -> Dict[str, Any]:
+        """
+        visit della radice del file, riusando i valori delle voci costanti
+        (_Constants): stesso risultato, stessi side effect su custom_types e
+        stesse trace d'errore di ``visit(ast, env)``.
+        """
+        root, consts = self._ast_cache[file], self._constants.get(file)
+        if consts is None or not consts.tipos:
+            return (await self.visit(root, env, path=""))[0]
+
+        stack = _visit_stack.get()
+        token = _visit_stack.set(stack := []) if stack is None else None
+        stack.append(root)
+        try:
+            plan = self._plans.get(id(root))
+            if plan is not None and plan.parallel and self.dict_concurrency > 1:
+                return await self._visit_file_parallel(consts, plan, env, stack)
+            # result: valori del run; cached: valori in cache delle voci
+            # costanti, su cui si valutano le costanti da (ri)calcolare.
+            # stale: una costante è stata ricalcolata, quelle dopo potrebbero
+            # leggerla. live: schema non deterministico, si prosegue come visit_dict.
+            result, cached, memo = {}, {}, {}
+            scope, cached_scope  = _Scope.over(result, env), _Scope.over(cached, env)
+            stale = live = False
+            for i, item in enumerate(consts.items):
+                if live or i not in consts.tipos:
+                    key, val = (await self.visit(item, scope, path=""))[0]
+                    _put(result, key, val)
+                    continue
+                hit = consts.values.get(i)
+                if stale or hit is None or not consts.valid(i, self.custom_types):
+                    snap = consts.snapshot(i, self.custom_types)
+                    if snap is None:
+                        live = True
+                        key, val = (await self.visit(item, scope, path=""))[0]
+                        _put(result, key, val)
+                        continue
+                    hit = (await self.visit(item, cached_scope, path=""))[0]
+                    consts.values[i], consts.schemas[i], stale = hit, snap, True
+                key, val = hit
+                _put(cached, key, val)
+                val = consts.fresh(val, memo)
+                if i in consts.types:
+                    self.custom_types[key] = val
+                _put(result, key, val)
+            return result
+        except DSLRuntimeError as e:
+            _trace(e, stack)
+            raise
+        finally:
+            stack.pop()
+            if token is not None:
+                _visit_stack.reset(token)
+
+    async def _visit_file_parallel(self, consts: _Constants, plan: _DictPlan,
+                                   env: Dict, stack: List[dict]) -> Dict[str, Any]:
+        """
+        _visit_file con le voci schedulate come _visit_parallel: stale e live
+        seguono le dipendenze della voce invece dell'ordine del sorgente.
+        """
+        # out: valori del run; orig: valori su cui si (ri)calcolano le
+        # costanti; fresh: costante ricalcolata in questo run; live:
+        # costante valutata sul ctx, chi la legge non può andare in cache.
+        out, orig = [None] * plan.size, [None] * plan.size
+        fresh, live = [False] * plan.size, [False] * plan.size
+        memo = {}
+
+        def scope(values, i):
+            layer = {}
+            for d in plan.deps[i]:
+                _put(layer, *values[d])
+            return _Scope.over(layer, env)
+
+        async def run(i, own):
+            item, deps, hit = consts.items[i], plan.deps[i], None
+            if i in consts.tipos and not any(live[d] for d in deps):
+                hit = consts.values.get(i)
+                if hit is None or any(fresh[d] for d in deps) or not consts.valid(i, self.custom_types):
+                    snap = consts.snapshot(i, self.custom_types)
+                    if snap is None:
+                        hit = None
+                    else:
+                        hit = (await self.visit(item, scope(orig, i), path=""))[0]
+                        consts.values[i], consts.schemas[i], fresh[i] = hit, snap, True
+            if hit is None:
+                live[i] = i in consts.tipos
+                out[i] = orig[i] = (await self.visit(item, scope(out, i), path=""))[0]
+                return
+            orig[i] = hit
+            key, val = hit
+            val = consts.fresh(val, memo)
+            if i in consts.types:
+                self.custom_types[key] = val
+            out[i] = (key, val)
+
+        await _schedule(plan, run, self.dict_concurrency, stack)
+        result = {}
+        for kv in out:
+            _put(result, *kv)
+        return result
+
     async def _invoke(self, fn: Any, args: tuple, kwargs: Dict, path: str = "") -> Dict:
         """Esegue fn e restituisce sempre un dict Result."""
+        if isinstance(fn, flow.Limited):
+            # flow.limited() in DSL_FUNCTIONS: posti condivisi da tutte le sessioni del runner
+            gate = self._runner.limiter(fn.name, fn.limit)
+            return await gate.run(self._invoke(fn.fn, args, kwargs, path))
         if isinstance(fn, LazyCall):
             merged = ChainMap(kwargs, fn.env)
             res, _ = await self.visit_call(fn.call_node, merged, path=path)
             return flow.success(res)
         if callable(fn):
-            s = flow.step(fn, *args, **kwargs)
+            mode = _node_executor.get()
+            s = flow.step(fn, *args, **kwargs) if mode == "loop" else \
+                flow.step(flow.offload, mode, fn, *args, **kwargs)
         elif isinstance(fn, tuple) and len(fn) in (3, 4):
             s = flow.step(self._call_dsl_fn, fn, args, kwargs, path)
         else:
@@ -558,6 +992,19 @@ class Interpreter:
     # ── visita generica ───────────────────────────────────────────────────────
 
     async def visit(self, node, env, path=""):
+        compiled = self._codes.get(id(node)) if self._codes else None
+        if compiled is not None:
+            # backend compiled: la closure gestisce da sé frame e trace
+            _, code, is_async = compiled
+            stack = _visit_stack.get()
+            token = _visit_stack.set(stack := []) if stack is None else None
+            try:
+                val = code(env, path, stack)
+                return (await val if is_async else val), env
+            finally:
+                if token is not None:
+                    _visit_stack.reset(token)
+
         t = node.get("type")
         method = getattr(self, f"visit_{t}", None)
         if not method:
@@ -577,10 +1024,8 @@ class Interpreter:
         try:
             return await method(node, env, path)
         except DSLRuntimeError as e:
-            trace = " -> ".join(
-                f"{n['type']}({n.get('meta',{}).get('line','?')}:{n.get('meta',{}).get('column','?')})"
-                for n in stack)
-            e.args = (f"{e.args[0]} | Stack: {trace}",); raise
+            _trace(e, stack)
+            raise
         finally:
             stack.pop()
             if token is not None:
@@ -668,7 +1113,9 @@ class Interpreter:
     async def visit_bool(self, n, e, path=""):        return n["value"], e
     async def visit_any(self, n, e, path=""):         return None, e
     async def visit_identifier(self, n, e, path=""):  return n["name"], e
-    async def visit_var(self, n, e, path=""):         return flow.output(scheme.get(e, n["name"], n["name"])), e
+    async def visit_var(self, n, e, path=""):
+        flow.record_read(n["name"])
+        return flow.output(scheme.get(e, n["name"], n["name"])), e
     async def visit_context_var(self, n, e, path=""): return ContextVar(n["name"]), e
 
     async def visit_function_def(self, n, e, path=""):
@@ -732,31 +1179,58 @@ class Interpreter:
 
     async def visit_dict(self, node, env, path=""):
         # Valutazione sequenziale: ogni item vede i valori definiti prima di lui
-        # tramite `env | result`. L'ordine di dichiarazione è l'ordine di
+        # tramite lo scope `result` davanti a env. L'ordine di dichiarazione è l'ordine di
         # valutazione — comportamento intenzionale del framework, coerente con
         # il fatto che le dipendenze tra dichiarazioni `:=` sono già risolte
         # dall'ordine di scrittura nel sorgente DSL.
         # Le dipendenze tra *task* `->` sono invece gestite dal DagRunner.
+        # Eccezione: voci indipendenti con chiamate, in parallelo (_DictPlan).
+        plan = self._plans.get(id(node))
+        if plan is not None and plan.parallel and self.dict_concurrency > 1:
+            items = node["items"]
+            async def evaluate(i, scope, own):
+                return (await self.visit(items[i], scope, path=path))[0]
+            return await self._visit_parallel(plan, env, evaluate, _visit_stack.get()), env
         result = {}
+        scope  = _Scope.over(result, env)
         for it in node["items"]:
-            (key, val), _ = await self.visit(it, env | result, path=path)
+            (key, val), _ = await self.visit(it, scope, path=path)
             if isinstance(key, tuple):
                 result.update(dict(zip(key, val)))
             else:
                 result[key] = val
         return result, env
 
+    async def _visit_parallel(self, plan: _DictPlan, env, evaluate, stack: List[dict]) -> Dict:
+        """
+        Voci di un dict parallel valutate con _schedule: ognuna vede, davanti
+        a env, i risultati delle sole voci da cui dipende (le uniche che può
+        leggere), così l'esito non dipende dall'ordine di completamento.
+        evaluate(i, scope, stack) -> awaitable (chiave, valore).
+        """
+        out = [None] * plan.size
+        async def run(i, own):
+            layer = {}
+            for d in plan.deps[i]:
+                _put(layer, *out[d])
+            out[i] = await evaluate(i, _Scope.over(layer, env), own)
+        await _schedule(plan, run, self.dict_concurrency, stack)
+        result = {}
+        for kv in out:
+            _put(result, *kv)
+        return result
+
     async def visit_pipe(self, node, env, path=""):
         steps = node["steps"]
         val, env = await self.visit(steps[0], env, path)
         pipe_vars = {"_": val}
+        local_env = _Scope.over(pipe_vars, env)
         for i, step in enumerate(steps[1:]):
             name = i
             if step.get("type") == "pair":
                 name = step["key"].get("name", i)
                 step = step["value"]
             pipe_vars["_"] = val
-            local_env = env | pipe_vars
             val, _ = await self.visit_call(step, local_env, path, args=[val])
             pipe_vars[name] = val
         return val, env
@@ -791,7 +1265,7 @@ class Interpreter:
     async def visit_call(self, node, env, path="", args=(), kwargs={}):
         name, meta = node.get("name"), node.get("meta")
         if node.get("lazy"):
-            return LazyCall(self, name, node, env), env
+            return LazyCall(self, name, node, _Scope.capture(env)), env
         call_path  = f"{path}.{name}" if path else str(name)
         ast_args   = [(await self.visit(a, env, path=f"{call_path}[{i}]"))[0] for i, a in enumerate(node.get("args", []))]
         ast_kwargs = {k: (await self.visit(v, env, path=f"{call_path}.{k}"))[0] for k, v in node.get("kwargs", {}).items()}
@@ -830,6 +1304,10 @@ class Interpreter:
             if ddd.get("errors"):
                 raise DSLRuntimeError(f"Tipo errato '{path}': atteso {expected}, ottenuto {type(value).__name__}", meta)
             return ddd.get("data")
+        return self._check_type(value, expected, meta, name, path)
+
+    def _check_type(self, value, expected, meta, name, path=""):
+        """Controllo sui tipi built-in (TYPE_MAP) di _check, sincrono."""
         py = TYPE_MAP.get(expected)
         if py and not (isinstance(value, py) and not (py is int and isinstance(value, bool))):
             display_name = path if path else name
@@ -849,23 +1327,25 @@ class Interpreter:
             kw       = dict(task.get("kwargs", {}))
 
             raw_deps = self._find_vars(action) | self._find_vars(kw)
-            deps = {
-                resolved
-                for d in raw_deps
-                for resolved in [self._resolve_scope(t_path, d, available)]
-                if resolved in available and resolved != t_path
-            }
-
-            kw["deps"] = [] if kw.get("deps") is False else list(deps) + kw.get("deps", [])
-            flow_nodes.append(
-                flow.node(name=t_path, fn=self._make_task_fn(action, t_path), path=t_path, **kw)
-            )
+            resolved = {d: self._resolve_scope(t_path, d, available) for d in raw_deps}
+            deps = {r for r in resolved.values() if r in available and r != t_path}
+
+            isolated = kw.get("deps") is False
+            kw["deps"] = [] if isolated else list(deps) + kw.get("deps", [])
+            # Variabili di ctx lette dal task che non sono altri task (chiave memo)
+            kw["reads"] = sorted(d for d, r in resolved.items() if r not in available)
+            # Path di ctx che, se cambiano, rendono obsoleto il task;
+            # None = mai ricalcolato per cambi di ctx (deps: false, es. handler di eventi)
+            kw["watch"] = None if isolated else sorted(resolved.values())
+            fn = self._make_task_fn(action, t_path, kw.get("executor") or "loop")
+            flow_nodes.append(flow.node(name=t_path, fn=fn, path=t_path, **kw))
 
         return flow_nodes
 
-    def _make_task_fn(self, ast: dict, t_path: str):
+    def _make_task_fn(self, ast: dict, t_path: str, executor: str = "loop"):
         """Factory per la funzione di nodo; evita la closure-in-loop."""
         async def task_fn(env_dict):
+            token = _node_executor.set(executor)
             try:
                 t = ast.get("type")
                 if t == "pipe":
@@ -886,6 +1366,8 @@ class Interpreter:
                 return val
             except Exception as e:
                 return flow.error(str(e))
+            finally:
+                _node_executor.reset(token)
         return task_fn
 
 
@@ -942,4 +1424,738 @@ class _FlowNodeBuilder:
 
         for k, v in node.items():
             if k not in ("meta", "type"):
-                await self._collect(v, path, env)
\ No newline at end of file
+                await self._collect(v, path, env)
+
+# ── Valutazione concorrente dei dict (privato) ────────────────────────────────
+
+def _binds(item) -> Optional[List[str]]:
+    """Nomi definiti da una voce di dict; None se la chiave è calcolata."""
+    t = item.get("type")
+    if t == "declaration":
+        return [name for _, name in item.get("targets", [])]
+    if t == "task":
+        return [item["trigger"]["name"]]
+    if t == "pair":
+        key = item["key"]
+        if key["type"] in ("var", "identifier"):
+            return [key["name"]]
+        if key["type"] == "string":
+            return [key["value"]]
+        if key["type"] in ("number", "bool", "any"):
+            return []   # chiave non raggiungibile da una variabile
+    return None
+
+
+def _walk(node, found: set, calls: bool) -> bool:
+    """
+    Raccoglie in found i nomi delle chiamate del sotto-albero valutato
+    (corpi di function_def e action dei task esclusi); con calls=False si
+    ferma alla prima. Vero se c'è almeno una chiamata (o pipe).
+    """
+    if isinstance(node, dict):
+        t = node.get("type")
+        if t == "function_def":
+            return False
+        hit = False
+        if t in ("call", "pipe"):
+            if t == "call":
+                found.add(str(node.get("name")))
+            if not calls:
+                return True
+            hit = True
+        for key, child in node.items():
+            if key == "meta" or (t == "task" and key == "action"):
+                continue
+            if _walk(child, found, calls):
+                hit = True
+                if not calls:
+                    return True
+        return hit
+    if isinstance(node, (list, tuple)):
+        hit = False
+        for child in node:
+            if _walk(child, found, calls):
+                hit = True
+                if not calls:
+                    return True
+        return hit
+    return False
+
+
+def _declares_type(node) -> bool:
+    """Vero se il sotto-albero contiene una dichiarazione `type:` (modifica custom_types)."""
+    if isinstance(node, dict):
+        if node.get("type") == "function_def":
+            return False
+        if node.get("type") == "declaration" and any(t == "type" for t, _ in node.get("targets", [])):
+            return True
+        return any(_declares_type(v) for k, v in node.items() if k != "meta")
+    if isinstance(node, (list, tuple)):
+        return any(_declares_type(v) for v in node)
+    return False
+
+
+class _DictPlan:
+    """
+    Dipendenze tra le voci di un dict, calcolate una volta per nodo.
+
+    La voce j dipende dalle voci precedenti che definiscono un nome che
+    legge (variabili da Interpreter._find_vars e nomi delle chiamate, per
+    segmento radice), da quelle con chiave calcolata e dalle dichiarazioni
+    `type:`, che fanno da barriera in entrambe le direzioni. Un dict è
+    ``parallel`` se ha almeno due voci con chiamate non ordinate dalle
+    dipendenze e non è ``sequential { ... }``.
+    """
+
+    def __init__(self, interp: "Interpreter", node: dict):
+        items        = node["items"]
+        self.size    = len(items)
+        self.deps:  List[tuple] = []
+        self.waits: List[bool]  = [_walk(it, set(), False) for it in items]
+        binders: Dict[str, List[int]] = {}
+        barriers: List[int] = []
+        ancestors: List[int] = []   # bitmask delle dipendenze transitive
+        for j, item in enumerate(items):
+            fence = _declares_type(item)
+            if fence:
+                deps = set(range(j))
+            else:
+                names = set()
+                _walk(item, names, True)
+                deps = set(barriers)
+                for name in names | interp._find_vars(item):
+                    deps.update(binders.get(name.partition(".")[0].partition("[")[0], ()))
+            self.deps.append(tuple(sorted(deps)))
+            mask = 0
+            for d in deps:
+                mask |= ancestors[d] | (1 << d)
+            ancestors.append(mask)
+            names = _binds(item)
+            if fence or names is None:
+                barriers.append(j)
+            for name in names or ():
+                binders.setdefault(name, []).append(j)
+
+        calls = [j for j in range(self.size) if self.waits[j]]
+        self.parallel = not node.get("sequential") and any(
+            not (ancestors[j] >> i) & 1 for n, j in enumerate(calls) for i in calls[:n])
+
+
+async def _schedule(plan: _DictPlan, run, limit: int, stack: List[dict]) -> None:
+    """
+    Esegue ``await run(i, stack)`` per ogni voce di plan: in ordine se il
+    dict non è parallel o limit <= 1. Altrimenti le voci con
+    chiamate girano come task concorrenti (al più limit insieme) appena le
+    loro dipendenze sono pronte, ognuna con la propria copia dello stack di
+    visita; le altre inline, nell'ordine del sorgente. Se più voci
+    falliscono solleva l'errore della prima nel sorgente, come la visita
+    sequenziale; dopo un errore inline non avvia altre voci.
+    """
+    if limit <= 1 or not plan.parallel:
+        for i in range(plan.size):
+            await run(i, stack)
+        return
+
+    loop  = asyncio.get_running_loop()
+    futs  = [loop.create_future() for _ in range(plan.size)]
+    gate  = asyncio.Semaphore(limit)
+    tasks = []
+
+    async def task(i, own):
+        _visit_stack.set(own)
+        try:
+            for d in plan.deps[i]:
+                await futs[d]
+            async with gate:
+                await run(i, own)
+        except asyncio.CancelledError:
+            futs[i].cancel()
+            raise
+        except Exception as e:
+            futs[i].set_exception(e)
+        else:
+            futs[i].set_result(None)
+
+    def ready(i):
+        return all(futs[d].done() and not futs[d].cancelled() and futs[d].exception() is None
+                   for d in plan.deps[i])
+
+    try:
+        for i in range(plan.size):
+            if plan.waits[i] or not ready(i):
+                tasks.append(asyncio.ensure_future(task(i, list(stack))))
+                continue
+            try:
+                await run(i, stack)
+            except Exception as e:
+                futs[i].set_exception(e)
+                break
+            futs[i].set_result(None)
+        if tasks:
+            await asyncio.wait(tasks)
+    except asyncio.CancelledError:
+        for t in tasks:
+            t.cancel()
+        raise
+
+    errors = [f.exception() for f in futs if f.done() and not f.cancelled()]
+    for e in errors:
+        if e is not None:
+            raise e
+    if any(f.cancelled() for f in futs):
+        raise asyncio.CancelledError()
+
+
+# ── Voci costanti dei file (privato) ──────────────────────────────────────────
+
+# Nodi che valutano sempre allo stesso valore (function_def e task non
+# eseguono il corpo/l'action quando sono visitati)
+_CONSTANT_LEAVES = frozenset(("number", "string", "bool", "any", "identifier", "context_var", "function_def"))
+# Default che scheme.normalize calcola a ogni chiamata
+_IMPURE_DEFAULTS = ("time.now.utc()", "uuid.uuid4()")
+
+
+class _Constants:
+    """
+    Voci del dict radice di un file che non dipendono dal ctx: valutate al
+    primo run dopo load_file e poi riusate da tutte le sessioni, invece di
+    rivisitarle (e rivalidarne i tipi) a ogni run.
+
+    Una voce è costante se nel suo sotto-albero ci sono solo letterali,
+    collezioni, operatori, function_def, task con kwargs costanti,
+    dichiarazioni (``type:`` solo in radice) e variabili che risolvono su
+    voci costanti già definite nello stesso scope. Chiamate e pipe (anche
+    @lazy, che cattura l'env) la rendono dipendente dal ctx.
+
+    Il valore di una dichiarazione dipende anche dagli schemi in
+    custom_types: ogni voce in cache ricorda quelli con cui è stata
+    validata e viene ricalcolata (con le costanti che la seguono) quando
+    cambiano. Uno schema non deterministico per scheme.normalize (default
+    uuid/ora, function, convert) fa proseguire il run come visit_dict.
+
+    I valori in cache non escono mai: ogni run riceve una copia dei
+    contenitori mutabili (fresh), con gli alias tra voci preservati.
+    """
+
+    def __init__(self, root: dict):
+        self.root   = root
+        self.items  = root.get("items", []) if root.get("type") == "dict" else []
+        self.tipos: Dict[int, frozenset] = {}   # indice voce costante -> tipi dichiarati nella voce
+        self.types: Dict[int, str]       = {}   # indice voce -> nome di `type:nome := ...`
+        self.values: Dict[int, tuple]    = {}   # indice voce -> (chiave, valore) valutati
+        self.schemas: Dict[int, Dict]    = {}   # indice voce -> custom_types usati per values
+        self.nodes: set                  = set()   # id dei dict/list dell'AST: mai copiati
+        self._ast_ids(root)
+
+        bound: set = set()
+        for i, item in enumerate(self.items):
+            tipos: set = set()
+            if self._static(item, bound, tipos, top=True):
+                self.tipos[i] = frozenset(tipos)
+                if item["type"] == "declaration" and item["targets"][0][0] == "type":
+                    self.types[i] = item["targets"][0][1]
+            names = _binds(item)
+            if names is None:
+                bound.clear()   # chiave calcolata: può ridefinire qualsiasi nome
+            elif i in self.tipos:
+                bound.update(names)
+            else:
+                bound.difference_update(names)
+
+    def _ast_ids(self, node) -> None:
+        if isinstance(node, dict):
+            self.nodes.add(id(node))
+            for k, v in node.items():
+                if k != "meta":
+                    self._ast_ids(v)
+        elif isinstance(node, list):
+            self.nodes.add(id(node))
+            for v in node:
+                self._ast_ids(v)
+
+    def _static(self, node, bound: set, tipos: set, top: bool = False) -> bool:
+        if not isinstance(node, dict):
+            return False
+        t = node.get("type")
+        if t in _CONSTANT_LEAVES:
+            return True
+        if t == "var":
+            root = node["name"].partition(".")[0].partition("[")[0]
+            return root in bound
+        if t in ("tuple", "sequence", "list"):
+            return all(self._static(it, bound, tipos) for it in node["items"])
+        if t == "binop":
+            return self._static(node["left"], bound, tipos) and self._static(node["right"], bound, tipos)
+        if t == "not":
+            return self._static(node["value"], bound, tipos)
+        if t == "pair":
+            key = node["key"]
+            return (key["type"] == "var" or self._static(key, bound, tipos)) and \
+                self._static(node["value"], bound, tipos)
+        if t == "task":
+            return all(self._static(v, bound, tipos) for v in node["trigger"].get("kwargs", {}).values())
+        if t == "declaration":
+            targets = node.get("targets", [])
+            for tipo, _ in targets:
+                if tipo != "type":
+                    tipos.add(tipo)
+                elif not (top and len(targets) == 1):
+                    return False   # solo `type:` in radice viene rieseguito dalla cache
+            return self._static(node["value"], bound, tipos)
+        if t == "dict":
+            inner = set(bound)
+            for it in node["items"]:
+                if not self._static(it, inner, tipos):
+                    return False
+                inner.update(_binds(it) or ())
+            return True
+        return False   # call, pipe, nodi sconosciuti
+
+    def valid(self, i: int, custom_types: Dict) -> bool:
+        """Vero se il valore in cache della voce i è stato validato con gli schemi attuali."""
+        schemas = self.schemas.get(i)
+        return schemas is not None and all(custom_types.get(t) == s for t, s in schemas.items())
+
+    def snapshot(self, i: int, custom_types: Dict) -> Optional[Dict]:
+        """Copia degli schemi usati dalla voce i; None se uno non è deterministico."""
+        snap = {}
+        for tipo in self.tipos[i]:
+            schema = custom_types.get(tipo)
+            if isinstance(schema, dict) and any(
+                    isinstance(rules, dict) and ("function" in rules or "convert" in rules
+                                                 or rules.get("default") in _IMPURE_DEFAULTS)
+                    for rules in schema.values()):
+                return None
+            snap[tipo] = self.fresh(schema, {})
+        return snap
+
+    def fresh(self, value, memo: Dict[int, Any]):
+        """
+        Copia di un valore in cache: nuovi dict/list/set/tuple, stessi
+        oggetti immutabili e stessi nodi AST (come li restituirebbe visit).
+        memo (id -> copia) preserva gli alias tra le voci dello stesso run.
+        """
+        t = type(value)
+        if t is not dict and t is not list and t is not tuple and t is not set:
+            return value
+        key = id(value)
+        if key in self.nodes:
+            return value
+        hit = memo.get(key)
+        if hit is not None:
+            return hit
+        if t is dict:
+            out = memo[key] = {}
+            for k, v in value.items():
+                out[k] = self.fresh(v, memo)
+        elif t is list:
+            out = memo[key] = []
+            out.extend(self.fresh(v, memo) for v in value)
+        elif t is tuple:
+            out = memo[key] = tuple(self.fresh(v, memo) for v in value)
+        else:
+            out = memo[key] = set(value)
+        return out
+
+
+# ── Compilatore (privato, backend "compiled") ─────────────────────────────────
+
+# Nodi senza frame sullo stack di visita: non sollevano DSLRuntimeError
+_LEAVES = frozenset(("number", "string", "bool", "any", "identifier", "var", "context_var", "function_def"))
+# Nodi che ignorano il path (ai figli di questo tipo non serve calcolarlo)
+_PATHLESS = _LEAVES - {"function_def"}
+
+
+def _put(result: Dict, key, val) -> None:
+    """Aggiunge a result la coppia di una voce di dict (chiavi multiple per le dichiarazioni a tuple)."""
+    if isinstance(key, tuple):
+        result.update(dict(zip(key, val)))
+    else:
+        result[key] = val
+
+
+def _trace(e: DSLRuntimeError, stack: List[dict]) -> None:
+    """Aggiunge al messaggio di e i nodi in visita, dalla radice al corrente."""
+    trace = " -> ".join(
+        f"{n['type']}({n.get('meta',{}).get('line','?')}:{n.get('meta',{}).get('column','?')})"
+        for n in stack)
+    e.args = (f"{e.args[0]} | Stack: {trace}",)
+
+
+class _Compiler:
+    """
+    Trasforma l'AST di un file in closure Python annidate, una volta sola a
+    load_file: a runtime non ci sono più getattr(visit_*), push sul
+    contextvar e un await per ogni nodo.
+
+    Ogni closure ha firma ``code(env, path, stack)`` e restituisce il valore
+    che il visit_* corrispondente restituirebbe (l'env non cambia mai durante
+    la visita). ``stack`` è la lista di _visit_stack della coroutine: i nodi
+    composti la aggiornano come Interpreter.visit, così errori e trace sono
+    identici a quelli del backend interpretato.
+
+    Le espressioni pure (letterali, variabili, operatori, collezioni,
+    chiamate @lazy) sono closure sincrone; chiamate, pipe, dichiarazioni
+    tipizzate e i nodi che le contengono restano coroutine.
+
+    ``codes`` raccoglie id(nodo) -> (nodo, code, is_async) per tutti i nodi
+    su cui l'Interpreter può chiamare visit (radice, action e kwargs dei task,
+    corpi delle funzioni, argomenti): Interpreter.visit li esegue da lì.
+    """
+
+    def __init__(self, interpreter: "Interpreter", codes: Dict[int, tuple]):
+        self._interp = interpreter
+        self.codes   = codes
+
+    def compile(self, node) -> tuple:
+        """(code, is_async) equivalente a ``visit(node)``, frame compreso."""
+        if not isinstance(node, dict):
+            # AST non valido: stesso errore del backend interpretato, a runtime
+            visit = self._interp.visit
+            async def code(env, path, stack):
+                return (await visit(node, env, path))[0]
+            return code, True
+        hit = self.codes.get(id(node))
+        if hit is not None:
+            return hit[1], hit[2]
+
+        t     = node.get("type")
+        build = getattr(self, f"_c_{t}", None)
+        if build is None:
+            meta = node.get("meta")
+            def code(env, path, stack):
+                raise DSLRuntimeError(f"Tipo AST sconosciuto: '{t}'", meta)
+            is_async = False
+        else:
+            try:
+                code, is_async = build(node)
+            except (KeyError, TypeError, AttributeError):
+                # nodo malformato: lo lascia al visit_* e ai suoi errori a runtime
+                method = getattr(self._interp, f"visit_{t}")
+                async def code(env, path, stack):
+                    return (await method(node, env, path))[0]
+                is_async = True
+            if t not in _LEAVES:
+                code = self._framed(node, code, is_async)
+        self.codes[id(node)] = (node, code, is_async)
+        return code, is_async
+
+    def _child(self, node) -> tuple:
+        """(code, is_async, usa_path) di un figlio visitato con visit."""
+        code, is_async = self.compile(node)
+        return code, is_async, not (isinstance(node, dict) and node.get("type") in _PATHLESS)
+
+    @staticmethod
+    def _framed(node, fn, is_async):
+        if is_async:
+            async def code(env, path, stack):
+                stack.append(node)
+                try:
+                    return await fn(env, path, stack)
+                except DSLRuntimeError as e:
+                    _trace(e, stack)
+                    raise
+                finally:
+                    stack.pop()
+        else:
+            def code(env, path, stack):
+                stack.append(node)
+                try:
+                    return fn(env, path, stack)
+                except DSLRuntimeError as e:
+                    _trace(e, stack)
+                    raise
+                finally:
+                    stack.pop()
+        return code
+
+    # ── primitivi ─────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _const(value):
+        return (lambda env, path, stack: value), False
+
+    def _c_number(self, n):     return self._const(n["value"])
+    def _c_string(self, n):     return self._const(n["value"])
+    def _c_bool(self, n):       return self._const(n["value"])
+    def _c_any(self, n):        return self._const(None)
+    def _c_identifier(self, n): return self._const(n["name"])
+    def _c_context_var(self, n): return self._const(ContextVar(n["name"]))   # frozen: condivisibile
+
+    def _c_var(self, n):
+        name, record, get, output = n["name"], flow.record_read, scheme.get, flow.output
+        def code(env, path, stack):
+            record(name)
+            return output(get(env, name, name))
+        return code, False
+
+    def _c_function_def(self, n):
+        p    = n["params"].get("items", [n["params"]])
+        body = n["body"]
+        r    = n["return_type"].get("items", [n["return_type"]])
+        # corpo e tipi di ritorno sono visitati da _call_dsl_fn a ogni chiamata
+        self.compile(body)
+        for ty in r:
+            self.compile(ty)
+        return (lambda env, path, stack: (p, body, r, path)), False
+
+    # ── strutture ─────────────────────────────────────────────────────────────
+
+    def _items(self, n, cast):
+        items = [self._child(it) for it in n["items"]]
+        sfx   = [f"[{i}]" for i in range(len(items))]
+        if not any(a for _, a, _ in items):
+            if not any(np for _, _, np in items):
+                fns = [fn for fn, _, _ in items]
+                return (lambda env, path, stack: cast([fn(env, None, stack) for fn in fns])), False
+            def code(env, path, stack):
+                return cast([fn(env, (path + s if path else s) if np else None, stack)
+                             for (fn, _, np), s in zip(items, sfx)])
+            return code, False
+        async def acode(env, path, stack):
+            out = []
+            for (fn, a, np), s in zip(items, sfx):
+                v = fn(env, (path + s if path else s) if np else None, stack)
+                out.append(await v if a else v)
+            return cast(out)
+        return acode, True
+
+    def _c_tuple(self, n):    return self._items(n, tuple)
+    def _c_sequence(self, n): return self._items(n, tuple)
+    def _c_list(self, n):     return self._items(n, list)
+
+    def _c_pair(self, n):
+        key_node   = n["key"]
+        vfn, va, _ = self._child(n["value"])
+        if key_node["type"] == "var":
+            key = key_node["name"]
+            kfn = ka = None
+        else:
+            key        = None
+            kfn, ka, _ = self._child(key_node)
+        if not (ka or va):
+            def code(env, path, stack):
+                k = key
+                if kfn is not None:
+                    k = kfn(env, path + ".key", stack)
+                    k = k[0] if isinstance(k, tuple) else k
+                return k, vfn(env, f"{path}.{k}" if path else str(k), stack)
+            return code, False
+        async def acode(env, path, stack):
+            k = key
+            if kfn is not None:
+                k = kfn(env, path + ".key", stack)
+                k = await k if ka else k
+                k = k[0] if isinstance(k, tuple) else k
+            v = vfn(env, f"{path}.{k}" if path else str(k), stack)
+            return k, (await v if va else v)
+        return acode, True
+
+    def _c_declaration(self, n):
+        interp      = self._interp
+        items       = n.get("targets", [])
+        target_name = items[0][1] if items else None
+        vfn, va, _  = self._child(n["value"])
+        meta        = n.get("meta")
+
+        def val_path(path):
+            return f"{path}.{target_name}" if path and target_name else (target_name or path)
+
+        async def check(value, tipo, name, path):
+            # tipi custom (async, e dichiarabili a runtime) solo se serve
+            if tipo in interp.custom_types:
+                return await interp._check(value, tipo, meta, name, path=path)
+            return interp._check_type(value, tipo, meta, name, path)
+
+        if len(items) == 1:
+            tipo, name = items[0]
+            async def code(env, path, stack):
+                vp  = val_path(path)
+                val = vfn(env, vp, stack)
+                if va:
+                    val = await val
+                if tipo == "type":
+                    interp.custom_types[name] = val
+                    return name, val
+                return name, await check(val, tipo, name, vp)
+            return code, True
+
+        async def multi(env, path, stack):
+            vp  = val_path(path)
+            val = vfn(env, vp, stack)
+            if va:
+                val = await val
+            keys, values = [], []
+            for i, (tipo, name) in enumerate(items):
+                if tipo == "type":
+                    interp.custom_types[name] = val
+                keys.append(name)
+                item_vp = f"{vp}[{i}]" if vp else f"[{i}]"
+                values.append(await check(val[i] if isinstance(val, (tuple, list)) else val, tipo, name, item_vp))
+            return tuple(keys), tuple(values)
+        return multi, True
+
+    def _c_dict(self, n):
+        # Stessa semantica di visit_dict: ogni item vede i risultati precedenti davanti a env
+        items = [self.compile(it) for it in n["items"]]
+        over  = _Scope.over
+        if not any(a for _, a in items):
+            def code(env, path, stack):
+                result = {}
+                scope  = over(result, env)
+                for fn, _ in items:
+                    _put(result, *fn(scope, path, stack))
+                return result
+            return code, False
+        async def acode(env, path, stack):
+            result = {}
+            scope  = over(result, env)
+            for fn, a in items:
+                kv = fn(scope, path, stack)
+                _put(result, *(await kv if a else kv))
+            return result
+        plan = self._interp._plans.get(id(n))
+        if plan is None or not plan.parallel:
+            return acode, True
+        interp = self._interp
+        async def pcode(env, path, stack):
+            if interp.dict_concurrency <= 1:
+                return await acode(env, path, stack)
+            async def evaluate(i, scope, own):
+                fn, a = items[i]
+                kv = fn(scope, path, own)
+                return await kv if a else kv
+            return await interp._visit_parallel(plan, env, evaluate, stack)
+        return pcode, True
+
+    def _c_task(self, n):
+        task_name = n["trigger"]["name"]
+        action    = n["action"]
+        kwargs    = [(k,) + self._child(v) for k, v in n["trigger"].get("kwargs", {}).items()]
+        self.compile(action)   # eseguita dal nodo del DagRunner (_make_task_fn)
+        if not any(a for _, _, a, _ in kwargs):
+            def code(env, path, stack):
+                task_path = f"{path}.{task_name}" if path else task_name
+                for k, fn, _, _ in kwargs:
+                    fn(env, task_path + "." + k, stack)
+                return task_name, action
+            return code, False
+        async def acode(env, path, stack):
+            task_path = f"{path}.{task_name}" if path else task_name
+            for k, fn, a, _ in kwargs:
+                v = fn(env, task_path + "." + k, stack)
+                if a:
+                    await v
+            return task_name, action
+        return acode, True
+
+    def _c_binop(self, n):
+        lfn, la, lp = self._child(n["left"])
+        rfn, ra, rp = self._child(n["right"])
+        op, meta    = n["op"], n.get("meta")
+
+        def apply(left, right, path):
+            if isinstance(left,  tuple): left  = left[0]
+            if isinstance(right, tuple): right = right[0]
+            if callable(left) or callable(right):
+                fn_op = OPS[op]
+                def lazy(*_, **ctx):
+                    l = left(**ctx)  if callable(left)  else left
+                    r = right(**ctx) if callable(right) else right
+                    return fn_op(l, r)
+                return LazyBinOp(lazy, f"{left!r} {op} {right!r}")
+            try:
+                return OPS[op](left, right)
+            except Exception as e:
+                raise DSLRuntimeError(f"Errore '{op}': {e} at {path}", meta)
+
+        if not (la or ra):
+            def code(env, path, stack):
+                return apply(lfn(env, path + ".left" if lp else None, stack),
+                             rfn(env, path + ".right" if rp else None, stack), path)
+            return code, False
+        async def acode(env, path, stack):
+            left = lfn(env, path + ".left" if lp else None, stack)
+            if la:
+                left = await left
+            right = rfn(env, path + ".right" if rp else None, stack)
+            if ra:
+                right = await right
+            return apply(left, right, path)
+        return acode, True
+
+    def _c_not(self, n):
+        vfn, va, vp = self._child(n["value"])
+        def apply(val):
+            if callable(val):
+                def lazy(*_, **ctx): return not val(**ctx)
+                return LazyBinOp(lazy, f"not {val!r}")
+            return not val
+        if not va:
+            return (lambda env, path, stack: apply(vfn(env, path + ".not" if vp else None, stack))), False
+        async def acode(env, path, stack):
+            return apply(await vfn(env, path + ".not" if vp else None, stack))
+        return acode, True
+
+    # ── chiamate a funzione ───────────────────────────────────────────────────
+
+    def _call(self, n):
+        """
+        Come visit_call(n, env, path, args=pre): usato per i nodo call e per i
+        passi delle pipe (che visit_call riceve senza passare da visit).
+        Ritorna (code(env, path, stack, pre=()), is_async).
+        """
+        interp     = self._interp
+        name, meta = n.get("name"), n.get("meta")
+        if n.get("lazy"):
+            capture = _Scope.capture
+            return (lambda env, path, stack, pre=(): LazyCall(interp, name, n, capture(env))), False
+        fn_name = str(name)
+        args    = [self._child(a) for a in n.get("args", [])]
+        kwargs  = [(k,) + self._child(v) for k, v in n.get("kwargs", {}).items()]
+        get     = scheme.get
+
+        async def code(env, path, stack, pre=()):
+            call_path = f"{path}.{name}" if path else fn_name
+            all_args  = list(pre)
+            for i, (fn, a, np) in enumerate(args):
+                v = fn(env, f"{call_path}[{i}]" if np else None, stack)
+                all_args.append(await v if a else v)
+            all_kwargs = {}
+            for k, fn, a, np in kwargs:
+                v = fn(env, f"{call_path}.{k}" if np else None, stack)
+                all_kwargs[k] = await v if a else v
+            res = await interp._invoke(get(env, fn_name), all_args, all_kwargs, path=call_path)
+            if not res["success"]:
+                raise DSLRuntimeError(f"Errore call '{name}': {res['errors']}", meta)
+            return res["outputs"]
+        return code, True
+
+    def _c_call(self, n):
+        return self._call(n)
+
+    def _c_pipe(self, n):
+        steps     = n["steps"]
+        first, fa = self.compile(steps[0])
+        rest      = []
+        for i, step in enumerate(steps[1:]):
+            name = i
+            if step.get("type") == "pair":
+                name = step["key"].get("name", i)
+                step = step["value"]
+            rest.append((name,) + self._call(step))
+
+        async def code(env, path, stack):
+            val = first(env, path, stack)
+            if fa:
+                val = await val
+            pipe_vars = {"_": val}
+            scope     = _Scope.over(pipe_vars, env)
+            for name, step, sa in rest:
+                pipe_vars["_"] = val
+                val = step(scope, path, stack, [val])
+                if sa:
+                    val = await val
+                pipe_vars[name] = val
+            return val
+        return code, True
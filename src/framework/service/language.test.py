@@ -0,0 +1,225 @@
+"""Test Interpreter
+
+Parsing, cache degli AST, valutazione dei dict e test_suite di
+language.test.dsl su entrambi i backend dell'interprete DSL.
+
+Uso::
+
+    python src/framework/service/language.test.py
+"""
+
+import os, sys
+
+# La cartella dello script contiene logging.py: va sostituita con src/
+# prima di importare asyncio, altrimenti oscura il modulo della stdlib.
+sys.path[0] = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+
+import asyncio, shutil, tempfile, unittest
+from unittest import mock
+
+import framework.service.language as language
+
+SOURCE = """
+x: 10;
+a() -> x + 1;
+"""
+
+# ─────────────────────────────────────────────
+# PARSE CACHE — AST su disco, solo su richiesta
+# ─────────────────────────────────────────────
+
+class TestParseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix="dsl-ast-")
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _shared(self, env):
+        with mock.patch.dict(os.environ, env, clear=False), \
+             mock.patch.object(language, "_shared_parse_cache", None):
+            if not env:
+                os.environ.pop("DSL_AST_CACHE", None)
+            return language.shared_parse_cache()
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(self._shared({}).path)
+        self.assertIsNone(self._shared({"DSL_AST_CACHE": ""}).path)
+        self.assertEqual(self._shared({"DSL_AST_CACHE": self.path}).path, self.path)
+
+    def test_hit_and_grammar_key(self):
+        cache = language.ParseCache(self.path)
+        ast = cache.parse(SOURCE)
+        self.assertEqual(language.ParseCache(self.path).parse(SOURCE), ast)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+        warm = language.ParseCache(self.path)
+        warm.parse(SOURCE)
+        self.assertEqual((warm.hits, warm.misses), (1, 0))
+
+        with mock.patch.object(language, "GRAMMAR", language.GRAMMAR + "\n// v2"):
+            changed = language.ParseCache(self.path)
+        changed.parse(SOURCE)
+        self.assertEqual((changed.hits, changed.misses), (0, 1))
+
+        with mock.patch.object(language, "AST_VERSION", language.AST_VERSION + 1):
+            bumped = language.ParseCache(self.path)
+        bumped.parse(SOURCE)
+        self.assertEqual((bumped.hits, bumped.misses), (0, 1))
+
+    def test_corrupt_entry_is_a_miss(self):
+        cache = language.ParseCache(self.path)
+        ast = cache.parse(SOURCE)
+        with open(cache._file(SOURCE), "wb") as f:
+            f.write(b"\x00garbage")
+        again = language.ParseCache(self.path)
+        self.assertEqual(again.parse(SOURCE), ast)
+        self.assertEqual((again.errors, again.misses), (1, 1))
+
+# ─────────────────────────────────────────────
+# DICT — ordine di valutazione delle voci con chiamate
+# ─────────────────────────────────────────────
+
+class TestDictConcurrency(unittest.IsolatedAsyncioTestCase):
+
+    BLOCKS = {
+        "plain": 'block: { "a": step(1); "b": step(2); "c": step(3); };',
+        "seq":   'block: sequential { "a": step(1); "b": step(2); "c": step(3); };',
+    }
+    IN_ORDER = [("start", 1), ("end", 1), ("start", 2), ("end", 2), ("start", 3), ("end", 3)]
+
+    @classmethod
+    def setUpClass(cls):
+        language.shared_parser()   # la tabella LALR fuori dal loop dei test
+
+    async def _trace(self, block, **options):
+        trace = []
+        async def step(i):
+            trace.append(("start", i))
+            await asyncio.sleep(0.01)
+            trace.append(("end", i))
+            return i
+        interp = language.Interpreter(**options)
+        await interp.start()
+        try:
+            await interp.load_file("order", self.BLOCKS[block])
+            result, _ = await interp.visit(interp._ast_cache["order"], dict(language.DSL_FUNCTIONS) | {"step": step})
+        finally:
+            await interp.stop()
+        self.assertEqual(result["block"], {"a": 1, "b": 2, "c": 3})
+        return trace
+
+    async def test_default_in_order(self):
+        for backend in language.Interpreter.BACKENDS:
+            with self.subTest(backend=backend):
+                self.assertEqual(language.Interpreter(backend=backend).dict_concurrency, 1)
+                self.assertEqual(await self._trace("plain", backend=backend), self.IN_ORDER)
+
+    async def test_opt_in_and_sequential(self):
+        for backend in language.Interpreter.BACKENDS:
+            with self.subTest(backend=backend):
+                trace = await self._trace("plain", backend=backend, dict_concurrency=8)
+                self.assertEqual(trace[:3], [("start", 1), ("start", 2), ("start", 3)])
+                self.assertEqual(await self._trace("seq", backend=backend, dict_concurrency=8), self.IN_ORDER)
+
+# ─────────────────────────────────────────────
+# COSTANTI — voci statiche calcolate una volta per versione del file
+# ─────────────────────────────────────────────
+
+class TestStatic(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        language.shared_parser()
+
+    async def test_reload(self):
+        for backend in language.Interpreter.BACKENDS:
+            with self.subTest(backend=backend):
+                interp = language.Interpreter(backend=backend)
+                await interp.start()
+                try:
+                    await interp.load_file("s", "a: 1;\nc: a;\n")
+                    interp.session_create("x", dict(language.DSL_FUNCTIONS))
+                    res = await interp._run_session("x", "s", {})
+                    self.assertEqual((res["a"], res["c"]), (1, 1))
+
+                    await interp.load_file("s", "a: 7;\nc: a;\n")   # nuova versione: costanti ricalcolate
+                    res = await interp._run_session("x", "s", {})
+                    self.assertEqual((res["a"], res["c"]), (7, 7))
+                finally:
+                    await interp.stop()
+
+# ─────────────────────────────────────────────
+# SCOPE — dict annidati e pipe sulla catena di scope
+# ─────────────────────────────────────────────
+
+class TestScopes(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        language.shared_parser()
+
+    async def test_nested_and_pipe(self):
+        env = dict(language.DSL_FUNCTIONS) | {"inc": lambda v: v + 1}
+        for backend in language.Interpreter.BACKENDS:
+            with self.subTest(backend=backend):
+                interp = language.Interpreter(backend=backend)
+                await interp.start()
+                try:
+                    await interp.load_file("s", "a: 1;\nd: { a: 2; b: a + 1; };\nc: a;\np: 5 |> inc;\n")
+                    interp.session_create("x", env)
+                    res = await interp._run_session("x", "s", {})
+                    self.assertEqual((res["d"], res["c"], res["p"]), ({"a": 2, "b": 3}, 1, 6))
+                finally:
+                    await interp.stop()
+
+# ─────────────────────────────────────────────
+# BACKEND — test_suite di language.test.dsl come il tester, per backend
+# ─────────────────────────────────────────────
+
+SUITE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "language.test.dsl")
+
+class TestSuiteBackends(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(SUITE) as f:
+            cls.source = f.read()
+        language.shared_parser()
+
+    async def _suite(self, backend):
+        interp = language.Interpreter(backend=backend)
+        await interp.start()
+        try:
+            await interp.load_file(SUITE, self.source)
+            interp.session_create("tester", dict(language.DSL_FUNCTIONS))
+            ctx = await interp._run_session("tester", SUITE, {})
+            outcomes = []
+            for test in ctx["test_suite"]:
+                args = test.get("inputs", ())
+                if isinstance(args, dict):
+                    received = await interp._invoke(test["action"], (), args)
+                else:
+                    received = await interp._invoke(test["action"], tuple(args), {})
+                outcomes.append((test["note"], bool(test["assert"](received=received, expected=test.get("outputs")))))
+            return ctx, outcomes
+        finally:
+            await interp.stop()
+
+    async def test_suite_passes(self):
+        for backend in language.Interpreter.BACKENDS:
+            with self.subTest(backend=backend):
+                _, outcomes = await self._suite(backend)
+                self.assertGreater(len(outcomes), 0)
+                self.assertEqual([note for note, ok in outcomes if not ok], [])
+
+    async def test_backends_agree(self):
+        (ctx_i, out_i), (ctx_c, out_c) = [await self._suite(b) for b in ("interpreted", "compiled")]
+        self.assertEqual(out_i, out_c)
+        values = lambda ctx: {k: v for k, v in ctx.items() if not callable(v) and k != "test_suite"}
+        self.assertEqual(values(ctx_i), values(ctx_c))
+
+
+if __name__ == "__main__":
+    unittest.main()
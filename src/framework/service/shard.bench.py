@@ -0,0 +1,62 @@
+"""Benchmark ShardedInterpreter
+
+Throughput di ``run_file`` (run/s) con logica di controller CPU-bound,
+al variare del numero di shard. La scalabilità è limitata dai core
+disponibili: con N core ci si aspetta ~N volte il throughput di 1 shard.
+
+Uso::
+
+    python src/framework/service/shard.bench.py [shard ...]
+"""
+
+import os, sys
+
+# La cartella dello script contiene logging.py: va sostituita con src/
+# prima di importare asyncio, altrimenti oscura il modulo della stdlib.
+sys.path[0] = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+
+import asyncio, multiprocessing, time
+
+import framework.service.shard as shard
+
+SESSIONS = 64
+ROUNDS   = 5
+
+CONTROLLER = """
+carico: 30000;
+totale() -> burn(carico);
+doppio() -> totale * 2;
+"""
+
+def burn(n):
+    return sum(i * i for i in range(n))
+
+def bench_env():
+    """env_factory: eseguita in ogni shard."""
+    return {"burn": burn}
+
+async def throughput(shards: int):
+    async with shard.ShardedInterpreter(shards=shards, env_factory=bench_env) as interp:
+        await interp.load_file("ctrl", CONTROLLER)
+        sids = [f"user-{i}" for i in range(SESSIONS)]
+        for sid in sids:
+            interp.session_create(sid, {"sid": sid})
+        await asyncio.gather(*(interp._run_session(sid, "ctrl", {}) for sid in sids))   # warm-up
+
+        t0 = time.perf_counter()
+        for _ in range(ROUNDS):
+            await asyncio.gather(*(interp._run_session(sid, "ctrl", {}) for sid in sids))
+        elapsed = time.perf_counter() - t0
+
+        spread = [s["resident"] for s in await interp.runner.session_stats()]
+    runs = SESSIONS * ROUNDS
+    print(f"shards={shards:<3} run/s={runs / elapsed:9.1f} ({runs} run in {elapsed:.2f}s) sessions/shard={spread}")
+
+async def main():
+    print(f"cpu={multiprocessing.cpu_count()}")
+    counts = [int(a) for a in sys.argv[1:]] or sorted({1, 2, 4, multiprocessing.cpu_count()})
+    for n in counts:
+        await throughput(n)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,429 @@
+"""
+Runtime DSL partizionato su più processi
+========================================
+
+Un solo processo Python esegue tutte le sessioni: la logica dei controller
+CPU-bound si ferma a un core. ``ShardedInterpreter`` avvia N processi, ognuno
+con il proprio ``Interpreter`` (e quindi il proprio ``DagRunner``), e assegna
+ogni sessione a uno shard con un hash consistente del sid.
+
+    interp = ShardedInterpreter(shards=4)
+    await interp.start()
+    await interp.load_file("app", source)          # broadcast a tutti gli shard
+
+    interp.session_create("alice", env={"user": "alice"})
+    results = await interp._run_session("alice", "app", {})
+
+In un'applicazione il Defender e l'Orchestrator condividono l'interprete di
+processo ``shared_interpreter()``: partizionato se ``$DSL_SHARDS`` è almeno 2,
+con l'env di ogni shard costruito da ``$DSL_SHARD_ENV`` (``"modulo:funzione"``).
+
+Le chiamate dell'``Interpreter`` e del runner usate da ``SessionHandle``,
+``DefenderMiddleware`` e dall'adapter Starlette (``run``, ``emit``,
+``update_state``, ``context``, ...) passano da una Pipe locale verso lo shard
+proprietario della sessione: ``interp.runner`` espone la stessa interfaccia
+del ``DagRunner``, ma le letture (``context``, ``get_file_context``,
+``has_session``) sono coroutine: il loop non si blocca mai sulla Pipe.
+
+Limiti
+------
+- Solo valori serializzabili (pickle) attraversano la Pipe: le voci di env
+  non serializzabili (manager, messenger) vanno create nello shard con
+  ``env_factory``, una callable importabile eseguita all'avvio di ogni shard.
+  Le voci che ``env_factory`` fornisce restano quelle dello shard; ogni altra
+  voce non serializzabile di un env solleva ``TypeError``.
+- I nodi Python aggiunti a runtime (``attach_node``) non attraversano la Pipe.
+- Le risposte (results, context) perdono le voci non serializzabili.
+- Chi legge il contesto dal runner deve attendere il valore se è awaitable
+  (``await flow._call(runner.context, sid)`` vale per entrambi i motori).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import importlib
+import itertools
+import multiprocessing
+import os
+import pickle
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, List, Optional
+
+import framework.service.flow as flow
+
+
+# ── Hash consistente ──────────────────────────────────────────────────────────
+
+def _jump(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping & Veach): aggiungendo uno shard si sposta ~1/N delle chiavi."""
+    b, j = -1, 0
+    while j < buckets:
+        b   = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j   = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+def shard_of(sid: str, shards: int) -> int:
+    """Shard proprietario di sid; stabile tra processi e riavvii (non usa hash())."""
+    digest = hashlib.blake2b(str(sid).encode(), digest_size=8).digest()
+    return _jump(int.from_bytes(digest, "little"), shards)
+
+
+_DROP = object()   # valore non serializzabile: distinto da un None legittimo
+
+def _strip(value: Any) -> Any:
+    try:
+        pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return value
+    except Exception:
+        pass
+    if isinstance(value, Mapping):
+        return {k: v for k, v in ((k, _strip(v)) for k, v in value.items()) if v is not _DROP}
+    return _DROP
+
+def _portable(value: Any) -> Any:
+    """value se serializzabile; per i Mapping scarta solo le voci che non lo sono (None se nulla resta)."""
+    value = _strip(value)
+    return None if value is _DROP else value
+
+def _outbound(env: Optional[Dict], local=frozenset(), what: str = "env") -> Dict:
+    """
+    env da inviare a uno shard: le voci in local le fornisce env_factory e
+    vengono scartate, ogni altra voce non serializzabile è un errore.
+    """
+    env      = {k: v for k, v in (env or {}).items() if k not in local}
+    portable = _portable(env) or {}
+    lost     = [k for k in env if k not in portable or portable[k] is not env[k]]
+    if lost:
+        raise TypeError(f"SHARD -> {what}: voci non serializzabili {lost}; "
+                        f"vanno create nello shard con env_factory")
+    return portable
+
+
+# ── Processo shard ────────────────────────────────────────────────────────────
+# Protocollo: richiesta (id, metodo, args) -> risposta (id, ok, valore).
+# id None = notifica senza risposta (update_state, emit, session_create).
+
+def _shard_main(conn, index: int, interpreter_options: dict, env_factory: Optional[Callable]):
+    asyncio.run(_serve(conn, index, interpreter_options, env_factory))
+
+async def _serve(conn, index: int, interpreter_options: dict, env_factory: Optional[Callable]):
+    import framework.service.language as language
+
+    interp = language.Interpreter(**interpreter_options)
+    await interp.start()
+    runner = interp._runner
+    env    = env_factory() if env_factory else {}
+
+    handlers = {
+        "load_file":        interp.load_file,
+        "unload_file":      interp.unload_file,
+        "session_create":   lambda sid, e: interp.session_create(sid, env | e),
+        "session_exists":   interp.session_exists,
+        "run":              interp._run_session,
+        "run_many":         lambda *a: _collect(interp.run_many(*a)),
+        "checkpoint":       interp.checkpoint,
+        "restore":          lambda path, e: interp.restore(path, env | e),
+        "update_state":     runner.update_state,
+        "emit":             runner.emit,
+        "wait_node":        runner.wait_node,
+        "context":          runner.context,
+        "get_file_context": runner.get_file_context,
+        "close_session":    runner.close_session,
+        "session_stats":    runner.session_stats,
+        "env_keys":         lambda: list(env),
+    }
+
+    loop    = asyncio.get_running_loop()
+    closed  = loop.create_future()
+    pending = set()
+
+    async def handle(rid, method, args):
+        try:
+            value = await flow._call(handlers[method], *args)
+            reply = (rid, True, _portable(value))
+        except Exception as e:
+            reply = (rid, False, e if _portable(e) is e else RuntimeError(f"{type(e).__name__}: {e}"))
+        if rid is not None:
+            conn.send(reply)
+        elif not reply[1]:
+            print(f"❌ Shard {index} {method}: {reply[2]}")
+
+    def on_request():
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            msg = None
+        if msg is None:
+            loop.remove_reader(conn.fileno())
+            if not closed.done():
+                closed.set_result(None)
+            return
+        task = asyncio.ensure_future(handle(*msg))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    loop.add_reader(conn.fileno(), on_request)
+    await closed
+    for task in pending:
+        task.cancel()
+    await interp.stop()
+
+
+async def _collect(results) -> Dict[str, Any]:
+    """Un generatore di (sid, risultati) raccolto in un dict: una sola risposta sulla Pipe."""
+    return {sid: value async for sid, value in results}
+
+
+class _Shard:
+    """Lato padre della Pipe verso un processo shard."""
+
+    def __init__(self, index: int, process, conn):
+        self.index   = index
+        self.process = process
+        self.conn    = conn
+        self.waiting: Dict[int, asyncio.Future] = {}
+
+    def deliver(self, msg):
+        rid, ok, value = msg
+        fut = self.waiting.pop(rid, None)
+        if fut is None or fut.done():
+            return
+        if ok:
+            fut.set_result(value)
+        else:
+            fut.set_exception(value)
+
+    def on_reply(self):
+        try:
+            msg = self.conn.recv()
+        except (EOFError, OSError):
+            asyncio.get_running_loop().remove_reader(self.conn.fileno())
+            for fut in self.waiting.values():
+                if not fut.done():
+                    fut.set_exception(RuntimeError(f"Shard {self.index} terminato"))
+            self.waiting.clear()
+            return
+        self.deliver(msg)
+
+
+# ── Router ────────────────────────────────────────────────────────────────────
+
+class ShardRouter:
+    """
+    Stessa interfaccia del ``DagRunner`` per le operazioni di sessione:
+    ogni chiamata con un sid viene inoltrata allo shard proprietario.
+    Le risposte le legge solo il reader del loop (``_Shard.on_reply``) e le
+    consegna al future della richiesta: per questo anche le letture che nel
+    ``DagRunner`` sono sincrone (context, has_session) qui vanno attese.
+    """
+
+    def __init__(self, shards: List[_Shard]):
+        self.shards = shards
+        self.nodes: Dict[str, Dict] = {}   # file caricati (solo i nomi), come DagRunner.nodes
+        self.local: frozenset = frozenset()   # voci di env fornite da env_factory in ogni shard
+        self._ids   = itertools.count(1)
+
+    def shard(self, sid: str) -> _Shard:
+        return self.shards[shard_of(sid, len(self.shards))]
+
+    # ── trasporto ─────────────────────────────────────────────────────────────
+
+    def notify(self, shard: _Shard, method: str, *args) -> None:
+        shard.conn.send((None, method, args))
+
+    def request(self, shard: _Shard, method: str, *args) -> asyncio.Future:
+        rid = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        shard.waiting[rid] = fut
+        shard.conn.send((rid, method, args))
+        return fut
+
+    async def broadcast(self, method: str, *args) -> List[Any]:
+        return await asyncio.gather(*(self.request(s, method, *args) for s in self.shards))
+
+    # ── API DagRunner ─────────────────────────────────────────────────────────
+
+    def create_session(self, sid: str, ctx: Optional[Dict] = None):
+        self.notify(self.shard(sid), "session_create", sid, _outbound(ctx, self.local, f"sessione '{sid}'"))
+
+    async def has_session(self, sid: str) -> bool:
+        return await self.request(self.shard(sid), "session_exists", sid)
+
+    async def run_file(self, sid: str, fname: str, ctx_update: Optional[Dict] = None,
+                       timeout: Optional[float] = None):
+        return await self.request(self.shard(sid), "run", sid, fname, _outbound(ctx_update, what=fname), timeout)
+
+    async def run_many(self, sids, fname: str, ctx_update: Optional[Dict] = None,
+                       timeout: Optional[float] = None):
+        """Una richiesta per shard con i suoi sid; produce (sid, risultati) shard per shard."""
+        groups: Dict[int, List[str]] = {}
+        for sid in sids:
+            groups.setdefault(self.shard(sid).index, []).append(sid)
+        update  = _outbound(ctx_update, what=fname)
+        pending = [self.request(self.shards[i], "run_many", group, fname, update, timeout)
+                   for i, group in groups.items()]
+        for reply in asyncio.as_completed(pending):
+            for item in (await reply).items():
+                yield item
+
+    def update_state(self, sid: str, *args):
+        self.notify(self.shard(sid), "update_state", sid, *args)
+
+    def emit(self, sid: str, fname: str, name: str, value: Any = None):
+        self.notify(self.shard(sid), "emit", sid, fname, name, value)
+
+    def attach_node(self, fname: str, nd: Dict):
+        raise NotImplementedError("SHARD -> attach_node: i nodi Python non attraversano la Pipe")
+
+    async def wait_node(self, sid: str, fname: str, name: str):
+        await self.request(self.shard(sid), "wait_node", sid, fname, name)
+
+    async def context(self, sid: str) -> Dict:
+        return await self.request(self.shard(sid), "context", sid)
+
+    async def get_file_context(self, sid: str, fname: str) -> Dict:
+        return await self.request(self.shard(sid), "get_file_context", sid, fname)
+
+    async def close_session(self, sid: str):
+        await self.request(self.shard(sid), "close_session", sid)
+
+    async def session_stats(self) -> List[Dict[str, Any]]:
+        return await self.broadcast("session_stats")
+
+
+# ── ShardedInterpreter ────────────────────────────────────────────────────────
+
+class ShardedInterpreter:
+    """
+    Interprete DSL partizionato su ``shards`` processi.
+
+    :param shards:      numero di processi (default: CPU disponibili)
+    :param env_factory: callable importabile eseguita in ogni shard; ritorna
+                        l'env locale (manager, funzioni non serializzabili)
+                        unito a quello di ogni ``session_create``
+    :param options:     argomenti di ``Interpreter`` in ogni shard
+                        (custom_types, opzioni del DagRunner)
+    """
+
+    def __init__(self, shards: Optional[int] = None, env_factory: Optional[Callable] = None, **options):
+        self.shards      = shards or multiprocessing.cpu_count()
+        self.env_factory = env_factory
+        self.options     = options
+        self._runner: Optional[ShardRouter] = None
+        self._users      = 0   # start/stop annidati, come Runtime.acquire/release
+
+    @property
+    def runner(self) -> ShardRouter:
+        return self._runner
+
+    # ── lifecycle ─────────────────────────────────────────────────────────────
+
+    async def start(self) -> "ShardedInterpreter":
+        self._users += 1
+        if self._runner is not None:
+            return self
+        ctx    = multiprocessing.get_context("spawn")
+        loop   = asyncio.get_running_loop()
+        shards = []
+        for i in range(self.shards):
+            parent, child = ctx.Pipe()
+            process = ctx.Process(target=_shard_main, args=(child, i, self.options, self.env_factory),
+                                  name=f"dsl-shard-{i}", daemon=True)
+            process.start()
+            child.close()
+            shard = _Shard(i, process, parent)
+            loop.add_reader(parent.fileno(), shard.on_reply)
+            shards.append(shard)
+        self._runner = ShardRouter(shards)
+        self._runner.local = frozenset(await self._runner.request(shards[0], "env_keys"))
+        return self
+
+    async def stop(self) -> None:
+        """Ferma gli shard all'ultimo stop (Defender e Orchestrator condividono l'istanza)."""
+        self._users = max(self._users - 1, 0)
+        if self._users or self._runner is None:
+            return
+        loop = asyncio.get_running_loop()
+        for shard in self._runner.shards:
+            loop.remove_reader(shard.conn.fileno())
+            try:
+                shard.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for shard in self._runner.shards:
+            await loop.run_in_executor(None, shard.process.join, 5)
+            if shard.process.is_alive():
+                shard.process.terminate()
+            shard.conn.close()
+        self._runner = None
+
+    async def __aenter__(self) -> "ShardedInterpreter":
+        return await self.start()
+
+    async def __aexit__(self, *_) -> None:
+        await self.stop()
+
+    # ── file management ───────────────────────────────────────────────────────
+
+    async def load_file(self, name: str, source: str) -> None:
+        """Parsa e registra il file in tutti gli shard."""
+        await self._runner.broadcast("load_file", name, source)
+        self._runner.nodes[name] = {}
+
+    async def unload_file(self, name: str) -> None:
+        await self._runner.broadcast("unload_file", name)
+        self._runner.nodes.pop(name, None)
+
+    # ── session management ────────────────────────────────────────────────────
+
+    def session_create(self, sid: str, env: dict = {}) -> None:
+        self._runner.create_session(sid, env)
+
+    async def session_exists(self, sid: str) -> bool:
+        return await self._runner.has_session(sid)
+
+    async def checkpoint(self, path: str) -> int:
+        """Uno snapshot per shard: ``{path}.{i}``."""
+        counts = await asyncio.gather(*(
+            self._runner.request(s, "checkpoint", f"{path}.{s.index}") for s in self._runner.shards))
+        return sum(counts)
+
+    async def restore(self, path: str, env: dict = {}) -> int:
+        counts = await asyncio.gather(*(
+            self._runner.request(s, "restore", f"{path}.{s.index}", _outbound(env, self._runner.local))
+            for s in self._runner.shards))
+        return sum(counts)
+
+    def run_many(self, sids, file: str, env: Optional[Dict] = None, timeout: Optional[float] = None):
+        """Come ``Interpreter.run_many``: un messaggio per shard invece di uno per sessione."""
+        return self._runner.run_many(sids, file, env, timeout)
+
+    async def _run_session(self, sid: str, file: str, env: Dict,
+                           timeout: Optional[float] = None) -> Dict[str, Any]:
+        return await self._runner.run_file(sid, file, env, timeout)
+
+
+# ── Interprete di processo ────────────────────────────────────────────────────
+
+_shared_interpreter: Optional[ShardedInterpreter] = None
+
+def shared_interpreter(**options) -> Optional[ShardedInterpreter]:
+    """
+    ShardedInterpreter di processo, creato al primo uso con options, se
+    ``$DSL_SHARDS`` chiede almeno 2 shard; altrimenti None e i chiamanti
+    usano un ``Interpreter`` sul Runtime condiviso. ``$DSL_SHARD_ENV``
+    (``"modulo:funzione"``) è la env_factory eseguita in ogni shard.
+    """
+    global _shared_interpreter
+    if _shared_interpreter is None:
+        shards = int(os.environ.get("DSL_SHARDS") or 0)
+        if shards < 2:
+            return None
+        factory = os.environ.get("DSL_SHARD_ENV")
+        if factory:
+            module, _, name = factory.partition(":")
+            factory = getattr(importlib.import_module(module), name)
+        _shared_interpreter = ShardedInterpreter(shards, factory or None, **options)
+    return _shared_interpreter
@@ -0,0 +1,147 @@
+"""Test ShardedInterpreter
+
+Hash consistente, serializzazione dei valori e protocollo della Pipe verso
+processi shard reali.
+
+Uso::
+
+    python src/framework/service/shard.test.py
+"""
+
+import os, sys
+
+# La cartella dello script contiene logging.py: va sostituita con src/
+# prima di importare asyncio, altrimenti oscura il modulo della stdlib.
+sys.path[0] = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+
+import asyncio, unittest
+from unittest import mock
+
+import framework.service.shard as shard
+
+DAG = """
+x: 10;
+a() -> x + 1;
+b() -> a * 2;
+"""
+
+def shard_env():
+    """env_factory: eseguita in ogni shard, fornisce valori non serializzabili."""
+    return {"local": lambda v: v}
+
+# ─────────────────────────────────────────────
+# HASH — assegnazione delle sessioni agli shard
+# ─────────────────────────────────────────────
+
+class TestShardOf(unittest.TestCase):
+
+    def test_stable_and_in_range(self):
+        sids = [f"user-{i}" for i in range(1000)]
+        owners = [shard.shard_of(sid, 4) for sid in sids]
+        self.assertEqual(owners, [shard.shard_of(sid, 4) for sid in sids])
+        self.assertEqual(set(owners), {0, 1, 2, 3})
+
+    def test_consistent_on_resize(self):
+        sids = [f"user-{i}" for i in range(1000)]
+        moved = [sid for sid in sids if shard.shard_of(sid, 4) != shard.shard_of(sid, 5)]
+        self.assertTrue(all(shard.shard_of(sid, 5) == 4 for sid in moved))   # solo verso il nuovo shard
+        self.assertLess(len(moved), 300)
+
+# ─────────────────────────────────────────────
+# PORTABLE — cosa attraversa la Pipe
+# ─────────────────────────────────────────────
+
+class TestPortable(unittest.TestCase):
+
+    def test_keeps_none(self):
+        value = {"a": None, "f": lambda: 1, "n": {"x": None, "g": lambda: 0}, "l": [None]}
+        self.assertEqual(shard._portable(value), {"a": None, "n": {"x": None}, "l": [None]})
+
+    def test_not_portable(self):
+        self.assertIsNone(shard._portable(None))
+        self.assertIsNone(shard._portable(lambda: 1))
+        self.assertEqual(shard._portable({"f": lambda: 1}), {})
+
+    def test_outbound_is_loud(self):
+        self.assertEqual(shard._outbound({"x": 1, "local": lambda v: v}, {"local"}), {"x": 1})
+        for env in ({"f": lambda: 1}, {"n": {"x": 1, "g": lambda: 0}}):
+            with self.assertRaises(TypeError):
+                shard._outbound(env, {"local"})
+
+# ─────────────────────────────────────────────
+# PROTOCOLLO — richieste, notifiche e letture verso gli shard
+# ─────────────────────────────────────────────
+
+class TestShardedInterpreter(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.interp = await shard.ShardedInterpreter(shards=2, env_factory=shard_env).start()
+        await self.interp.load_file("dag", DAG)
+        self.sids = [f"s{i}" for i in range(8)]
+        for i, sid in enumerate(self.sids):
+            self.interp.session_create(sid, {"x": i, "none": None, "local": lambda v: v})
+
+    async def asyncTearDown(self):
+        await self.interp.stop()
+
+    async def test_routing(self):
+        results = await asyncio.gather(*(self.interp._run_session(sid, "dag", {}) for sid in self.sids))
+        self.assertEqual([r["b"] for r in results], [(i + 1) * 2 for i in range(8)])
+        spread = [s["resident"] for s in await self.interp.runner.session_stats()]
+        self.assertEqual(sum(spread), len(self.sids))
+        self.assertEqual(spread, [sum(1 for sid in self.sids if shard.shard_of(sid, 2) == i) for i in range(2)])
+
+    async def test_reads(self):
+        await self.interp._run_session("s3", "dag", {})
+        ctx = await self.interp.runner.context("s3")
+        self.assertEqual((ctx["x"], ctx["b"], ctx["none"]), (3, 8, None))
+        self.assertTrue(await self.interp.session_exists("s3"))
+        self.assertFalse(await self.interp.session_exists("nope"))
+
+    async def test_reads_interleaved_with_runs(self):
+        runs  = [self.interp._run_session(sid, "dag", {}) for sid in self.sids]
+        reads = [self.interp.runner.has_session(sid) for sid in self.sids]
+        out = await asyncio.gather(*runs, *reads)
+        self.assertEqual(out[len(runs):], [True] * len(reads))
+        self.assertEqual([r["a"] for r in out[:len(runs)]], [i + 1 for i in range(8)])
+
+    async def test_env_and_lifecycle(self):
+        self.assertEqual(self.interp.runner.local, {"local"})
+        with self.assertRaises(TypeError):
+            self.interp.session_create("bad", {"manager": lambda: 0})
+        await self.interp.start()          # secondo utente: uno stop non ferma gli shard
+        await self.interp.stop()
+        self.assertIsNotNone(self.interp.runner)
+
+    async def test_run_many_and_errors(self):
+        many = {sid: r["b"] async for sid, r in self.interp.run_many(self.sids, "dag")}
+        self.assertEqual(many, {sid: (i + 1) * 2 for i, sid in enumerate(self.sids)})
+        with self.assertRaises(Exception):
+            await self.interp._run_session("s0", "missing", {})
+        await self.interp.runner.close_session("s0")
+        self.assertFalse(await self.interp.session_exists("s0"))
+
+# ─────────────────────────────────────────────
+# PROCESSO — interprete condiviso da $DSL_SHARDS
+# ─────────────────────────────────────────────
+
+class TestSharedInterpreter(unittest.TestCase):
+
+    def _shared(self, env):
+        with mock.patch.dict(os.environ, env), mock.patch.object(shard, "_shared_interpreter", None):
+            return shard.shared_interpreter(backend="interpreted")
+
+    def test_off_by_default(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop("DSL_SHARDS", None)
+            self.assertIsNone(self._shared({}))
+        self.assertIsNone(self._shared({"DSL_SHARDS": "1"}))
+
+    def test_from_environment(self):
+        interp = self._shared({"DSL_SHARDS": "3", "DSL_SHARD_ENV": f"{__name__}:shard_env"})
+        self.assertEqual((interp.shards, interp.env_factory, interp.options),
+                         (3, shard_env, {"backend": "interpreted"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
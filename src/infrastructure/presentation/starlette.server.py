@@ -2,6 +2,7 @@ import uuid
 import asyncio
 from html import escape
 import re
+import inspect
 import json
 from datetime import datetime
 from urllib.parse import urlparse, urlunparse, ParseResult,parse_qs
@@ -299,6 +300,10 @@ mapping_attributes = {
     presentation.Attribute.THICKNESS.value: lambda x: f"border-[{x}]" if '%' in x or 'px' in x else f"border-{x}" if 'px' in x else f"border-{x}",
 }
 
+async def _read(value):
+    # Il runner può essere un ShardRouter: le sue letture sono coroutine
+    return await value if inspect.isawaitable(value) else value
+
 def attrs(tag_key, input_data, classe=None):
     # 1. Prendi gli attributi grezzi passati dall'utente
     raw_attrs = input_data.get("attrs", {})
@@ -588,6 +593,7 @@ class Adapter(presentation.port):
         self.ssh = {}
         cwd = os.getcwd()
         self.initialize()
+        self.deadline = constants.get('deadline')
         self.routes_static=[
             Mount('/static', app=StaticFiles(directory=f'{cwd}/public/'), name="static"),
             Mount('/framework', app=StaticFiles(directory=f'{cwd}/src/framework'), name="y"),
@@ -795,9 +801,10 @@ class Adapter(presentation.port):
                 
                 
                 # Passiamo l'intero contesto della sessione al template Jinja
-                resultato = self.executor.interpreter.runner.context(sid)
+                runner = self.executor.interpreter.runner
+                resultato = await _read(runner.context(sid))
 
-                resultato |= self.executor.interpreter.runner.get_file_context(sid, ppppname)
+                resultato |= await _read(runner.get_file_context(sid, ppppname))
                 
                 if resultato:
                     full_ctx.setdefault(controller,{})
@@ -858,7 +865,7 @@ class Adapter(presentation.port):
         full_ctx = {}
         if hasattr(self, 'executor') and self.executor:
             try:
-                full_ctx = self.executor.interpreter.runner.context(session_id) or {}
+                full_ctx = await _read(self.executor.interpreter.runner.context(session_id)) or {}
             except Exception as e:
                 print(f"Errore recupero contesto per rebuild: {e}")
                 